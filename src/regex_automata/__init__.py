@@ -1,47 +1,51 @@
 # ruff: noqa: E741
-from typing import Iterator, Callable
+from typing import Any, AnyStr, Iterator, Callable
 
 from .regex.flags import PatternFlag as PatternFlag
 from .regex.match import Match as Match
-from .regex.pattern import Pattern as Pattern
-from .common import root_logger as root_logger
+from .regex.match_stats import MatchStats as MatchStats
+from .regex.profiler import NFAProfile as NFAProfile
+from .regex.pattern import Pattern as Pattern, Construction
+from .regex.regex_set import RegexSet as RegexSet
+from .common import root_logger as root_logger, Text
 
 __version__ = "0.3.1"
 
 
-def fullmatch(pattern: str, s: str, flags: PatternFlag = PatternFlag.NOFLAG) -> Match | None:
+def fullmatch(pattern: str | bytes, s: Text, flags: PatternFlag = PatternFlag.NOFLAG) -> Match | None:
     return Pattern(pattern, flags).fullmatch(s)
 
 
-def match(pattern: str, s: str, flags: PatternFlag = PatternFlag.NOFLAG) -> Match | None:
+def match(pattern: str | bytes, s: Text, flags: PatternFlag = PatternFlag.NOFLAG) -> Match | None:
     return Pattern(pattern, flags).match(s)
 
 
-def search(pattern: str, s: str, flags: PatternFlag = PatternFlag.NOFLAG) -> Match | None:
+def search(pattern: str | bytes, s: Text, flags: PatternFlag = PatternFlag.NOFLAG) -> Match | None:
     return Pattern(pattern, flags).search(s)
 
 
-def finditer(pattern: str, s: str, flags: PatternFlag = PatternFlag.NOFLAG, all_matches: bool = False) -> Iterator[Match]:
+def finditer(pattern: str | bytes, s: Text, flags: PatternFlag = PatternFlag.NOFLAG, all_matches: bool = False) -> Iterator[Match]:
     yield from Pattern(pattern, flags).finditer(s, all_matches=all_matches)
 
 
-def compile(pattern: str, flags: PatternFlag = PatternFlag.NOFLAG, epsilon_free: bool = True) -> Pattern:
-    return Pattern(pattern, flags, epsilon_free)
+def compile(pattern: str | bytes, flags: PatternFlag = PatternFlag.NOFLAG, epsilon_free: bool = True,
+            construction: Construction = "thompson", reduce: bool = True) -> Pattern:
+    return Pattern(pattern, flags, epsilon_free, construction, reduce)
 
 
-def findall(pattern: str, s: str, flags: PatternFlag = PatternFlag.NOFLAG, all_matches: bool = False) -> list[str | None] | list[tuple[str | None, ...]]:
+def findall(pattern: str | bytes, s: Text, flags: PatternFlag = PatternFlag.NOFLAG, all_matches: bool = False) -> list[Any] | list[tuple[Any, ...]]:
     return Pattern(pattern, flags).findall(s, all_matches=all_matches)
 
 
-def sub(pattern: str, repl: str | Callable[[Match], str], s: str, count: int = 0, flags: PatternFlag = PatternFlag.NOFLAG) -> str:
+def sub(pattern: AnyStr, repl: AnyStr | Callable[[Match], AnyStr], s: AnyStr, count: int = 0, flags: PatternFlag = PatternFlag.NOFLAG) -> AnyStr:
     return Pattern(pattern, flags).sub(repl, s, count)
 
 
-def subn(pattern: str, repl: str | Callable[[Match], str], s: str, count: int = 0, flags: PatternFlag = PatternFlag.NOFLAG) -> tuple[str, int]:
+def subn(pattern: AnyStr, repl: AnyStr | Callable[[Match], AnyStr], s: AnyStr, count: int = 0, flags: PatternFlag = PatternFlag.NOFLAG) -> tuple[AnyStr, int]:
     return Pattern(pattern, flags).subn(repl, s, count)
 
 
-def split(pattern: str, s: str, maxsplit: int = 0, flags: PatternFlag = PatternFlag.NOFLAG) -> list[str | None]:
+def split(pattern: AnyStr, s: AnyStr, maxsplit: int = 0, flags: PatternFlag = PatternFlag.NOFLAG) -> list[AnyStr | None]:
     return Pattern(pattern, flags).split(s, maxsplit, flags)
 
 
@@ -0,0 +1,170 @@
+from array import array
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Iterator
+
+from .nfa import NFA, Transition, Configuration, CounterOpKind
+
+
+@dataclass(frozen=True)
+class TransitionTable:
+    """
+    Transitions of all states in compressed sparse row layout
+
+    Transition groups of state `u` are `group_offsets[u]` to `group_offsets[u+1]`; group `g` has transition
+    `group_transitions[g]` (index into `CompactNFA.transitions`) and target states `targets[target_offsets[g]]`
+    to `targets[target_offsets[g+1]]`.
+
+    """
+    group_offsets: "array[int]"
+    group_transitions: "array[int]"
+    target_offsets: "array[int]"
+    targets: "array[int]"
+
+    @classmethod
+    def from_groups(cls, groups: list[list[tuple[int, list[int]]]]) -> "TransitionTable":
+        """Make table from (transition index, target states) groups of each state"""
+        group_offsets = array("i", [0])
+        group_transitions = array("i")
+        target_offsets = array("i", [0])
+        targets = array("i")
+        for groups_u in groups:
+            for transition_index, targets_g in groups_u:
+                group_transitions.append(transition_index)
+                targets.extend(targets_g)
+                target_offsets.append(len(targets))
+            group_offsets.append(len(group_transitions))
+        return cls(group_offsets, group_transitions, target_offsets, targets)
+
+    def reverse(self, num_states: int) -> "TransitionTable":
+        """Table of the same transitions from target states to source states"""
+        groups: list[dict[int, list[int]]] = [{} for _ in range(num_states)]
+        for u in range(num_states):
+            for transition_index, targets_g in self.iter_groups(u):
+                for v in targets_g:
+                    groups[v].setdefault(transition_index, []).append(u)
+        return TransitionTable.from_groups([list(d.items()) for d in groups])
+
+    def iter_groups(self, state: int) -> Iterator[tuple[int, "array[int]"]]:
+        """-> transition index, target states"""
+        for g in range(self.group_offsets[state], self.group_offsets[state+1]):
+            yield self.group_transitions[g], self.targets[self.target_offsets[g]:self.target_offsets[g+1]]
+
+
+@dataclass(frozen=True)
+class CompactNFA:
+    """
+    Frozen array-backed form of `NFA`, used for evaluation
+
+    States are `0, ..., num_states-1`. Each distinct `Transition` is stored once in `transitions`
+    and referenced by index, so that evaluation never hashes transitions. Epsilon and character
+    transitions are kept in separate tables.
+
+    """
+    num_states: int
+    initial_state: int
+    final_states: frozenset[int]
+    num_counters: int
+    transitions: tuple[Transition, ...]
+    epsilon_table: TransitionTable
+    character_table: TransitionTable
+
+    @classmethod
+    def from_nfa(cls, nfa: NFA) -> "CompactNFA":
+        num_states = len(nfa.states)
+        if set(nfa.states) != set(range(num_states)):
+            raise ValueError("expected NFA with states numbered from zero, use NFA.renumber_states()")
+
+        transition_index: dict[Transition, int] = {}
+        epsilon_groups: list[list[tuple[int, list[int]]]] = [[] for _ in range(num_states)]
+        character_groups: list[list[tuple[int, list[int]]]] = [[] for _ in range(num_states)]
+        for u, d in nfa.transitions.items():
+            for transition, vs in d.items():
+                i = transition_index.setdefault(transition, len(transition_index))
+                groups = character_groups if transition.consume_char else epsilon_groups
+                groups[u].append((i, sorted(vs)))
+
+        return cls(
+            num_states=num_states,
+            initial_state=nfa.initial_state,
+            final_states=frozenset(nfa.final_states),
+            num_counters=nfa.num_counters,
+            transitions=tuple(transition_index),
+            epsilon_table=TransitionTable.from_groups(epsilon_groups),
+            character_table=TransitionTable.from_groups(character_groups),
+        )
+
+    @cached_property
+    def waiting_states(self) -> frozenset[int]:
+        """States where heads can wait for the next character: states with character transitions and final states"""
+        offsets = self.character_table.group_offsets
+        return frozenset(u for u in range(self.num_states) if offsets[u] < offsets[u+1]) | self.final_states
+
+    @cached_property
+    def counter_orders(self) -> tuple[tuple[int, bool], ...]:
+        """
+        Largest `AT_LEAST` guard and whether there is a `LESS_THAN` guard, for each counter
+
+        See `dominates_counter()`.
+
+        """
+        at_least = [0] * self.num_counters
+        bounded = [False] * self.num_counters
+        for transition in self.transitions:
+            op = transition.counter_op
+            if op is not None and op.kind == CounterOpKind.AT_LEAST:
+                at_least[op.counter] = max(at_least[op.counter], op.value)
+            elif op is not None and op.kind == CounterOpKind.LESS_THAN:
+                bounded[op.counter] = True
+        return tuple(zip(at_least, bounded))
+
+    def dominates_counter(self, counter: int, x: int, y: int) -> bool:
+        """
+        Whether counter value `x` passes all guards that `y` passes after any sequence of operations
+
+        Increments preserve order of values and reset makes them equal, so with an upper bound
+        a smaller value dominates once it passes the lower bound; without one, a larger value does.
+
+        """
+        if x == y:
+            return True
+        at_least, bounded = self.counter_orders[counter]
+        if bounded:
+            return at_least <= x < y
+        return x > y or x >= at_least
+
+    @cached_property
+    def live_counters(self) -> tuple[tuple[int, ...], ...]:
+        """Counters of each state that may be checked by a guard before they are reset"""
+        live: list[set[int]] = [set() for _ in range(self.num_states)]
+        if not self.num_counters:
+            return tuple(() for _ in live)
+        reverse_tables = self.reverse_epsilon_table, self.reverse_character_table
+        stack = list(range(self.num_states))
+        while stack:
+            v = stack.pop()
+            for table in reverse_tables:
+                for i, us in table.iter_groups(v):
+                    op = self.transitions[i].counter_op
+                    live_u = live[v]
+                    if op is not None and op.kind == CounterOpKind.RESET:
+                        live_u = live_u - {op.counter}
+                    elif op is not None and op.kind in (CounterOpKind.LESS_THAN, CounterOpKind.AT_LEAST):
+                        live_u = live_u | {op.counter}
+                    for u in us:
+                        if not live_u <= live[u]:
+                            live[u] |= live_u
+                            stack.append(u)
+        return tuple(tuple(sorted(counters)) for counters in live)
+
+    @cached_property
+    def reverse_epsilon_table(self) -> TransitionTable:
+        return self.epsilon_table.reverse(self.num_states)
+
+    @cached_property
+    def reverse_character_table(self) -> TransitionTable:
+        return self.character_table.reverse(self.num_states)
+
+    @property
+    def initial_configuration(self) -> Configuration:
+        return self.initial_state, (0,) * self.num_counters
@@ -1,6 +1,9 @@
+from collections import deque
 from copy import deepcopy
 from dataclasses import dataclass
-from typing import Self
+from enum import Enum
+from functools import cached_property
+from typing import Any, Self
 from itertools import count
 
 from .rangeset import RangeSet
@@ -16,6 +19,58 @@ class TransitionPredicate:
         return self.previous is None and self.next is None
 
 
+class CounterOpKind(Enum):
+    RESET = "reset"
+    INCREMENT = "increment"
+    LESS_THAN = "less than"
+    AT_LEAST = "at least"
+
+
+@dataclass(frozen=True)
+class CounterOp:
+    """
+    Operation on repetition counter, used for bounded repetitions with large bounds
+
+    INCREMENT saturates at `value`, LESS_THAN and AT_LEAST are guards that block the transition
+    unless the counter satisfies them.
+
+    """
+    counter: int
+    kind: CounterOpKind
+    value: int = 0
+
+    def allows(self, counters: tuple[int, ...]) -> bool:
+        match self.kind:
+            case CounterOpKind.LESS_THAN:
+                return counters[self.counter] < self.value
+            case CounterOpKind.AT_LEAST:
+                return counters[self.counter] >= self.value
+            case _:
+                return True
+
+    def apply(self, counters: tuple[int, ...]) -> tuple[int, ...]:
+        match self.kind:
+            case CounterOpKind.RESET:
+                x = 0
+            case CounterOpKind.INCREMENT:
+                x = min(counters[self.counter] + 1, self.value)
+            case _:
+                return counters
+        return counters[:self.counter] + (x,) + counters[self.counter+1:]
+
+    @property
+    def label(self) -> str:
+        match self.kind:
+            case CounterOpKind.RESET:
+                return f"c{self.counter} := 0"
+            case CounterOpKind.INCREMENT:
+                return f"c{self.counter} += 1"
+            case CounterOpKind.LESS_THAN:
+                return f"c{self.counter} < {self.value}"
+            case CounterOpKind.AT_LEAST:
+                return f"c{self.counter} >= {self.value}"
+
+
 @dataclass(frozen=True)
 class Transition:
     predicates: tuple[TransitionPredicate, ...]
@@ -23,6 +78,7 @@ class Transition:
     begin_group: int | None = None
     end_group: int | None = None
     label: str = ""
+    counter_op: CounterOp | None = None
 
     def matches(self, c_previous: int, c_next: int) -> bool:
         for p in self.predicates:
@@ -33,12 +89,30 @@ class Transition:
             return True
         return False
 
-    @property
+    def allows(self, counters: tuple[int, ...]) -> bool:
+        return self.counter_op is None or self.counter_op.allows(counters)
+
+    def __hash__(self) -> int:
+        return self._hash_value
+
+    def __reduce__(self) -> Any:
+        # cached properties are not pickled, string hashes differ between processes
+        return type(self), (self.predicates, self.consume_char, self.begin_group, self.end_group, self.label,
+                            self.counter_op)
+
+    @cached_property
+    def _hash_value(self) -> int:
+        # transitions are hashed whenever they are looked up in `NFA.transitions`
+        return hash((self.predicates, self.consume_char, self.begin_group, self.end_group, self.label,
+                     self.counter_op))
+
+    @cached_property
     def is_trivial_epsilon(self) -> bool:
         return (
             not self.consume_char and
             self.begin_group is None and
             self.end_group is None and
+            self.counter_op is None and
             all(p.is_trivial for p in self.predicates)
         )
 
@@ -56,6 +130,13 @@ class Transition:
         return cls(predicates=(TransitionPredicate(),), consume_char=False, label=f"⟨end group {number}⟩",
                    end_group=number)
 
+    @classmethod
+    def make_counter_op(cls, op: CounterOp) -> Self:
+        return cls(predicates=(TransitionPredicate(),), consume_char=False, label=f"⟨{op.label}⟩", counter_op=op)
+
+
+Configuration = tuple[int, tuple[int, ...]]  # state, counter values
+
 
 @dataclass
 class NFA:
@@ -67,6 +148,7 @@ class NFA:
     initial_state: int
     final_states: set[int]
     transitions: dict[int, dict[Transition, set[int]]]
+    num_counters: int = 0
 
     def copy(self) -> "NFA":
         return deepcopy(self)
@@ -81,6 +163,7 @@ class NFA:
                 f[x]: {p: {f[y] for y in ys} for p, ys in d.items()}
                 for x, d in self.transitions.items()
             },
+            num_counters=self.num_counters,
         )
 
     def epsilon_closure(self, states: set[int], c_previous: int, c_next: int) -> set[int]:
@@ -96,6 +179,39 @@ class NFA:
             closure = new_closure
         return closure
 
+    @property
+    def num_transitions(self) -> int:
+        """Number of (state, transition, state) triples"""
+        return sum(len(vs) for d in self.transitions.values() for vs in d.values())
+
+    @property
+    def initial_configuration(self) -> Configuration:
+        return self.initial_state, (0,) * self.num_counters
+
+    def configuration_epsilon_closure(self, configurations: set[Configuration], c_previous: int, c_next: int) -> set[Configuration]:
+        """Like `epsilon_closure()`, but with counter values (needed when the NFA has counters)"""
+        closure = set(configurations)
+        stack = list(configurations)
+        while stack:
+            u, counters = stack.pop()
+            for p, vs in self.transitions.get(u, {}).items():
+                if not p.consume_char and p.matches(c_previous, c_next) and p.allows(counters):
+                    next_counters = p.counter_op.apply(counters) if p.counter_op is not None else counters
+                    for v in vs:
+                        if (v, next_counters) not in closure:
+                            closure.add((v, next_counters))
+                            stack.append((v, next_counters))
+        return closure
+
+    def configuration_step(self, configurations: set[Configuration], c_previous: int, c_next: int) -> set[Configuration]:
+        """Configurations after consuming `c_next`"""
+        output: set[Configuration] = set()
+        for u, counters in configurations:
+            for p, vs in self.transitions.get(u, {}).items():
+                if p.consume_char and p.matches(c_previous, c_next):
+                    output.update((v, counters) for v in vs)
+        return output
+
     def trivial_epsilon_closure(self, states: set[int]) -> set[int]:
         closure = set(states)
         while True:
@@ -109,47 +225,202 @@ class NFA:
             closure = new_closure
         return closure
 
-    def get_trivial_epsilon_free_nfa(self) -> "NFA":
-        states = set(self.states)
-        initial_state = self.initial_state
-        final_states = set(self.final_states)
-        transitions: dict[int, dict[Transition, set[int]]] = {}
+    def get_alphabet(self) -> RangeSet:
+        """Union of all characters that can be consumed by some transition"""
+        alphabet = RangeSet()
+        for d in self.transitions.values():
+            for p in d:
+                if p.consume_char:
+                    for predicate in p.predicates:
+                        alphabet |= predicate.next if predicate.next is not None else RangeSet(complement=True)
+        return alphabet
 
-        for u in self.states:
-            closure = self.trivial_epsilon_closure({u})
-            for v in closure:
-                transitions_u = transitions.setdefault(u, {})
-                for p, ws in self.transitions.get(v, {}).items():
-                    if not p.is_trivial_epsilon:
-                        transitions_u.setdefault(p, set()).update(ws)
+    def is_line_local(self) -> bool:
+        """
+        True if no match can contain a newline and newlines look the same as input boundaries to all transitions
 
-                if v in self.final_states:
-                    final_states.add(u)
+        Such automaton finds the same matches in a newline-delimited text as in each of its lines separately.
 
-        reachable_states = {initial_state}
-        while True:
-            new_reachable_states = set(reachable_states)
-            for u in reachable_states:
-                for vs in transitions.get(u, {}).values():
-                    new_reachable_states.update(vs)
-            if len(reachable_states) == len(new_reachable_states):
-                break
-            reachable_states = new_reachable_states
+        """
+        newline = ord("\n")
+        if newline in self.get_alphabet():
+            return False
+
+        for d in self.transitions.values():
+            for p in d:
+                # membership in predicate sets only changes at range boundaries
+                samples = {-1, newline, 0}
+                for predicate in p.predicates:
+                    for rs in (predicate.previous, predicate.next):
+                        if rs is not None:
+                            for x, y in rs.ranges:
+                                samples.update((x - 1, x, y))
+                for c in samples:
+                    if p.consume_char:
+                        # never taken at input end, and newline is not in the alphabet
+                        if c not in (-1, newline) and p.matches(-1, c) != p.matches(newline, c):
+                            return False
+                    elif p.matches(-1, c) != p.matches(newline, c) or p.matches(c, -1) != p.matches(c, newline):
+                        return False
+        return True
+
+    def get_final_distances(self) -> dict[int, int]:
+        """
+        Minimum number of characters that must be consumed to get from each state to a final state
+
+        States that cannot reach a final state are not included.
+
+        """
+        reverse_transitions: dict[int, list[tuple[int, int]]] = {}
+        for u, d in self.transitions.items():
+            for p, vs in d.items():
+                for v in vs:
+                    reverse_transitions.setdefault(v, []).append((u, 1 if p.consume_char else 0))
+
+        distances = {x: 0 for x in self.final_states}
+        queue = deque(self.final_states)
+        while queue:
+            v = queue.popleft()
+            for u, w in reverse_transitions.get(v, ()):
+                if u not in distances or distances[v] + w < distances[u]:
+                    distances[u] = distances[v] + w
+                    if w == 0:
+                        queue.appendleft(u)
+                    else:
+                        queue.append(u)
+        return distances
+
+    def get_trivial_epsilon_free_nfa(self) -> "NFA":
+        """
+        Equivalent NFA without trivial epsilon transitions, restricted to reachable states
 
-        for x in states - reachable_states:
-            if x in transitions:
-                transitions.pop(x)
+        Trivial epsilon closures are computed once per strongly connected component
+        of the trivial epsilon graph, only for components with reachable states, reusing
+        closures of components below it that are already known. Closures of the other
+        components are not stored, so a long chain of epsilon transitions (eg. from a union
+        of many words) takes linear and not quadratic memory.
 
-            for u, transitions_u in transitions.items():
-                for c, vs in list(transitions_u.items()):
-                    if x in vs:
-                        vs.remove(x)
-                        if not vs:
-                            transitions_u.pop(c)
+        """
+        scc_of, scc_members, scc_successors = self.get_trivial_epsilon_sccs()
+        scc_closures: dict[int, set[int]] = {}
+
+        def get_closure(u: int) -> set[int]:
+            c = scc_of[u]
+            closure = scc_closures.get(c)
+            if closure is None and not scc_successors[c]:
+                closure = scc_closures[c] = set(scc_members[c])
+            elif closure is None:
+                closure = set()
+                visited = {c}
+                stack = [c]
+                while stack:
+                    d = stack.pop()
+                    closure.update(scc_members[d])
+                    for e in scc_successors[d]:
+                        if e not in visited:
+                            visited.add(e)
+                            if e in scc_closures:
+                                closure |= scc_closures[e]
+                            else:
+                                stack.append(e)
+                scc_closures[c] = closure
+            return closure
+
+        final_states: set[int] = set()
+        transitions: dict[int, dict[Transition, set[int]]] = {}
+        reachable_states = [self.initial_state]
+        seen_states = {self.initial_state}
+        i = 0
+        while i < len(reachable_states):
+            u = reachable_states[i]
+            i += 1
+            transitions_u = transitions[u] = {}
+            for v in get_closure(u):
+                if v in self.final_states:
+                    final_states.add(u)
+                for p, ws in self.transitions.get(v, {}).items():
+                    if not p.is_trivial_epsilon:
+                        transitions_u.setdefault(p, set()).update(ws)
+                        for w in ws:
+                            if w not in seen_states:
+                                seen_states.add(w)
+                                reachable_states.append(w)
 
         return NFA(
-            states=list(sorted(reachable_states)),
-            initial_state=initial_state,
+            states=sorted(reachable_states),
+            initial_state=self.initial_state,
             final_states=final_states,
             transitions=transitions,
+            num_counters=self.num_counters,
         ).renumber_states()
+
+    def get_trivial_epsilon_sccs(self) -> tuple[dict[int, int], list[list[int]], list[set[int]]]:
+        """
+        Strongly connected components of the graph of trivial epsilon transitions (Tarjan's algorithm)
+
+        Returns SCC index of each state, states of each SCC, successor SCCs of each SCC.
+
+        """
+        successors: dict[int, list[int]] = {}
+        for u, d in self.transitions.items():
+            for p, vs in d.items():
+                if p.is_trivial_epsilon:
+                    successors.setdefault(u, []).extend(vs)
+        index: dict[int, int] = {}
+        lowlink: dict[int, int] = {}
+        stack: list[int] = []
+        on_stack: set[int] = set()
+        scc_of: dict[int, int] = {}
+        scc_members: list[list[int]] = []
+
+        for root in self.states:
+            if root in index:
+                continue
+            if root not in successors:
+                index[root] = len(index)
+                scc_of[root] = len(scc_members)
+                scc_members.append([root])
+                continue
+            work = [(root, 0)]
+            while work:
+                u, i = work.pop()
+                if i == 0:
+                    index[u] = lowlink[u] = len(index)
+                    stack.append(u)
+                    on_stack.add(u)
+                successors_u = successors.get(u, [])
+                while i < len(successors_u):
+                    v = successors_u[i]
+                    i += 1
+                    if v not in index:
+                        if v not in successors:
+                            # state without trivial epsilon transitions is an SCC by itself
+                            index[v] = len(index)
+                            scc_of[v] = len(scc_members)
+                            scc_members.append([v])
+                            continue
+                        work += [(u, i), (v, 0)]
+                        break
+                    elif v in on_stack:
+                        lowlink[u] = min(lowlink[u], index[v])
+                else:
+                    if lowlink[u] == index[u]:
+                        members = []
+                        while True:
+                            v = stack.pop()
+                            on_stack.remove(v)
+                            scc_of[v] = len(scc_members)
+                            members.append(v)
+                            if v == u:
+                                break
+                        scc_members.append(members)
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[u])
+
+        scc_successors: list[set[int]] = [set() for _ in scc_members]
+        for u, successors_u in successors.items():
+            for v in successors_u:
+                if scc_of[u] != scc_of[v]:
+                    scc_successors[scc_of[u]].add(scc_of[v])
+        return scc_of, scc_members, scc_successors
@@ -0,0 +1,283 @@
+from dataclasses import dataclass
+from typing import Hashable
+
+from .nfa import NFA, Transition, TransitionPredicate
+from .rangeset import RangeSet
+from ..common import root_logger
+
+logger = root_logger.getChild("nfa_reduction")
+
+Edges = dict[int, list[tuple[int, int]]]  # state -> (transition index, adjacent state)
+
+
+@dataclass(frozen=True)
+class ReductionReport:
+    """Sizes of NFA before and after `reduce_nfa()`, and what each step removed"""
+    states_before: int
+    states_after: int
+    transitions_before: int
+    transitions_after: int
+    trimmed_states: int
+    merged_transitions: int
+    forward_merged_states: int
+    backward_merged_states: int
+
+    def __str__(self) -> str:
+        return (f"states {self.states_before} -> {self.states_after}, "
+                f"transitions {self.transitions_before} -> {self.transitions_after} "
+                f"(trimmed {self.trimmed_states} states, merged {self.merged_transitions} parallel transitions, "
+                f"merged {self.forward_merged_states} + {self.backward_merged_states} bisimilar states)")
+
+
+def reduce_nfa(nfa: NFA) -> tuple[NFA, ReductionReport]:
+    """
+    Equivalent NFA with fewer states and transitions
+
+    Removes states that are unreachable or cannot reach a final state, unions parallel transitions
+    and merges states that are forward or backward bisimilar. Group tags, assertions and counter
+    operations are part of transitions, so they are preserved. Initial and final states,
+    and states with capture group tags on their transitions, are never merged with other states.
+
+    """
+    states_before, transitions_before = len(nfa.states), nfa.num_transitions
+
+    trimmed = trim(nfa)
+    merged = merge_parallel_transitions(trimmed)
+    forward = merge_bisimilar_states(merged)
+    backward = merge_bisimilar_states(forward, backward=True)
+    output = merge_parallel_transitions(backward)
+
+    report = ReductionReport(
+        states_before=states_before,
+        states_after=len(output.states),
+        transitions_before=transitions_before,
+        transitions_after=output.num_transitions,
+        trimmed_states=states_before - len(trimmed.states),
+        merged_transitions=(trimmed.num_transitions - merged.num_transitions) +
+                           (backward.num_transitions - output.num_transitions),
+        forward_merged_states=len(merged.states) - len(forward.states),
+        backward_merged_states=len(forward.states) - len(backward.states),
+    )
+    logger.info(f"reduced NFA: {report}")
+    return output, report
+
+
+def trim(nfa: NFA) -> NFA:
+    """Restrict NFA to states that are reachable from the initial state and can reach a final state"""
+    successors: dict[int, set[int]] = {}
+    predecessors: dict[int, set[int]] = {}
+    for u, d in nfa.transitions.items():
+        for vs in d.values():
+            successors.setdefault(u, set()).update(vs)
+            for v in vs:
+                predecessors.setdefault(v, set()).add(u)
+
+    reachable = get_reachable({nfa.initial_state}, successors)
+    coreachable = get_reachable(nfa.final_states, predecessors)
+    keep = (reachable & coreachable) | {nfa.initial_state} | nfa.final_states
+    if len(keep) == len(nfa.states):
+        return nfa
+
+    transitions: dict[int, dict[Transition, set[int]]] = {}
+    for u, d in nfa.transitions.items():
+        if u in keep:
+            transitions_u = transitions[u] = {}
+            for p, vs in d.items():
+                if vs_ := vs & keep:
+                    transitions_u[p] = vs_
+
+    return NFA(
+        states=[x for x in nfa.states if x in keep],
+        initial_state=nfa.initial_state,
+        final_states=set(nfa.final_states),
+        transitions=transitions,
+        num_counters=nfa.num_counters,
+    ).renumber_states()
+
+
+def get_reachable(states: set[int], successors: dict[int, set[int]]) -> set[int]:
+    reachable = set(states)
+    stack = list(states)
+    while stack:
+        u = stack.pop()
+        for v in successors.get(u, ()):
+            if v not in reachable:
+                reachable.add(v)
+                stack.append(v)
+    return reachable
+
+
+def merge_parallel_transitions(nfa: NFA) -> NFA:
+    """
+    Replace transitions between the same pair of states that differ only in predicates and label with one transition
+
+    Predicates of merged transitions are joined into one disjunction; character sets of predicates
+    with the same `previous` set are unioned.
+
+    """
+    merged_cache: dict[tuple[Transition, ...], Transition] = {}
+    transitions: dict[int, dict[Transition, set[int]]] = {}
+    for u, d in nfa.transitions.items():
+        parallel: dict[int, dict[Hashable, list[Transition]]] = {}
+        for p, vs in d.items():
+            key = (p.consume_char, p.begin_group, p.end_group, p.counter_op)
+            for v in vs:
+                parallel.setdefault(v, {}).setdefault(key, []).append(p)
+
+        transitions_u = transitions[u] = {}
+        for v, groups in parallel.items():
+            for ps in groups.values():
+                if len(ps) == 1:
+                    p = ps[0]
+                else:
+                    key_ = tuple(ps)
+                    if key_ not in merged_cache:
+                        merged_cache[key_] = merge_transitions(ps)
+                    p = merged_cache[key_]
+                transitions_u.setdefault(p, set()).add(v)
+
+    return NFA(
+        states=list(nfa.states),
+        initial_state=nfa.initial_state,
+        final_states=set(nfa.final_states),
+        transitions=transitions,
+        num_counters=nfa.num_counters,
+    )
+
+
+def merge_transitions(transitions: list[Transition]) -> Transition:
+    """Transition that is taken whenever one of `transitions` is taken (they must have the same effect)"""
+    predicates = tuple(p for t in transitions for p in t.predicates)
+    if any(p.is_trivial for p in predicates):
+        predicates = (TransitionPredicate(),)
+    else:
+        previous_to_next: dict[RangeSet | None, RangeSet | None] = {}
+        for p in predicates:
+            if p.previous not in previous_to_next:
+                previous_to_next[p.previous] = p.next
+            else:
+                next_ = previous_to_next[p.previous]
+                previous_to_next[p.previous] = None if next_ is None or p.next is None else next_ | p.next
+        predicates = tuple(TransitionPredicate(previous, next_) for previous, next_ in previous_to_next.items())
+
+    t = transitions[0]
+    return Transition(
+        predicates=predicates,
+        consume_char=t.consume_char,
+        begin_group=t.begin_group,
+        end_group=t.end_group,
+        label="|".join(dict.fromkeys(t.label for t in transitions)),
+        counter_op=t.counter_op,
+    )
+
+
+def merge_bisimilar_states(nfa: NFA, backward: bool = False) -> NFA:
+    """
+    Quotient of NFA by the coarsest forward (or backward) bisimulation
+
+    Forward bisimilar states have transitions with the same labels into the same blocks,
+    so they accept the same suffixes; backward bisimilar states are reached by the same
+    prefixes. States of the merged block are replaced by the lowest-numbered one.
+
+    """
+    transition_index: dict[Transition, int] = {}
+    successors: Edges = {}
+    predecessors: Edges = {}
+    for u, d in nfa.transitions.items():
+        for p, vs in d.items():
+            i = transition_index.setdefault(p, len(transition_index))
+            for v in vs:
+                successors.setdefault(u, []).append((i, v))
+                predecessors.setdefault(v, []).append((i, u))
+
+    # states around capture group tags are not merged: heads that took different tags would meet
+    # in the merged state earlier than in the original NFA, which can change the groups that are kept
+    tagged_states: set[int] = set()
+    for u, d in nfa.transitions.items():
+        for p, vs in d.items():
+            if (p.begin_group or 0) > 0 or (p.end_group or 0) > 0:
+                tagged_states.add(u)
+                tagged_states.update(vs)
+    keys: dict[int, Hashable] = {
+        x: ("tagged", x) if x in tagged_states else (x == nfa.initial_state, x in nfa.final_states)
+        for x in nfa.states
+    }
+    if backward:
+        block_of = get_bisimulation_blocks(keys, predecessors, successors)
+    else:
+        block_of = get_bisimulation_blocks(keys, successors, predecessors)
+
+    representative: dict[int, int] = {}
+    for x in nfa.states:
+        representative.setdefault(block_of[x], x)
+    if len(representative) == len(nfa.states):
+        return nfa
+
+    f = {x: representative[block_of[x]] for x in nfa.states}
+    transitions: dict[int, dict[Transition, set[int]]] = {}
+    for u, d in nfa.transitions.items():
+        transitions_u = transitions.setdefault(f[u], {})
+        for p, vs in d.items():
+            transitions_u.setdefault(p, set()).update(f[v] for v in vs)
+
+    return NFA(
+        states=sorted(representative.values()),
+        initial_state=f[nfa.initial_state],
+        final_states={f[x] for x in nfa.final_states},
+        transitions=transitions,
+        num_counters=nfa.num_counters,
+    ).renumber_states()
+
+
+def get_bisimulation_blocks(keys: dict[int, Hashable], edges: Edges, reverse_edges: Edges) -> dict[int, int]:
+    """
+    Coarsest partition of states that refines `keys` and where states of each block have the same edges into blocks
+
+    Partition refinement with a worklist of states whose signature may have changed: when a state
+    moves to a new block, states with an edge into it are rechecked. States of a block that were
+    not rechecked keep a common signature, so only the rechecked ones need to be compared to it.
+
+    """
+    block_of: dict[int, int] = {}
+    members: list[set[int]] = []
+    key_to_block: dict[Hashable, int] = {}
+    for x, key in keys.items():
+        b = key_to_block.setdefault(key, len(members))
+        if b == len(members):
+            members.append(set())
+        members[b].add(x)
+        block_of[x] = b
+
+    def get_signature(x: int) -> frozenset[tuple[int, int]]:
+        return frozenset((i, block_of[y]) for i, y in edges.get(x, ()))
+
+    dirty: dict[int, set[int]] = {b: set(xs) for b, xs in enumerate(members)}
+    while dirty:
+        b, dirty_states = dirty.popitem()
+        dirty_states &= members[b]
+        clean_state = next((x for x in members[b] if x not in dirty_states), None)
+
+        groups: dict[frozenset[tuple[int, int]], list[int]] = {}
+        for x in dirty_states:
+            groups.setdefault(get_signature(x), []).append(x)
+        if clean_state is not None:
+            staying = groups.get(get_signature(clean_state), [])
+        else:
+            staying = max(groups.values(), key=len, default=[])
+
+        moved: list[int] = []
+        for group in groups.values():
+            if group is staying:
+                continue
+            new_block = len(members)
+            members.append(set(group))
+            members[b].difference_update(group)
+            for x in group:
+                block_of[x] = new_block
+            moved += group
+
+        for x in moved:
+            for _, y in reverse_edges.get(x, ()):
+                dirty.setdefault(block_of[y], set()).add(y)
+
+    return block_of
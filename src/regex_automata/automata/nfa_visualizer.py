@@ -1,26 +1,60 @@
+import math
+
 import graphviz  # type: ignore[import-untyped]
 
-from .nfa import NFA
+from .nfa import NFA, Transition
+
+TransitionKey = tuple[int, Transition, int]  # state, transition, target state
 
 
 class NFAVisualizer:
-    def __init__(self, nfa: NFA) -> None:
+    """
+    Renders NFA with graphviz
+
+    With `state_weights` and `transition_weights` (eg. hit counts from profiling), states are
+    filled and edges are colored and thickened from white/gray to red by weight, on log scale.
+
+    """
+    def __init__(self, nfa: NFA, state_weights: dict[int, int] | None = None,
+                 transition_weights: dict[TransitionKey, int] | None = None) -> None:
         self.nfa = nfa
+        self.state_weights = state_weights
+        self.transition_weights = transition_weights
 
     def get_digraph_dot(self) -> graphviz.Digraph:
         g = graphviz.Digraph()
         g.attr(rankdir='LR')
         g.node("", shape="none")
+        max_state_weight = max(self.state_weights.values(), default=0) if self.state_weights is not None else 0
         for u in self.nfa.states:
-            g.node(str(u), shape="doublecircle" if u in self.nfa.final_states else "circle")
+            attrs = {"shape": "doublecircle" if u in self.nfa.final_states else "circle"}
+            if self.state_weights is not None:
+                w = self.state_weights.get(u, 0)
+                heat = get_heat(w, max_state_weight)
+                attrs.update(label=f"{u}\n{w}", style="filled", fillcolor=f"0.000 {heat:.3f} 1.000")
+            g.node(str(u), **attrs)
         g.edge("", str(self.nfa.initial_state))
+        max_transition_weight = max(self.transition_weights.values(), default=0) if self.transition_weights is not None else 0
         for u, d in self.nfa.transitions.items():
             for p, vs in d.items():
                 label = p.label.replace("\\", "\\\\")
                 for v in vs:
-                    g.edge(str(u), str(v), label=label)
+                    if self.transition_weights is not None:
+                        w = self.transition_weights.get((u, p, v), 0)
+                        heat = get_heat(w, max_transition_weight)
+                        g.edge(str(u), str(v), label=f"{label} ({w})", penwidth=f"{1 + 4 * heat:.2f}",
+                               color=f"0.000 {heat:.3f} {0.5 + 0.5 * heat:.3f}")
+                    else:
+                        g.edge(str(u), str(v), label=label)
         return g
 
     def render(self, output_path: str = "nfa.png") -> None:
         dot = self.get_digraph_dot()
         dot.render(outfile=output_path)
+
+
+def get_heat(weight: int, max_weight: int) -> float:
+    """-> 0 (no hits) to 1 (most hits), on log scale"""
+    if max_weight <= 0:
+        return 0.0
+    return math.log1p(weight) / math.log1p(max_weight)
@@ -1,17 +1,62 @@
+import operator
+import sys
+from array import array
 from collections.abc import Set, Hashable
+from functools import cache
 from itertools import chain
-from typing import Iterable, Tuple, Iterator, Self, Any
-from bisect import bisect_left
+from threading import Lock
+from typing import Callable, Iterable, Tuple, Iterator, Self, Any
+from bisect import bisect_left, bisect_right
+from weakref import WeakValueDictionary
+
+
+_RANGESET_TABLE: "WeakValueDictionary[tuple[bytes, bool], RangeSet]" = WeakValueDictionary()
+_RANGESET_TABLE_LOCK = Lock()
 
 
 class RangeSet(Set[int], Hashable):
-    def __init__(self, values: Iterable[int] = (), ranges: Iterable[Tuple[int, int]] = (), complement: bool = False) -> None:
-        self._ranges = tuple(self._merge_sorted_ranges(sorted(chain(ranges, ((x, x + 1) for x in values)))))
-        self._complement = complement
+    """
+    Set of integers (character codes) made of half-open ranges, possibly complemented
+
+    Ranges are stored as a flat array of sorted boundaries (start, end, start, end, ...);
+    a complement set stores the ranges it does not contain. Set operations merge
+    the boundary arrays in linear time. Instances are immutable and interned, so equal sets
+    share one object and its precomputed hash.
+
+    """
+    __slots__ = ("_bounds", "_complement", "_hash_value", "__weakref__")
+
+    _bounds: "array[int]"
+    _complement: bool
+    _hash_value: int
+
+    def __new__(cls, values: Iterable[int] = (), ranges: Iterable[Tuple[int, int]] = (), complement: bool = False) -> Self:
+        bounds = array("q")
+        for x, y in cls._merge_sorted_ranges(sorted(chain(ranges, ((x, x + 1) for x in values)))):
+            bounds.append(x)
+            bounds.append(y)
+        return cls._from_bounds(bounds, complement)
+
+    @classmethod
+    def _from_bounds(cls, bounds: "array[int]", complement: bool) -> Self:
+        key = (bounds.tobytes(), complement)
+        with _RANGESET_TABLE_LOCK:
+            rs = _RANGESET_TABLE.get(key)
+            if rs is None:
+                rs = object.__new__(cls)
+                rs._bounds = bounds
+                rs._complement = complement
+                rs._hash_value = hash(key)
+                _RANGESET_TABLE[key] = rs
+        return rs  # type: ignore[return-value]
+
+    def __reduce__(self) -> Any:
+        return RangeSet, ((), self.ranges, self._complement)
 
     @property
     def ranges(self) -> tuple[tuple[int, int], ...]:
-        return self._ranges
+        b = self._bounds
+        return tuple(zip(b[::2], b[1::2]))
 
     @property
     def complement(self) -> bool:
@@ -19,7 +64,7 @@ class RangeSet(Set[int], Hashable):
 
     @property
     def empty(self) -> bool:
-        return not self._ranges and not self._complement
+        return not self._bounds and not self._complement
 
     @staticmethod
     def _merge_sorted_ranges(ranges: Iterable[tuple[int, int]]) -> list[tuple[int, int]]:
@@ -51,55 +96,117 @@ class RangeSet(Set[int], Hashable):
     def __len__(self) -> int:
         if self._complement:
             raise ValueError("__len__ is only implemented for non-complementary sets")
-        return sum(y - x for x, y in self._ranges)
+        b = self._bounds
+        return sum(b[1::2]) - sum(b[::2])
 
     def __iter__(self) -> Iterator[int]:
         if self._complement:
             raise ValueError("__iter__ is only implemented for non-complementary sets")
-        for x, y in self._ranges:
+        for x, y in self.ranges:
             yield from range(x, y)
 
     def __contains__(self, x: object) -> bool:
         if not isinstance(x, int):
             raise TypeError("only int is supported")
-
-        if not self._ranges:
-            found = False
-        else:
-            ymax = self._ranges[-1][1]
-            i = bisect_left(self._ranges, (x, ymax + 1)) - 1
-            found = i < len(self._ranges) and self._ranges[i][0] <= x < self._ranges[i][1]
-        return found if not self._complement else not found
+        # x is inside a range iff an odd number of boundaries is less than or equal to it
+        return bool(bisect_right(self._bounds, x) & 1) != self._complement
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, RangeSet):
-            return self._ranges == other._ranges and self._complement == other._complement
+            return self is other or (self._complement == other._complement and self._bounds == other._bounds)
         return NotImplemented
 
+    def __hash__(self) -> int:
+        return self._hash_value
+
+    def __invert__(self) -> Self:
+        return self._from_bounds(self._bounds, not self._complement)
+
     def __or__(self, other: object) -> Self:
-        if isinstance(other, RangeSet):
-            if not self._complement and not other._complement:
-                return RangeSet(ranges=self._merge_sorted_ranges(sorted(chain(self._ranges, other._ranges))))  # type: ignore[return-value]
-        return super().__or__(other)  # type: ignore[operator,return-value]
+        return self._combine(other, operator.or_)
 
     def __and__(self, other: object) -> Self:
-        if isinstance(other, RangeSet):
-            if self._complement and other._complement:
-                return RangeSet(ranges=self._merge_sorted_ranges(sorted(chain(self._ranges, other._ranges))))  # type: ignore[return-value]
-        return super().__and__(other)  # type: ignore[operator,return-value]
+        return self._combine(other, operator.and_)
 
-    def __hash__(self) -> int:
-        return hash((self._ranges, self._complement))
+    def __sub__(self, other: object) -> Self:
+        return self._combine(other, lambda a, b: a and not b)
+
+    def __xor__(self, other: object) -> Self:
+        return self._combine(other, operator.xor)
+
+    __ror__ = __or__
+    __rand__ = __and__
+    __rxor__ = __xor__
+
+    def __rsub__(self, other: object) -> Self:
+        return self._combine(other, lambda a, b: b and not a)
+
+    def __le__(self, other: object) -> bool:
+        if not isinstance(other, Set):
+            return NotImplemented
+        return (self - other).empty
+
+    def __lt__(self, other: object) -> bool:
+        if not isinstance(other, Set):
+            return NotImplemented
+        return self <= other and self != other
+
+    def __ge__(self, other: object) -> bool:
+        if not isinstance(other, Set):
+            return NotImplemented
+        return self._coerce(other) <= self
+
+    def __gt__(self, other: object) -> bool:
+        if not isinstance(other, Set):
+            return NotImplemented
+        return self >= other and self != other
+
+    def isdisjoint(self, other: Iterable[Any]) -> bool:
+        return (self & self._coerce(other)).empty
+
+    @classmethod
+    def _coerce(cls, other: Iterable[Any]) -> "RangeSet":
+        return other if isinstance(other, RangeSet) else RangeSet(other)
+
+    def _combine(self, other: object, op: Callable[[bool, bool], bool]) -> Self:
+        """Set of `x` such that `op(x in self, x in other)`, by a single merge of boundary arrays"""
+        if not isinstance(other, Iterable):
+            return NotImplemented  # type: ignore[no-any-return]
+        other_ = self._coerce(other)
+        a, b = self._bounds, other_._bounds
+        n, m = len(a), len(b)
+        in_a, in_b = self._complement, other_._complement
+        complement = inside = op(in_a, in_b)  # membership below the first boundary
+        bounds = array("q")
+        i = j = 0
+        while i < n or j < m:
+            if j == m or (i < n and a[i] < b[j]):
+                x = a[i]
+                i += 1
+                in_a = not in_a
+            elif i == n or b[j] < a[i]:
+                x = b[j]
+                j += 1
+                in_b = not in_b
+            else:
+                x = a[i]
+                i += 1
+                j += 1
+                in_a, in_b = not in_a, not in_b
+            if op(in_a, in_b) != inside:
+                inside = not inside
+                bounds.append(x)
+        return self._from_bounds(bounds, complement)
 
     def __repr__(self) -> str:
         if self._complement:
-            return f"RangeSet({self._ranges!r}, complement={self._complement!r})"
+            return f"RangeSet({self.ranges!r}, complement={self._complement!r})"
         else:
-            return f"RangeSet({self._ranges!r})"
+            return f"RangeSet({self.ranges!r})"
 
     def to_dict(self) -> dict[str, Any]:
         return {
-            "ranges": self._ranges,
+            "ranges": self.ranges,
             "complement": self._complement,
         }
 
@@ -111,14 +218,74 @@ class RangeSet(Set[int], Hashable):
         )
 
 
+def fold_case(rs: RangeSet, ascii_only: bool = False) -> RangeSet:
+    """
+    Close character set under case equivalence, for case-insensitive matching
+
+    A complement set excludes all case variants of the excluded characters, so that `[^a]` does
+    not match `A`. With `ascii_only`, only ASCII letters are folded (like `bytes.lower()`).
+
+    """
+    if rs.complement:
+        return ~fold_case(~rs, ascii_only)
+    cased, variants = _get_case_variants(ascii_only)
+    extra: list[int] = []
+    for x, y in rs.ranges:
+        for i in range(bisect_left(cased, x), bisect_left(cased, y)):
+            extra.extend(variants[cased[i]])
+    return rs | RangeSet(extra) if extra else rs
+
+
+@cache
+def get_case_fold_table(ascii_only: bool = False) -> dict[int, int]:
+    """Character -> smallest character that is case-equivalent to it, for characters that have case variants"""
+    _, variants = _get_case_variants(ascii_only)
+    return {x: min(x, *ys) for x, ys in variants.items() if min(ys) < x}
+
+
+@cache
+def _get_case_variants(ascii_only: bool) -> tuple[list[int], dict[int, tuple[int, ...]]]:
+    """-> sorted characters that have other case variants, the other variants of each character"""
+    # characters are equivalent if one is the single-character lowercase or uppercase of the other,
+    # equivalence classes are found with union-find (eg. "s", "S" and long s are one class)
+    parent: dict[int, int] = {}
+
+    def find(x: int) -> int:
+        while (y := parent.get(x, x)) != x:
+            x = y
+        return x
+
+    limit = 128 if ascii_only else sys.maxunicode + 1
+    block_size = 128
+    for block_start in range(0, limit, block_size):
+        block = "".join(map(chr, range(block_start, block_start + block_size)))
+        if block.lower() == block and block.upper() == block:
+            continue  # no cased characters
+        for c in block:
+            for v in (c.lower(), c.upper()):
+                if len(v) == 1 and v != c:
+                    a, b = find(ord(c)), find(ord(v))
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+
+    classes: dict[int, list[int]] = {}
+    for x in parent.keys() | parent.values():
+        classes.setdefault(find(x), []).append(x)
+    variants = {x: tuple(y for y in members if y != x) for members in classes.values() for x in members}
+    return sorted(variants), variants
+
+
 WORD_RANGESET = RangeSet(
     values=[ord("_")],
     ranges=[(ord("a"), ord("z")+1), (ord("A"), ord("Z")+1), (ord("0"), ord("9")+1)]
 )
 NONWORD_RANGESET = RangeSet(ranges=WORD_RANGESET.ranges, complement=True)
 WHITESPACE_RANGESET = RangeSet(
-    values=map(ord, "\f\n\r\t\v\u0020\u00a0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000\ufeff")
+    values=map(ord, "\f\n\r\t\v\u0020\u00a0\u1680\u2028\u2029\u202f\u205f\u3000\ufeff"),
+    ranges=[(0x2000, 0x200b)],
 )
 NONWHITESPACE_RANGESET = RangeSet(ranges=WHITESPACE_RANGESET.ranges, complement=True)
+ASCII_RANGESET = RangeSet(ranges=[(0, 128)])
+BYTE_RANGESET = RangeSet(ranges=[(0, 256)])
 DIGIT_RANGESET = RangeSet(ranges=[(ord("0"), ord("9")+1)])
 NONDIGIT_RANGESET = RangeSet(ranges=DIGIT_RANGESET.ranges, complement=True)
@@ -0,0 +1,3 @@
+from regex_automata.bench.throughput import main
+
+main()
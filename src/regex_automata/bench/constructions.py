@@ -0,0 +1,62 @@
+"""
+Benchmark: Thompson construction (with epsilon elimination) versus Glushkov position automaton
+
+Run with `python -m regex_automata.bench.constructions`. For each pattern, reports compile time,
+number of NFA states and transitions, and search throughput of the resulting NFA.
+
+"""
+import argparse
+import time
+
+from regex_automata import Pattern, compile
+from regex_automata.regex.pattern import Construction
+from regex_automata.bench.threads import make_texts
+
+CONSTRUCTIONS: tuple[Construction, ...] = ("thompson", "glushkov")
+
+DEFAULT_PATTERNS = [
+    r"(GET|POST) (/\S+).*status=(\d+)",
+    r"\b(alice|bob|carol|dave)\b",
+    r"id=\d{3,8}",
+    r"(a|b|c|d|e|f|g|h|i|j|k|l|m|n|o|p)*status",
+    "|".join(f"word{i}" for i in range(200)),
+]
+
+
+def measure_compile(pattern: str, construction: Construction, repeat: int) -> tuple[Pattern, float]:
+    """-> compiled pattern, seconds per compilation"""
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        p = compile(pattern, construction=construction)
+    return p, (time.perf_counter() - t0) / repeat
+
+
+def measure_search(pattern: Pattern, texts: list[str]) -> float:
+    """-> characters searched per second"""
+    t0 = time.perf_counter()
+    for text in texts:
+        for _ in pattern.finditer(text):
+            pass
+    return sum(map(len, texts)) / (time.perf_counter() - t0)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("patterns", nargs="*", default=DEFAULT_PATTERNS)
+    parser.add_argument("--texts", type=int, default=20)
+    parser.add_argument("--length", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5, help="number of compilations to average")
+    args = parser.parse_args(argv)
+
+    texts = make_texts(args.texts, args.length)
+    print(f"{'construction':>12} {'compile ms':>10} {'states':>7} {'transitions':>11} {'chars/s':>9}  pattern")
+    for pattern in args.patterns:
+        for construction in CONSTRUCTIONS:
+            p, compile_time = measure_compile(pattern, construction, args.repeat)
+            throughput = measure_search(p, texts)
+            print(f"{construction:>12} {1000 * compile_time:>10.2f} {len(p.nfa.states):>7} {p.nfa.num_transitions:>11} "
+                  f"{throughput:>9.0f}  {pattern[:40]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Synthetic corpora for benchmarks, generated locally from a seed
+
+Each generator returns lines of text with total length of about `size` characters.
+
+"""
+import random
+from typing import Callable
+
+Corpus = Callable[[int, int], list[str]]
+
+USERS = ["alice", "bob", "carol", "dave", "eve", "mallory", "trent", "-"]
+PATHS = ["/", "/index.html", "/api/v1/items", "/api/v1/items/{}", "/api/v1/users/{}/orders", "/static/app.{}.js",
+         "/login", "/search?q={}&page=2"]
+AGENTS = ["Mozilla/5.0 (X11; Linux x86_64)", "curl/8.5.0", "python-requests/2.32", "Googlebot/2.1"]
+IDENTIFIERS = ["value", "result", "items", "index", "buffer", "count", "node", "parent", "text", "offset"]
+KEYWORDS = ["def", "return", "if", "else", "for", "while", "class", "import", "from", "with", "yield", "lambda"]
+
+
+def make_lines(make_line: Callable[[random.Random], str], size: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        line = make_line(rng)
+        lines.append(line)
+        total += len(line) + 1
+    return lines
+
+
+def make_access_log(size: int, seed: int = 0) -> list[str]:
+    """Web server log in combined log format"""
+    def make_line(rng: random.Random) -> str:
+        ip = ".".join(str(rng.randrange(1, 255)) for _ in range(4))
+        path = rng.choice(PATHS).format(rng.randrange(100_000))
+        method = rng.choice(["GET", "GET", "GET", "POST", "PUT", "DELETE"])
+        status = rng.choice([200, 200, 200, 201, 204, 301, 304, 400, 403, 404, 500])
+        timestamp = f"{rng.randrange(1, 29):02d}/Oct/2024:{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d} +0000"
+        return (f'{ip} - {rng.choice(USERS)} [{timestamp}] "{method} {path} HTTP/1.1" {status} {rng.randrange(20_000)} '
+                f'"-" "{rng.choice(AGENTS)}"')
+    return make_lines(make_line, size, seed)
+
+
+def make_csv(size: int, seed: int = 0) -> list[str]:
+    """Table of orders with quoted fields, dates and decimal numbers"""
+    def make_line(rng: random.Random) -> str:
+        return ",".join([
+            str(rng.randrange(1_000_000)),
+            f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+            rng.choice(USERS),
+            f'"{rng.choice(IDENTIFIERS)}, {rng.choice(IDENTIFIERS)}"',
+            f"{rng.randrange(100_000) / 100:.2f}",
+            rng.choice(["EUR", "USD", "CZK"]),
+        ])
+    return ["id,date,user,item,price,currency"] + make_lines(make_line, size, seed)
+
+
+def make_source_code(size: int, seed: int = 0) -> list[str]:
+    """Python-like source code with identifiers, string literals, numbers and comments"""
+    def make_line(rng: random.Random) -> str:
+        indent = "    " * rng.randrange(4)
+        a, b = rng.choice(IDENTIFIERS), rng.choice(IDENTIFIERS)
+        match rng.randrange(5):
+            case 0:
+                return f"{indent}{rng.choice(KEYWORDS)} {a} in {b}:"
+            case 1:
+                return f"{indent}{a} = {b}[{rng.randrange(100)}] + {rng.random():.4f}"
+            case 2:
+                return f'{indent}{a}.append("{b} {rng.randrange(1000)}")  # TODO {rng.choice(USERS)}'
+            case 3:
+                return f"{indent}def {a}_{b}(self, {a}: int = {rng.randrange(10)}) -> None:"
+            case _:
+                return f"{indent}return {a} if {b} else None"
+    return make_lines(make_line, size, seed)
+
+
+def make_keywords(size: int, seed: int = 0) -> list[str]:
+    """Prose-like lines of lowercase words, some of which are from `make_keyword_list()`"""
+    keywords = make_keyword_list()
+    rng_words = random.Random(seed + 1)
+    words = ["".join(rng_words.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng_words.randrange(2, 10)))
+             for _ in range(2000)]
+
+    def make_line(rng: random.Random) -> str:
+        return " ".join(rng.choice(keywords) if rng.random() < 0.05 else rng.choice(words)
+                        for _ in range(rng.randrange(5, 15)))
+    return make_lines(make_line, size, seed)
+
+
+def make_keyword_list(n: int = 200, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return sorted({"".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randrange(5, 12)))
+                   for _ in range(n)})
+
+
+CORPORA: dict[str, Corpus] = {
+    "access_log": make_access_log,
+    "csv": make_csv,
+    "source_code": make_source_code,
+    "keywords": make_keywords,
+}
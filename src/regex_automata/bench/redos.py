@@ -0,0 +1,128 @@
+"""
+Benchmark: classic catastrophic backtracking (ReDoS) patterns at increasing input sizes
+
+Run with `python -m regex_automata.bench.redos`. For each pattern and API, times one call
+at each input size and fits the growth exponent of runtime versus input length (1 is linear,
+2 is quadratic). The same is done for evaluator steps counted by `MatchStats`, which do not
+depend on timing noise. A backtracking engine like `re` is exponential on most of these inputs.
+
+"""
+import argparse
+import json
+import math
+import statistics
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable, Sequence
+
+from regex_automata import Pattern, MatchStats, compile
+
+
+@dataclass(frozen=True)
+class PathologicalCase:
+    pattern: str
+    unit: str  # input is `unit` repeated to the given length, followed by `suffix`
+    suffix: str = ""
+
+    def make_text(self, size: int) -> str:
+        return (self.unit * (size // len(self.unit) + 1))[:size] + self.suffix
+
+
+CASES = [
+    PathologicalCase(r"(a|a)*b", "a"),
+    PathologicalCase(r"(a*)*b", "a"),
+    PathologicalCase(r"(x+x+)+y", "x"),
+    PathologicalCase(r"^(a|aa)+$", "a", "!"),
+    PathologicalCase(r"^(\w+\s?)*$", "word ", "!"),
+    PathologicalCase(r"(a{2,3}){2,3}b", "a"),
+    PathologicalCase(r"(a{1,20}){60,}b", "a"),  # large enough to be compiled using a counter
+    PathologicalCase(r"(\b\w+\b[ ,]*)+\.", "ab, "),
+    PathologicalCase(r".*.*=.*;", "x="),
+    PathologicalCase(r"a.*b", "a", "b"),  # every position starts a match, all of them overlap
+]
+
+APIS: dict[str, Callable[[Pattern, str, MatchStats], object]] = {
+    "search": lambda p, text, stats: p.search(text, stats=stats),
+    "finditer": lambda p, text, stats: list(p.finditer(text, stats=stats)),
+    "sub": lambda p, text, stats: p.sub("", text, stats=stats),
+    "split": lambda p, text, stats: p.split(text, stats=stats),
+    "all_matches": lambda p, text, stats: list(p.finditer(text, all_matches=True, stats=stats)),
+}
+
+DEFAULT_SIZES = (100, 200, 400, 800, 1600)
+
+
+@dataclass(frozen=True)
+class GrowthResult:
+    pattern: str
+    api: str
+    sizes: list[int]
+    seconds: list[float]
+    exponent: float
+    steps: list[int]  # characters scanned, heads processed and epsilon closure iterations, see `MatchStats`
+    steps_exponent: float
+
+
+def fit_exponent(sizes: Sequence[int], values: Sequence[float]) -> float:
+    """Slope of log(value) versus log(size), ie. `k` in `value ~ size**k`"""
+    slope, _ = statistics.linear_regression([math.log(n) for n in sizes], [math.log(t) for t in values])
+    return slope
+
+
+def measure_growth(pattern: Pattern, api: str, case: PathologicalCase, sizes: tuple[int, ...] = DEFAULT_SIZES,
+                   repeat: int = 3, max_seconds: float = 2.0) -> GrowthResult:
+    """
+    Time `api` at each size (best of `repeat`), count its steps and fit the growth exponents
+
+    Larger sizes are skipped once a call takes longer than `max_seconds`, so that superlinear
+    cases finish quickly; at least two sizes are always measured.
+
+    """
+    fn = APIS[api]
+    sizes_: list[int] = []
+    seconds: list[float] = []
+    steps: list[int] = []
+    for size in sizes:
+        text = case.make_text(size)
+        best = math.inf
+        for _ in range(repeat):
+            stats = MatchStats()
+            t0 = time.perf_counter()
+            fn(pattern, text, stats)
+            best = min(best, time.perf_counter() - t0)
+        sizes_.append(size)
+        seconds.append(best)
+        steps.append(stats.characters_scanned + stats.heads_processed + stats.epsilon_closure_iterations)
+        if best > max_seconds and len(sizes_) >= 2:
+            break
+    return GrowthResult(case.pattern, api, sizes_, seconds, fit_exponent(sizes_, seconds),
+                        steps, fit_exponent(sizes_, steps))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", action="append", choices=list(APIS), help="API to run (default: all)")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated input sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="skip larger sizes after a call this slow")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    sizes = tuple(map(int, args.sizes.split(",")))
+    results = []
+    print(f"{'api':>12} {'exponent':>8} {'steps':>8} {'max size':>8} {'seconds':>8}  pattern")
+    for case in CASES:
+        p = compile(case.pattern)
+        for api in args.api or list(APIS):
+            r = measure_growth(p, api, case, sizes, args.repeat, args.max_seconds)
+            results.append(r)
+            print(f"{r.api:>12} {r.exponent:>8.2f} {r.steps_exponent:>8.2f} {r.sizes[-1]:>8} {r.seconds[-1]:>8.3f}  "
+                  f"{r.pattern}")
+
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump([asdict(r) for r in results], fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Stress benchmark: one shared `Pattern` searched from many threads at once
+
+Run with `python -m regex_automata.bench.threads`. With the GIL, throughput stays flat as threads
+are added; on free-threaded builds (3.13t, 3.14t) it should scale with the number of cores.
+
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from regex_automata import Pattern, compile
+
+
+def is_gil_enabled() -> bool:
+    f = getattr(sys, "_is_gil_enabled", None)
+    return True if f is None else bool(f())
+
+
+def make_texts(n: int, length: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    words = ["GET", "POST", "/api/v1/items", "user=alice", "id=12345", "status=200", "took", "ms", "ERROR", "-"]
+    return [" ".join(rng.choice(words) for _ in range(length // 6)) for _ in range(n)]
+
+
+def measure_throughput(pattern: Pattern, texts: list[str], threads: int, repeat: int = 1) -> float:
+    """-> characters searched per second, summed over all threads"""
+    barrier = threading.Barrier(threads + 1)
+    num_chars = sum(map(len, texts))
+
+    def worker() -> None:
+        barrier.wait()
+        for _ in range(repeat):
+            for text in texts:
+                for _ in pattern.finditer(text):
+                    pass
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(worker) for _ in range(threads)]
+        barrier.wait()
+        t0 = time.perf_counter()
+        for f in futures:
+            f.result()
+        elapsed = time.perf_counter() - t0
+
+    return threads * repeat * num_chars / elapsed
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pattern", default=r"(GET|POST) (/\S+).*status=(\d+)")
+    parser.add_argument("--threads", default="1,2,4,8", help="comma-separated thread counts")
+    parser.add_argument("--texts", type=int, default=50)
+    parser.add_argument("--length", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    pattern = compile(args.pattern)
+    texts = make_texts(args.texts, args.length)
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if is_gil_enabled() else 'disabled'}")
+    print(f"{'threads':>8} {'chars/s':>12} {'speedup':>8}")
+    baseline = None
+    for threads in map(int, args.threads.split(",")):
+        throughput = measure_throughput(pattern, texts, threads, args.repeat)
+        baseline = baseline or throughput
+        print(f"{threads:>8} {throughput:>12.0f} {throughput / baseline:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
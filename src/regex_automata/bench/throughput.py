@@ -0,0 +1,189 @@
+"""
+Benchmark: throughput and latency of regex_automata next to the stdlib `re` module
+
+Run with `python -m regex_automata.bench` (or `python -m regex_automata.bench.throughput`).
+For each corpus, times `compile`, `search`, `finditer`, `fullmatch` and `sub` calls on each line
+with both engines, and reports throughput in MB/s (of UTF-8 encoded text) and latency percentiles
+of individual calls. Use `--json` to save the results for comparison between releases.
+
+"""
+import argparse
+import json
+import platform
+import re
+import statistics
+import sys
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Callable
+
+import regex_automata
+from regex_automata.bench.corpora import CORPORA, make_keyword_list
+
+OPERATIONS = ("compile", "search", "finditer", "fullmatch", "sub")
+ENGINES = ("regex_automata", "re")
+
+
+@dataclass(frozen=True)
+class BenchmarkCase:
+    corpus: str
+    pattern: str
+    fullmatch_pattern: str  # matches whole lines of the corpus
+    repl: str
+
+
+CASES = [
+    BenchmarkCase(
+        corpus="access_log",
+        pattern=r'"(GET|POST|PUT|DELETE) (/\S*) HTTP/1\.1" ([45]\d\d)',
+        fullmatch_pattern=r'(\d+\.){3}\d+ - \S+ \[[0-9A-Za-z/:]+ \+\d{4}\] "[^"]*" \d{3} \d+ "[^"]*" "[^"]*"',
+        repl=r"\1 [\3]",
+    ),
+    BenchmarkCase(
+        corpus="csv",
+        pattern=r"(\d{4})-(\d\d)-(\d\d)",
+        fullmatch_pattern=r'\d+,[0-9-]+,[^,]*,"[^"]*",\d+\.\d\d,[A-Z]{3}',
+        repl=r"\3.\2.\1",
+    ),
+    BenchmarkCase(
+        corpus="source_code",
+        pattern=r"\b(def|class) ([A-Za-z_]\w*)",
+        fullmatch_pattern=r"\s*(def|return|[a-z]+ [a-z]+ in|\w+ =|\w+\.append)\b.*",
+        repl=r"\1 renamed_\2",
+    ),
+    BenchmarkCase(
+        corpus="keywords",
+        pattern=r"\b(" + "|".join(make_keyword_list()) + r")\b",
+        fullmatch_pattern=r"[a-z]+( [a-z]+)*",
+        repl="***",
+    ),
+]
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    corpus: str
+    operation: str
+    engine: str
+    calls: int
+    total_s: float
+    mb_per_s: float | None  # None for compile
+    p50_us: float
+    p90_us: float
+    p99_us: float
+
+
+def get_operation(operation: str, engine: str, case: BenchmarkCase) -> Callable[[str], object]:
+    """-> function of one line (or of pattern, for compile)"""
+    module: Any = regex_automata if engine == "regex_automata" else re
+    if operation == "compile":
+        if engine == "re":
+            def compile_re(pattern: str) -> object:
+                re.purge()  # stdlib re caches compiled patterns, each call should compile
+                return re.compile(pattern)
+            return compile_re
+        return lambda pattern: module.compile(pattern)
+    p: Any = module.compile(case.fullmatch_pattern if operation == "fullmatch" else case.pattern)
+    match operation:
+        case "search":
+            return lambda line: p.search(line)
+        case "finditer":
+            return lambda line: sum(1 for _ in p.finditer(line))
+        case "fullmatch":
+            return lambda line: p.fullmatch(line)
+        case "sub":
+            return lambda line: p.sub(case.repl, line)
+        case _:
+            raise ValueError(f"unknown operation {operation!r}")
+
+
+def measure(fn: Callable[[str], object], inputs: list[str]) -> list[float]:
+    """-> seconds of each call"""
+    timings = []
+    perf_counter = time.perf_counter
+    for x in inputs:
+        t0 = perf_counter()
+        fn(x)
+        timings.append(perf_counter() - t0)
+    return timings
+
+
+def run_case(case: BenchmarkCase, operation: str, engine: str, lines: list[str], repeat: int) -> BenchmarkResult:
+    fn = get_operation(operation, engine, case)
+    if operation == "compile":
+        timings = measure(fn, [case.pattern] * repeat)
+        mb_per_s = None
+    else:
+        timings = measure(fn, lines)
+        num_bytes = sum(len(line.encode("utf-8")) for line in lines)
+        mb_per_s = num_bytes / 1e6 / sum(timings)
+
+    q = statistics.quantiles(timings, n=100, method="inclusive") if len(timings) > 1 else timings * 99
+    return BenchmarkResult(
+        corpus=case.corpus,
+        operation=operation,
+        engine=engine,
+        calls=len(timings),
+        total_s=sum(timings),
+        mb_per_s=mb_per_s,
+        p50_us=1e6 * q[49],
+        p90_us=1e6 * q[89],
+        p99_us=1e6 * q[98],
+    )
+
+
+def run(corpora: list[str], operations: list[str], engines: list[str], size: int, repeat: int,
+        seed: int = 0, verbose: bool = True) -> list[BenchmarkResult]:
+    results = []
+    if verbose:
+        print(f"{'corpus':>12} {'operation':>10} {'engine':>15} {'calls':>6} {'MB/s':>8} "
+              f"{'p50 us':>9} {'p90 us':>9} {'p99 us':>9}")
+    for case in CASES:
+        if case.corpus not in corpora:
+            continue
+        lines = CORPORA[case.corpus](size, seed)
+        for operation in operations:
+            for engine in engines:
+                r = run_case(case, operation, engine, lines, repeat)
+                results.append(r)
+                if verbose:
+                    mb_per_s = "-" if r.mb_per_s is None else f"{r.mb_per_s:.3f}"
+                    print(f"{r.corpus:>12} {r.operation:>10} {r.engine:>15} {r.calls:>6} {mb_per_s:>8} "
+                          f"{r.p50_us:>9.1f} {r.p90_us:>9.1f} {r.p99_us:>9.1f}")
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", action="append", choices=list(CORPORA), help="corpus to run (default: all)")
+    parser.add_argument("--operation", action="append", choices=OPERATIONS, help="operation to run (default: all)")
+    parser.add_argument("--engine", action="append", choices=ENGINES, help="engine to run (default: all)")
+    parser.add_argument("--size", type=int, default=20_000, help="characters of each corpus")
+    parser.add_argument("--repeat", type=int, default=5, help="number of compilations to time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON ('-' for standard output)")
+    args = parser.parse_args(argv)
+
+    to_stdout = args.json == "-"
+    results = run(args.corpus or list(CORPORA), args.operation or list(OPERATIONS), args.engine or list(ENGINES),
+                  args.size, args.repeat, args.seed, verbose=not to_stdout)
+
+    if args.json:
+        output = {
+            "regex_automata": regex_automata.__version__,
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "size": args.size,
+            "seed": args.seed,
+            "results": [asdict(r) for r in results],
+        }
+        if to_stdout:
+            json.dump(output, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, "w") as fp:
+                json.dump(output, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,46 @@
+import gc
 import logging
+from contextlib import contextmanager
+from mmap import mmap
+from threading import Lock
+from typing import Iterator
 
 
 root_logger = logging.getLogger("regex_automata")
+
+BytesLike = bytes | bytearray | memoryview | mmap
+Text = str | BytesLike
+
+
+_GC_PAUSE_LOCK = Lock()
+_gc_pause_depth = 0  # number of blocks in gc_paused(), in all threads
+_gc_was_enabled = False  # state of the garbage collector when the outermost block was entered
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    """
+    Disable the cyclic garbage collector for the block (or decorated function)
+
+    For code that allocates many objects without creating reference cycles, such as compiling
+    a large pattern: each collection traverses all of them, which takes a large part of the time.
+
+    The collector is process-wide, so blocks entered by other threads (or nested ones) count
+    as one: it is disabled while any of them runs, and the state seen when the first one was
+    entered is restored when the last one exits. A collector disabled by the caller stays
+    disabled, but `gc.disable()` called by another thread during the block is not kept.
+
+    """
+    global _gc_pause_depth, _gc_was_enabled
+    with _GC_PAUSE_LOCK:
+        if _gc_pause_depth == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pause_depth += 1
+    try:
+        yield
+    finally:
+        with _GC_PAUSE_LOCK:
+            _gc_pause_depth -= 1
+            if _gc_pause_depth == 0 and _gc_was_enabled:
+                gc.enable()
@@ -1,13 +1,65 @@
-from copy import deepcopy
-from dataclasses import dataclass
-from typing import Iterator, Self
+from dataclasses import dataclass, fields
+from threading import Lock
+from operator import attrgetter
+from typing import Any, Callable, Iterator, TypeVar
+from weakref import WeakValueDictionary
 
 from regex_automata.automata.rangeset import RangeSet
 from regex_automata.parser.tokens import BoundaryAssertionSemantic
 
+T = TypeVar("T")
 
-@dataclass
-class AstNode:
+_NODE_TABLE: "WeakValueDictionary[tuple[type, Any], AstNode]" = WeakValueDictionary()
+_NODE_TABLE_LOCK = Lock()
+_FIELD_NAMES: dict[type, tuple[str, ...]] = {}
+_KEY_GETTERS: dict[type, Callable[[Any], Any]] = {}
+
+
+class AstNodeMeta(type):
+    """
+    Metaclass that hash-conses AST nodes
+
+    Constructing a node that is structurally equal to a live node returns the existing node,
+    so identical subtrees are shared, and nodes can be compared and hashed by identity.
+
+    """
+    def __call__(cls: type[T], *args: Any, **kwargs: Any) -> T:
+        node = type.__call__(cls, *args, **kwargs)
+        return _intern(node)  # type: ignore[return-value]
+
+
+def _get_field_names(cls: type) -> tuple[str, ...]:
+    names = _FIELD_NAMES.get(cls)
+    if names is None:
+        names = _FIELD_NAMES[cls] = tuple(f.name for f in fields(cls))
+    return names
+
+
+def _get_key_getter(cls: type) -> Callable[[Any], Any]:
+    # attrgetter returns the value itself for one field, keys of different classes never compare equal
+    names = _get_field_names(cls)
+    return attrgetter(*names) if names else lambda node: ()
+
+
+def _intern(node: "AstNode") -> "AstNode":
+    cls = type(node)
+    getter = _KEY_GETTERS.get(cls)
+    if getter is None:
+        getter = _KEY_GETTERS[cls] = _get_key_getter(cls)
+    key = cls, getter(node)
+    with _NODE_TABLE_LOCK:
+        return _NODE_TABLE.setdefault(key, node)
+
+
+def _unpickle_node(cls: type["AstNode"], values: tuple[Any, ...]) -> "AstNode":
+    node = object.__new__(cls)
+    for name, value in zip(_get_field_names(cls), values):
+        object.__setattr__(node, name, value)
+    return _intern(node)
+
+
+@dataclass(frozen=True, slots=True, eq=False, weakref_slot=True)
+class AstNode(metaclass=AstNodeMeta):
     def get_label(self) -> str:
         raise NotImplementedError
 
@@ -15,15 +67,22 @@ class AstNode:
         yield from ()
 
     def iter_descendants(self) -> Iterator["AstNode"]:
-        yield self
-        for u in self.iter_children():
-            yield from u.iter_descendants()
-
-    def copy(self) -> Self:
-        return deepcopy(self)
-
-
-@dataclass
+        """Each distinct node of the tree once, in pre-order (shared subtrees are not repeated)"""
+        seen = set()
+        stack: list[AstNode] = [self]
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            yield node
+            stack.extend(reversed(tuple(node.iter_children())))
+
+    def __reduce__(self) -> Any:
+        return _unpickle_node, (type(self), tuple(getattr(self, name) for name in _get_field_names(type(self))))
+
+
+@dataclass(frozen=True, slots=True, eq=False)
 class AstCharacterSet(AstNode):
     rs: RangeSet
     label: str
@@ -32,7 +91,7 @@ class AstCharacterSet(AstNode):
         return self.label
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, eq=False)
 class AstBoundaryAssertion(AstNode):
     semantic: BoundaryAssertionSemantic
 
@@ -47,7 +106,7 @@ class AstBoundaryAssertion(AstNode):
         }[self.semantic]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, eq=False)
 class AstConcatenation(AstNode):
     u: AstNode
     v: AstNode
@@ -59,7 +118,7 @@ class AstConcatenation(AstNode):
         yield from (self.u, self.v)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, eq=False)
 class AstRepetition(AstNode):
     u: AstNode
     min: int
@@ -82,14 +141,19 @@ class AstRepetition(AstNode):
         yield self.u
 
 
-@dataclass(init=False)
+@dataclass(frozen=True, slots=True, eq=False, init=False)
 class AstIteration(AstRepetition):
     """Kleene star"""
     def __init__(self, u: AstNode) -> None:
-        super().__init__(u=u, min=0, max=None)
+        AstRepetition.__init__(self, u=u, min=0, max=None)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class AstCountedRepetition(AstRepetition):
+    """Bounded repetition that is evaluated using a counter instead of being expanded"""
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, eq=False)
 class AstUnion(AstNode):
     u: AstNode
     v: AstNode
@@ -101,13 +165,13 @@ class AstUnion(AstNode):
         yield from (self.u, self.v)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, eq=False)
 class AstEmpty(AstNode):
     def get_label(self) -> str:
         return "ε"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, eq=False)
 class AstGroup(AstNode):
     number: int
     u: AstNode
@@ -1,51 +1,101 @@
 
 from .ast import AstNode, AstEmpty, AstConcatenation, AstUnion, AstRepetition, AstCharacterSet, AstIteration, \
-    AstBoundaryAssertion, AstGroup
+    AstBoundaryAssertion, AstGroup, AstCountedRepetition
+
+# repetitions whose copies would have more positions (characters, assertions and groups) than this
+# are compiled using counters instead
+COUNTER_THRESHOLD = 1000
 
 
 class ASTProcessor:
-    def __init__(self, raw_ast: AstNode) -> None:
+    def __init__(self, raw_ast: AstNode, counter_threshold: int | None = COUNTER_THRESHOLD) -> None:
         self.raw_ast = raw_ast
+        self.counter_threshold = counter_threshold
+        self.sizes: dict[AstNode, int] = {}
 
     def get_processed_ast(self) -> AstNode:
         ast = self.convert(self.raw_ast)
         return AstGroup(0, ast)
 
-    def convert(self, node: AstNode) -> AstNode:
+    def convert(self, root: AstNode) -> AstNode:
+        # post-order over the tree using explicit stack; shared subtrees are converted only once
+        converted: dict[AstNode, AstNode] = {}
+        stack = [root]
+        while stack:
+            node = stack[-1]
+            if node in converted:
+                stack.pop()
+                continue
+            children = self.get_children_to_convert(node)
+            pending = [u for u in children if u not in converted]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            converted[node] = self.convert_node(node, [converted[u] for u in children])
+        return converted[root]
+
+    def get_children_to_convert(self, node: AstNode) -> list[AstNode]:
+        return list(node.iter_children())
+
+    def convert_node(self, node: AstNode, children: list[AstNode]) -> AstNode:
         match node:
             case AstEmpty():
                 return self.convert_AstEmpty(node)
             case AstCharacterSet():
                 return self.convert_AstCharacter(node)
             case AstIteration():
-                return self.convert_AstIteration(node)
+                return self.convert_AstIteration(node, *children)
             case AstRepetition():
-                return self.convert_AstRepetition(node)
+                return self.convert_AstRepetition(node, *children)
             case AstUnion():
-                return self.convert_AstUnion(node)
+                return self.convert_AstUnion(node, *children)
             case AstConcatenation():
-                return self.convert_AstConcatenation(node)
+                return self.convert_AstConcatenation(node, *children)
             case AstBoundaryAssertion():
                 return self.convert_AstBoundaryAssertion(node)
             case AstGroup():
-                return self.convert_AstGroup(node)
+                return self.convert_AstGroup(node, *children)
             case _:
                 return node
 
     @classmethod
     def get_max_group_number(cls, node: AstNode) -> int | None:
-        values = []
-        for u in node.iter_children():
-            value = cls.get_max_group_number(u)
-            if value is not None:
-                values.append(value)
-        if isinstance(node, AstGroup):
-            values.append(node.number)
-
-        if not values:
-            return None
-        else:
-            return max(values)
+        return max((u.number for u in node.iter_descendants() if isinstance(u, AstGroup)), default=None)
+
+    def is_counted(self, node: AstRepetition, u: AstNode) -> bool:
+        """
+        Whether to compile repetition of converted `u` with a counter instead of copies of `u`
+
+        Counters keep the NFA small, but matching steps through the counter operations, so they
+        are used only when the copies would be large.
+
+        """
+        if isinstance(node, AstCountedRepetition):
+            return True
+        if self.counter_threshold is None or node.max is None and node.min == 0:
+            return False
+        copies = node.max if node.max is not None else node.min + 1
+        return copies * self.get_size(u) > self.counter_threshold
+
+    def get_size(self, root: AstNode) -> int:
+        """Number of positions (characters, assertions and groups) in the tree, counting shared subtrees each time"""
+        sizes = self.sizes
+        stack = [root]
+        while stack:
+            node = stack[-1]
+            if node in sizes:
+                stack.pop()
+                continue
+            children = list(node.iter_children())
+            pending = [u for u in children if u not in sizes]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            is_position = isinstance(node, (AstCharacterSet, AstBoundaryAssertion, AstGroup))
+            sizes[node] = is_position + sum(sizes[u] for u in children)
+        return sizes[root]
 
     def convert_AstEmpty(self, node: AstEmpty) -> AstNode:
         return node
@@ -53,81 +103,85 @@ class ASTProcessor:
     def convert_AstCharacter(self, node: AstCharacterSet) -> AstNode:
         return node
 
-    def convert_AstIteration(self, node: AstIteration) -> AstNode:
-        u = self.convert(node.u)
+    def convert_AstIteration(self, node: AstIteration, u: AstNode) -> AstNode:
         match u:
             case AstEmpty():
                 return u
             case _:
                 return AstIteration(u)
 
-    def convert_AstRepetition(self, node: AstRepetition) -> AstNode:
-        # implemented via AST transform
+    def convert_AstRepetition(self, node: AstRepetition, u: AstNode) -> AstNode:
+        if isinstance(u, AstEmpty):
+            return u
+        if not self.is_counted(node, u):
+            return self.expand_repetition(node, u)
+        return AstCountedRepetition(u, node.min, node.max)
+
+    def expand_repetition(self, node: AstRepetition, u: AstNode) -> AstNode:
+        # implemented via AST transform of converted u
         # a{3,}  == "aaa(a)*"
         # a{,3}  == "|a|aa|aaa" == "|a(|a(|a)))"
         # a{3,5} == "aaa(a|aa)" == "aaa(|a(|(a))"
-
-        root: AstNode
         if node.min == 0 and node.max is None:
-            root = AstIteration(node.u)
+            return AstIteration(u)
         elif node.max is None:
-            root = AstConcatenation(
-                self.iterated_concatenation(node.u, node.min),
-                AstIteration(node.u)
-            )
+            return self.concatenate(self.iterated_concatenation(u, node.min), AstIteration(u))
         else:
-            root = AstConcatenation(
-                self.iterated_concatenation(node.u, node.min),
-                self.iterated_prefix(node.u, node.max - node.min),
-            )
-
-        return self.convert(root)
+            return self.concatenate(self.iterated_concatenation(u, node.min), self.iterated_prefix(u, node.max - node.min))
 
-    def convert_AstUnion(self, node: AstUnion) -> AstNode:
-        u = self.convert(node.u)
-        v = self.convert(node.v)
+    def convert_AstUnion(self, node: AstUnion, u: AstNode, v: AstNode) -> AstNode:
         match u, v:
             case AstEmpty(), AstEmpty():
                 return AstEmpty()
+            case _ if u is node.u and v is node.v:
+                return node
             case _:
                 return AstUnion(u, v)
 
-    def convert_AstConcatenation(self, node: AstConcatenation) -> AstNode:
-        u = self.convert(node.u)
-        v = self.convert(node.v)
+    def convert_AstConcatenation(self, node: AstConcatenation, u: AstNode, v: AstNode) -> AstNode:
         match u, v:
             case AstEmpty(), w:
                 return w
             case w, AstEmpty():
                 return w
+            case _ if u is node.u and v is node.v:
+                return node
             case _:
                 return AstConcatenation(u, v)
 
     def convert_AstBoundaryAssertion(self, node: AstBoundaryAssertion) -> AstNode:
         return node
 
-    def convert_AstGroup(self, node: AstGroup) -> AstNode:
-        return AstGroup(node.number, self.convert(node.u))
+    def convert_AstGroup(self, node: AstGroup, u: AstNode) -> AstNode:
+        return AstGroup(node.number, u)
 
     @staticmethod
-    def iterated_concatenation(node: AstNode, n: int) -> AstNode:
+    def concatenate(u: AstNode, v: AstNode) -> AstNode:
+        if isinstance(u, AstEmpty):
+            return v
+        if isinstance(v, AstEmpty):
+            return u
+        return AstConcatenation(u, v)
+
+    @classmethod
+    def iterated_concatenation(cls, node: AstNode, n: int) -> AstNode:
         # 0 -> AstEmpty == ""
-        # 1 -> AstConcatenation(AstEmpty, u) == "u"
-        # 2 -> AstConcatenation(AstConcatenation(AstEmpty, u), u) == "uu"
+        # 1 -> u
+        # 2 -> AstConcatenation(u, u) == "uu"
         output: AstNode = AstEmpty()
         for _ in range(n):
-            output = AstConcatenation(output, node.copy())
+            output = cls.concatenate(output, node)
         return output
 
-    @staticmethod
-    def iterated_prefix(node: AstNode, n: int) -> AstNode:
+    @classmethod
+    def iterated_prefix(cls, node: AstNode, n: int) -> AstNode:
         # 0 -> AstEmpty = ""
-        # 1 -> AstUnion(AstEmpty, AstConcatenation(u, AstEmpty)) == "|u"
-        # 2 -> AstUnion(AstEmpty, AstConcatenation(u, AstUnion(AstEmpty, AstConcatenation(u, AstEmpty)))) == "|u(|u)"
+        # 1 -> AstUnion(AstEmpty, u) == "|u"
+        # 2 -> AstUnion(AstEmpty, AstConcatenation(u, AstUnion(AstEmpty, u))) == "|u(|u)"
         output: AstNode = AstEmpty()
         for _ in range(n):
             output = AstUnion(
                 AstEmpty(),
-                AstConcatenation(node.copy(), output)
+                cls.concatenate(node, output)
             )
         return output
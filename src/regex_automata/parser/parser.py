@@ -1,50 +1,41 @@
-import functools
-from typing import Type, TypeVar, NoReturn, ParamSpec, Callable
+from dataclasses import dataclass, field
+from typing import Iterable, NoReturn
 
 from .tokens import Token, LPar, RPar, Repetition, Pipe, CharacterSet, BoundaryAssertion
 from .ast import AstNode, AstUnion, AstRepetition, AstCharacterSet, AstConcatenation, AstEmpty, AstBoundaryAssertion, \
     AstGroup
+from ..automata.rangeset import RangeSet
 from ..common import root_logger
 from ..errors import ParserError
 
 logger = root_logger.getChild("parser")
 
-T = TypeVar("T")
-P = ParamSpec("P")
-TToken = TypeVar("TToken", bound=Token)
 
-
-def rule(f: Callable[P, T]) -> Callable[P, T]:
-    @functools.wraps(f)
-    def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
-        logger.info(f"using rule {f.__name__:3} : {str(f.__doc__).strip()}")
-        return f(*args, **kwargs)
-    return wrapper
+@dataclass
+class Frame:
+    """Group (or the whole pattern) that is being parsed"""
+    lpar: LPar | None
+    alternatives: list[AstNode] = field(default_factory=list)
+    sequence: list[AstNode] = field(default_factory=list)
+    repeatable: bool = False  # last node of sequence may take repetition
 
 
 class Parser:
-    def __init__(self, tokens: list[Token]):
-        self.tokens = list(tokens)
-        self.pos = -1
-        self.string_pos = -1
-        self.group_name_to_group_number: dict[str, int] = {}
+    """
+    Parser for the LL(1) grammar described in README
 
-    def read(self, cls: Type[TToken]) -> TToken:
-        self.pos += 1
-        try:
-            t = self.tokens[self.pos]
-        except IndexError:
-            self.error(f"expected {cls.__name__}, got end of input")
-        self.string_pos = t.span[-1] - 1
-        if not isinstance(t, cls):
-            self.error(f"expected {cls.__name__}, read {t.__class__.__name__}")
-        else:
-            logger.info("reading %r", t)
-            return t
+    The parser is not recursive: tokens are consumed one at a time (so they can come from
+    a generator), with an explicit stack of open groups. Each group collects its alternatives
+    and the sequence of the current alternative; these are nested to the right when the group
+    is closed, which gives the same tree as recursive descent over the right-recursive grammar.
 
-    def peek(self) -> Token | None:
-        i = self.pos + 1
-        return self.tokens[i] if i < len(self.tokens) else None
+    """
+    def __init__(self, tokens: Iterable[Token]):
+        self.tokens = tokens
+        self.string_pos = -1
+        self.group_name_to_group_number: dict[str, int] = {}
+        # nodes of character sets read so far, to skip interning a new node for each token
+        self.character_set_nodes: dict[tuple[RangeSet, str], AstCharacterSet] = {}
 
     def error(self, description: str | None = None) -> NoReturn:
         msg = f"error at position {self.string_pos}"
@@ -53,230 +44,71 @@ class Parser:
         raise ParserError(msg, self.string_pos)
 
     def parse(self) -> AstNode:
-        root = self.p1()
-        if self.peek() is not None:
-            self.error("unread input remaining (expected end of input)")
-        return root
+        stack = [Frame(None)]
+        num_tokens = 0
+        for num_tokens, t in enumerate(self.tokens, 1):
+            self.string_pos = t.span[-1] - 1
+            frame = stack[-1]
+            match t:
+                case CharacterSet():
+                    key = t.set, t.text
+                    node = self.character_set_nodes.get(key)
+                    if node is None:
+                        node = self.character_set_nodes[key] = AstCharacterSet(rs=t.set, label=t.text)
+                    frame.sequence.append(node)
+                    frame.repeatable = True
+                case BoundaryAssertion():
+                    frame.sequence.append(AstBoundaryAssertion(t.semantic))
+                    frame.repeatable = False
+                case Repetition():
+                    if not frame.repeatable:
+                        self.error("nothing to repeat")
+                    frame.sequence[-1] = AstRepetition(frame.sequence[-1], t.min, t.max)
+                    frame.repeatable = False
+                case LPar():
+                    stack.append(Frame(t))
+                case RPar():
+                    if len(stack) == 1:
+                        self.error("unread input remaining (expected end of input)")
+                    stack.pop()
+                    u = self.close_frame(frame)
+                    assert frame.lpar is not None
+                    if not frame.lpar.non_capturing:
+                        u = self.make_group(u, frame.lpar.number, frame.lpar.symbolic_name)
+                    stack[-1].sequence.append(u)
+                    stack[-1].repeatable = True
+                case Pipe():
+                    if not frame.sequence:
+                        self.error("empty alternative is only allowed at the end")
+                    frame.alternatives.append(self.make_concatenation(frame.sequence))
+                    frame.sequence = []
+                    frame.repeatable = False
+                case _:
+                    self.error(f"unexpected token {t!r}")
+
+        if len(stack) > 1:
+            self.error("expected RPar, got end of input")
+        logger.info("parsed %d tokens", num_tokens)
+        return self.close_frame(stack[0])
+
+    def close_frame(self, frame: Frame) -> AstNode:
+        alternatives = frame.alternatives
+        alternatives.append(self.make_concatenation(frame.sequence))
+        u = alternatives[-1]
+        for v in reversed(alternatives[:-1]):
+            u = AstUnion(v, u)
+        return u
+
+    @staticmethod
+    def make_concatenation(sequence: list[AstNode]) -> AstNode:
+        if not sequence:
+            return AstEmpty()
+        u = sequence[-1]
+        for v in reversed(sequence[:-1]):
+            u = AstConcatenation(v, u)
+        return u
 
     def make_group(self, u: AstNode, number: int, name: str | None = None) -> AstGroup:
         if name is not None:
             self.group_name_to_group_number[name] = number
         return AstGroup(number, u, name)
-
-    @rule
-    def p1(self) -> AstNode:
-        """
-        E  -> F E'
-        """
-        # F
-        match self.peek():
-            case LPar() | CharacterSet() | BoundaryAssertion():
-                F = self.p4()
-            case RPar() | None:
-                F = self.p13()
-            case _:
-                self.error()
-
-        # E'
-        Eprime: AstNode | None
-        match self.peek():
-            case Pipe():
-                Eprime = self.p2()
-            case RPar() | None:
-                Eprime = self.p3()
-            case _:
-                self.error()
-
-        if Eprime is None:
-            return F
-        else:
-            return AstUnion(F, Eprime)
-
-    @rule
-    def p2(self) -> AstNode:
-        """
-        E' -> pipe E
-        """
-        # pipe
-        _ = self.read(Pipe)
-
-        # E
-        match self.peek():
-            case LPar() | CharacterSet() | BoundaryAssertion():
-                E = self.p1()
-            case RPar() | None:
-                E = self.p12()
-            case _:
-                self.error()
-
-        return E
-
-    @rule
-    def p3(self) -> None:
-        """
-        E' -> ε
-        """
-        return None
-
-    @rule
-    def p4(self) -> AstNode:
-        """
-        F  -> G F'
-        """
-        # G
-        match self.peek():
-            case LPar() | CharacterSet():
-                G = self.p7()
-            case BoundaryAssertion():
-                G = self.p14()
-            case _:
-                self.error()
-
-        # F'
-        Fprime: AstNode | None
-        match self.peek():
-            case LPar() | CharacterSet() | BoundaryAssertion():
-                Fprime = self.p5()
-            case Pipe() | RPar() | None:
-                Fprime = self.p6()
-            case _:
-                self.error()
-
-        if Fprime is None:
-            return G
-        else:
-            return AstConcatenation(G, Fprime)
-
-    @rule
-    def p5(self) -> AstNode:
-        """
-        F' -> G F'
-        """
-        # G
-        match self.peek():
-            case LPar() | CharacterSet():
-                G = self.p7()
-            case BoundaryAssertion():
-                G = self.p14()
-            case _:
-                self.error()
-
-        # F'
-        Fprime: AstNode | None
-        match self.peek():
-            case LPar() | CharacterSet() | BoundaryAssertion():
-                Fprime = self.p5()
-            case Pipe() | RPar() | None:
-                Fprime = self.p6()
-            case _:
-                self.error()
-
-        if Fprime is None:
-            return G
-        else:
-            return AstConcatenation(G, Fprime)
-
-    @rule
-    def p6(self) -> None:
-        """
-        F' -> ε
-        """
-        return None
-
-    @rule
-    def p7(self) -> AstNode:
-        """
-        G  -> H G'
-        """
-        # H
-        match self.peek():
-            case LPar():
-                H = self.p10()
-            case CharacterSet():
-                H = self.p11()
-            case _:
-                self.error()
-
-        # G'
-        match self.peek():
-            case Repetition():
-                Gprime = self.p8(H)
-            case LPar() | CharacterSet() | BoundaryAssertion() | Pipe() | RPar() | None:
-                Gprime = self.p9(H)
-            case _:
-                self.error()
-
-        return Gprime
-
-    @rule
-    def p8(self, Gprime: AstNode) -> AstNode:
-        """
-        G' -> star
-        """
-        repetition = self.read(Repetition)
-        return AstRepetition(Gprime, repetition.min, repetition.max)
-
-    @rule
-    def p9(self, Gprime: AstNode) -> AstNode:
-        """
-        G' -> ε
-        """
-        return Gprime
-
-    @rule
-    def p10(self) -> AstNode:
-        """
-        H  -> lpar E rpar
-        """
-        # lpar
-        lpar = self.read(LPar)
-
-        # E
-        match self.peek():
-            case LPar() | CharacterSet() | BoundaryAssertion():
-                E = self.p1()
-            case RPar():
-                E = self.p12()
-            case _:
-                self.error()
-
-        # rpar
-        _ = self.read(RPar)
-
-        if lpar.non_capturing:
-            return E
-        else:
-            return self.make_group(E, lpar.number, lpar.symbolic_name)
-
-    @rule
-    def p11(self) -> AstNode:
-        """
-        H  -> a
-        """
-        a = self.read(CharacterSet)
-        return AstCharacterSet(
-            rs=a.set,
-            label=a.text
-        )
-
-    @rule
-    def p12(self) -> AstNode:
-        """
-        E  -> ε
-        """
-        return AstEmpty()
-
-    @rule
-    def p13(self) -> AstNode:
-        """
-        F  -> ε
-        """
-        return AstEmpty()
-
-    @rule
-    def p14(self) -> AstNode:
-        """
-        G  -> boundary_assertion
-        """
-        boundary = self.read(BoundaryAssertion)
-        return AstBoundaryAssertion(boundary.semantic)
@@ -2,11 +2,14 @@ from typing import Iterator, NoReturn
 
 from .tokens import Token, LPar, RPar, Repetition, Pipe, CharacterSet, BoundaryAssertion, BoundaryAssertionSemantic
 from ..automata.rangeset import RangeSet, WORD_RANGESET, NONWORD_RANGESET, DIGIT_RANGESET, NONDIGIT_RANGESET, \
-    WHITESPACE_RANGESET, NONWHITESPACE_RANGESET
+    WHITESPACE_RANGESET, NONWHITESPACE_RANGESET, ASCII_RANGESET, BYTE_RANGESET, fold_case
 from ..errors import TokenizerError, UnsupportedSyntaxError, RegexAutomataError
 from ..regex.flags import PatternFlag
 
 
+SPECIAL_CHARACTERS = frozenset("\\[()|.*+?{^$")
+
+
 class Tokenizer:
     class Reader:
         def __init__(self, tokenizer: "Tokenizer") -> None:
@@ -51,18 +54,28 @@ class Tokenizer:
     class FailedToReadBraceRepetition(Exception):
         pass
 
-    def __init__(self, text: str, flags: PatternFlag = PatternFlag.NOFLAG) -> None:
+    def __init__(self, text: str, flags: PatternFlag = PatternFlag.NOFLAG, is_bytes: bool = False) -> None:
         self.text = text
         self.flags = flags
+        self.is_bytes = is_bytes  # text is a latin-1 decoded bytes pattern
         self.pos = -1
         self.symbolic_group_names: set[str] = set()
         self.group_number = 1
+        self.literal_sets: dict[str, RangeSet] = {}  # sets of ordinary characters, for the current flags
 
-    def normalize_case(self, s: str) -> str:
+    def fold_case(self, rs: RangeSet) -> RangeSet:
+        """Add case variants of characters when matching case-insensitively"""
         if self.flags & PatternFlag.IGNORECASE:
-            return s.lower()
+            return fold_case(rs, ascii_only=self.is_bytes)  # bytes patterns fold ASCII only, like bytes.lower()
         else:
-            return s
+            return rs
+
+    def clip(self, rs: RangeSet) -> RangeSet:
+        """Restrict character set to the pattern alphabet"""
+        if self.is_bytes:
+            return rs & BYTE_RANGESET
+        else:
+            return rs
 
     def read(self) -> str:
         self.pos += 1
@@ -118,8 +131,10 @@ class Tokenizer:
                             self.error("backreferences are not supported", unsupported=True)
                         case _:
                             yield self.read_CharacterSet(reader)
-                case "." | "[" | _:
+                case "[":
                     yield self.read_CharacterSet(reader)
+                case _:
+                    yield from self.read_literals()
 
     def read_LPar(self, reader: Reader) -> LPar:
         reader.read("(")
@@ -202,47 +217,69 @@ class Tokenizer:
                         self.error("unfinished escape sequence")
                     case "w":
                         reader.read("w")
-                        return CharacterSet(reader.span, reader.text, set=WORD_RANGESET)
+                        return CharacterSet(reader.span, reader.text, set=self.clip(WORD_RANGESET))
                     case "W":
                         reader.read("W")
-                        return CharacterSet(reader.span, reader.text, set=NONWORD_RANGESET)
+                        return CharacterSet(reader.span, reader.text, set=self.clip(NONWORD_RANGESET))
                     case "d":
                         reader.read("d")
-                        return CharacterSet(reader.span, reader.text, set=DIGIT_RANGESET)
+                        return CharacterSet(reader.span, reader.text, set=self.clip(DIGIT_RANGESET))
                     case "D":
                         reader.read("D")
-                        return CharacterSet(reader.span, reader.text, set=NONDIGIT_RANGESET)
+                        return CharacterSet(reader.span, reader.text, set=self.clip(NONDIGIT_RANGESET))
                     case "s":
                         reader.read("s")
+                        if self.is_bytes:
+                            return CharacterSet(reader.span, reader.text, set=WHITESPACE_RANGESET & ASCII_RANGESET)
                         return CharacterSet(reader.span, reader.text, set=WHITESPACE_RANGESET)
                     case "S":
                         reader.read("S")
+                        if self.is_bytes:
+                            rs = WHITESPACE_RANGESET & ASCII_RANGESET
+                            return CharacterSet(reader.span, reader.text, set=self.clip(~rs))
                         return CharacterSet(reader.span, reader.text, set=NONWHITESPACE_RANGESET)
                     case "a" | "b" | "f" | "n" | "r" | "t" | "v" | "0":
                         c = reader.read()
                         s = {
                             "a": "\a", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v", "0": "\0",
                         }[c]
-                        return CharacterSet(reader.span, reader.text, set=RangeSet([ord(self.normalize_case(s))]))
+                        return CharacterSet(reader.span, reader.text, set=self.fold_case(RangeSet([ord(s)])))
                     case "N" | "u" | "U" | "x":
                         self.error(f"unsupported escape sequence: {self.peek()}", unsupported=True)
                     case _:
                         c = reader.read()
-                        return CharacterSet(reader.span, reader.text, set=RangeSet([ord(self.normalize_case(c))]))
+                        return CharacterSet(reader.span, reader.text, set=self.fold_case(RangeSet([ord(c)])))
             case ".":
                 reader.read(".")
                 if self.flags & PatternFlag.DOTALL:
-                    return CharacterSet(reader.span, reader.text, set=RangeSet(complement=True))
+                    return CharacterSet(reader.span, reader.text, set=self.clip(RangeSet(complement=True)))
                 else:
-                    return CharacterSet(reader.span, reader.text, set=RangeSet([ord("\n")], complement=True))
+                    return CharacterSet(reader.span, reader.text, set=self.clip(RangeSet([ord("\n")], complement=True)))
             case "[":
                 return self._read_CharacterSet_brackets(reader)
             case _:
                 c = reader.read()
-                return CharacterSet(reader.span, reader.text, set=RangeSet([ord(self.normalize_case(c))]))
+                return CharacterSet(reader.span, reader.text, set=self.fold_case(RangeSet([ord(c)])))
+
+    def read_literals(self) -> Iterator[CharacterSet]:
+        """Read run of ordinary characters up to the next special character"""
+        text = self.text
+        start = self.pos + 1
+        end = start
+        while end < len(text) and text[end] not in SPECIAL_CHARACTERS:
+            end += 1
+        self.pos = end - 1
+        cache = self.literal_sets
+        for i in range(start, end):
+            c = text[i]
+            rs = cache.get(c)
+            if rs is None:
+                rs = cache[c] = self.fold_case(RangeSet([ord(c)]))
+            yield CharacterSet((i, i+1), c, set=rs)
 
     def _read_CharacterSet_brackets(self, reader: Reader) -> CharacterSet:
-        rs = RangeSet()
+        values: list[int] = []
+        ranges: list[tuple[int, int]] = []
         complement = False
         reader.read("[")
 
@@ -253,7 +290,7 @@ class Tokenizer:
         match c := self.peek():
             case "]" | "-":
                 reader.read(c)
-                rs |= {ord(c)}
+                values.append(ord(c))
 
         # TODO support escape sequences here
         running = True
@@ -267,7 +304,7 @@ class Tokenizer:
                 case ("-", "]", _):
                     reader.read("-")
                     reader.read("]")
-                    rs |= {ord("-")}
+                    values.append(ord("-"))
                     running = False
                 case (c1, "-", c2):
                     if c1 == "\\":
@@ -276,25 +313,27 @@ class Tokenizer:
                     match c2:
                         case "]":
                             reader.read(c1)
-                            rs |= {ord(self.normalize_case(c1))}
+                            values.append(ord(c1))
                         case None:
                             self.error("unfinished character set")
                         case _:
                             reader.read(c1)
                             reader.read("-")
                             reader.read(c2)
-                            start = ord(self.normalize_case(c1))
-                            end = ord(self.normalize_case(c2))
+                            start = ord(c1)
+                            end = ord(c2)
                             if start > end:
                                 self.error(f"malformed character set ({c1!r} > {c2!r})")
-                            rs |= RangeSet(ranges=[(start, end+1)])
+                            ranges.append((start, end+1))
                 case _:
                     c = reader.read()
                     if c == "\\":
                         self.error("escape sequences are not supported inside [...]", unsupported=True)
-                    rs |= {ord(self.normalize_case(c))}
+                    values.append(ord(c))
 
-        return CharacterSet(reader.span, reader.text, set=RangeSet(ranges=rs.ranges, complement=complement))
+        # ranges are sorted and merged once, when the whole set is read; case is folded before complementing
+        rs = self.fold_case(RangeSet(values, ranges))
+        return CharacterSet(reader.span, reader.text, set=self.clip(~rs if complement else rs))
 
     def read_BoundaryAssertion(self, reader: Reader) -> BoundaryAssertion:
         match (self.peek(), self.peek(2)):
@@ -346,6 +385,7 @@ class Tokenizer:
                     if flag is None:
                         self.error(f"{c!r} is not a supported inline flag", unsupported=True)
                     self.flags |= flag
+                    self.literal_sets.clear()
             case ":":
                 reader.read(":")
                 yield LPar(reader.span, reader.text, number=-1, non_capturing=True)
@@ -0,0 +1,55 @@
+import asyncio
+import codecs
+from typing import TYPE_CHECKING, AsyncGenerator, AsyncIterable
+
+from .match import Match
+from .stream import PatternStream
+from ..common import Text
+
+if TYPE_CHECKING:
+    from .pattern import Pattern
+
+DEFAULT_YIELD_EVERY = 1 << 16
+
+
+async def afinditer(pattern: "Pattern", source: "asyncio.StreamReader | AsyncIterable[Text] | Text",
+                    yield_every: int = DEFAULT_YIELD_EVERY, encoding: str = "utf-8", errors: str = "strict",
+                    all_matches: bool = False) -> AsyncGenerator[Match, None]:
+    """
+    Find matches in text read from asyncio stream or async iterable of chunks
+
+    Input is fed to the evaluator at most `yield_every` characters at a time and control
+    is handed back to the event loop after each of them. Bytes chunks are decoded
+    (incrementally, using `encoding`) when searching with a str pattern.
+
+    """
+    if yield_every <= 0:
+        raise ValueError("yield_every must be positive")
+
+    stream = PatternStream(pattern, all_matches=all_matches)
+    decoder = None if pattern.is_bytes else codecs.getincrementaldecoder(encoding)(errors)
+
+    async for chunk in iter_chunks(source, yield_every):
+        if decoder is not None and not isinstance(chunk, str):
+            chunk = decoder.decode(chunk)
+        for i in range(0, len(chunk), yield_every):
+            for m in stream.feed(chunk[i:i+yield_every]):
+                yield m
+            await asyncio.sleep(0)
+
+    if decoder is not None:
+        for m in stream.feed(decoder.decode(b"", final=True)):
+            yield m
+    for m in stream.close():
+        yield m
+
+
+async def iter_chunks(source: "asyncio.StreamReader | AsyncIterable[Text] | Text", chunk_size: int) -> AsyncGenerator[Text, None]:
+    if isinstance(source, asyncio.StreamReader):
+        while data := await source.read(chunk_size):
+            yield data
+    elif isinstance(source, AsyncIterable):
+        async for chunk in source:
+            yield chunk
+    else:
+        yield source
@@ -0,0 +1,79 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import TYPE_CHECKING, Iterable, Iterator, Literal
+
+from .nfa_evaluator import NFAEvaluator
+from ..common import Text
+
+if TYPE_CHECKING:
+    from .pattern import Pattern
+
+MatchMode = Literal["fullmatch", "match", "search"]
+
+DEFAULT_BATCH_SIZE = 1024
+
+_worker_evaluator: NFAEvaluator | None = None
+_worker_mode: MatchMode = "fullmatch"
+
+
+def match_many(pattern: "Pattern", texts: Iterable[Text], mode: MatchMode = "fullmatch", workers: int = 1,
+               batch_size: int = DEFAULT_BATCH_SIZE) -> list[bool]:
+    spans = span_many(pattern, texts, mode, workers, batch_size)
+    return [start != -1 for start in spans[::2]]
+
+
+def span_many(pattern: "Pattern", texts: Iterable[Text], mode: MatchMode = "search", workers: int = 1,
+              batch_size: int = DEFAULT_BATCH_SIZE) -> "array[int]":
+    """
+    Spans of matches in many texts
+
+    Returns flat array of start, end pairs, (-1, -1) for texts that do not match. With `workers` > 1,
+    texts are evaluated in batches by a process pool; the pattern is sent to each worker
+    process only once.
+
+    """
+    if mode not in ("fullmatch", "match", "search"):
+        raise ValueError(f"unknown match mode {mode!r}")
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+
+    if workers <= 1:
+        return get_spans(NFAEvaluator(pattern, pattern.flags), texts, mode)
+
+    output = array("q")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pattern, mode)) as executor:
+        for spans in executor.map(_run_batch, iter_batches(texts, batch_size)):
+            output.extend(spans)
+    return output
+
+
+def get_spans(evaluator: NFAEvaluator, texts: Iterable[Text], mode: MatchMode) -> "array[int]":
+    output = array("q")
+    for text in texts:
+        match mode:
+            case "fullmatch":
+                m = evaluator.fullmatch(text)
+            case "match":
+                m = next(evaluator.finditer(text, search=False), None)
+            case "search":
+                m = next(evaluator.finditer(text), None)
+        output.extend(m.span() if m is not None else (-1, -1))
+    return output
+
+
+def iter_batches(texts: Iterable[Text], batch_size: int) -> Iterator[list[Text]]:
+    it = iter(texts)
+    while batch := list(islice(it, batch_size)):
+        yield batch
+
+
+def _init_worker(pattern: "Pattern", mode: MatchMode) -> None:
+    global _worker_evaluator, _worker_mode
+    _worker_evaluator = NFAEvaluator(pattern, pattern.flags)
+    _worker_mode = mode
+
+
+def _run_batch(texts: list[Text]) -> "array[int]":
+    assert _worker_evaluator is not None, "worker was not initialized"
+    return get_spans(_worker_evaluator, texts, _worker_mode)
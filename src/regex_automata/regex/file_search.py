@@ -0,0 +1,166 @@
+import codecs
+import mmap
+import os
+from bisect import bisect_right
+from typing import TYPE_CHECKING, BinaryIO, Generator, Iterator
+
+from .match import FileMatch, Match
+from .stream import PatternStream
+
+if TYPE_CHECKING:
+    from .pattern import Pattern
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# codecs that emit a byte order mark when encoding; the BOM is not part of any character
+_BOM_FREE_CODECS = {
+    "utf-16": "utf-16-le",
+    "utf-32": "utf-32-le",
+    "utf-8-sig": "utf-8",
+}
+
+
+# decoding error handlers whose output encodes back to the bytes they replaced
+_REVERSIBLE_ERROR_HANDLERS = ("strict", "surrogateescape", "surrogatepass")
+
+
+class ByteOffsetMap:
+    """
+    Maps character positions of decoded text to byte offsets in the file
+
+    Offsets are computed by encoding the text again, so the decoding error handler must be
+    reversible: with "replace" or "ignore", the number of bytes behind a replaced character
+    is lost.
+
+    """
+    def __init__(self, encoding: str, errors: str = "strict") -> None:
+        if errors not in _REVERSIBLE_ERROR_HANDLERS:
+            raise ValueError(f"cannot compute byte offsets with error handler {errors!r}, "
+                             f"use one of {', '.join(_REVERSIBLE_ERROR_HANDLERS)}")
+        name = codecs.lookup(encoding).name
+        self.encoding = _BOM_FREE_CODECS.get(name, name)
+        self.encode_errors = "surrogateescape" if errors == "surrogateescape" else "surrogatepass"
+        self.char_starts: list[int] = []
+        self.byte_starts: list[int] = []
+        self.pieces: list[str] = []
+        self._cursor: tuple[int, int, int] = (-1, 0, 0)  # piece index, char offset, byte offset
+
+    def add_piece(self, char_start: int, byte_end: int, piece: str) -> None:
+        self.char_starts.append(char_start)
+        self.byte_starts.append(byte_end - self._encoded_length(piece))
+        self.pieces.append(piece)
+
+    def discard_before(self, char_position: int) -> None:
+        n = bisect_right(self.char_starts, char_position) - 1
+        if n > 0:
+            del self.char_starts[:n], self.byte_starts[:n], self.pieces[:n]
+            self._cursor = (-1, 0, 0)
+
+    def get_byte_offset(self, char_position: int) -> int:
+        i = bisect_right(self.char_starts, char_position) - 1
+        if i < 0:
+            raise ValueError(f"character position {char_position} has been discarded")
+        k = char_position - self.char_starts[i]
+        piece = self.pieces[i]
+        if piece.isascii() and self.encoding in ("utf-8", "ascii", "latin-1"):
+            return self.byte_starts[i] + k
+
+        # matches are mostly reported in increasing order, continue from the last position
+        cursor_i, cursor_k, cursor_bytes = self._cursor
+        if cursor_i != i or cursor_k > k:
+            cursor_k, cursor_bytes = 0, 0
+        cursor_bytes += self._encoded_length(piece[cursor_k:k])
+        self._cursor = (i, k, cursor_bytes)
+        return self.byte_starts[i] + cursor_bytes
+
+    def _encoded_length(self, s: str) -> int:
+        return len(s.encode(self.encoding, errors=self.encode_errors))
+
+
+def iter_file_chunks(f: BinaryIO, chunk_size: int, byte_start: int = 0, byte_end: int | None = None) -> Iterator[bytes]:
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        mm = None  # empty files, pipes and other non-mappable files
+
+    if mm is not None:
+        with mm:
+            end = len(mm) if byte_end is None else min(len(mm), byte_end)
+            for i in range(byte_start, end, chunk_size):
+                yield mm[i:min(i+chunk_size, end)]
+    else:
+        if byte_start:
+            f.seek(byte_start)
+        remaining = byte_end - byte_start if byte_end is not None else None
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def finditer_file(pattern: "Pattern", path: str | os.PathLike[str], encoding: str = "utf-8", errors: str = "strict",
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, all_matches: bool = False,
+                  byte_start: int = 0, byte_end: int | None = None) -> Generator[FileMatch, None, int]:
+    """
+    Find matches in file (or its byte range), returns number of characters read
+
+    Offsets of matches are relative to `byte_start`. Decoding errors can only be handled
+    by reversible error handlers, see `ByteOffsetMap`.
+
+    """
+    if pattern.is_bytes:
+        return (yield from finditer_file_bytes(pattern, path, chunk_size, all_matches, byte_start, byte_end))
+
+    offsets = ByteOffsetMap(encoding, errors)
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    stream = PatternStream(pattern, all_matches=all_matches)
+    bytes_read = 0
+
+    with open(path, "rb") as f:
+        for chunk in iter_file_chunks(f, chunk_size, byte_start, byte_end):
+            bytes_read += len(chunk)
+            piece = decoder.decode(chunk)
+            pending_bytes, _ = decoder.getstate()
+            offsets.add_piece(stream.position, bytes_read - len(pending_bytes), piece)
+            for m in stream.feed(piece):
+                yield make_file_match(m, offsets)
+            offsets.discard_before(stream.buffer.offset)
+
+    piece = decoder.decode(b"", final=True)
+    offsets.add_piece(stream.position, bytes_read, piece)
+    for m in stream.feed(piece):
+        yield make_file_match(m, offsets)
+    for m in stream.close():
+        yield make_file_match(m, offsets)
+    return stream.position
+
+
+def finditer_file_bytes(pattern: "Pattern", path: str | os.PathLike[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        all_matches: bool = False, byte_start: int = 0, byte_end: int | None = None) -> Generator[FileMatch, None, int]:
+    """Search file with bytes pattern, no decoding is done and character offsets are byte offsets"""
+    stream = PatternStream(pattern, all_matches=all_matches)
+
+    with open(path, "rb") as f:
+        for chunk in iter_file_chunks(f, chunk_size, byte_start, byte_end):
+            for m in stream.feed(chunk):
+                yield make_file_match(m)
+    for m in stream.close():
+        yield make_file_match(m)
+    return stream.position
+
+
+def make_file_match(m: Match, offsets: ByteOffsetMap | None = None) -> FileMatch:
+    return FileMatch(
+        re=m.re,
+        pos=m.pos,
+        endpos=m.endpos,
+        match=m.match,
+        groupspandict=m.groupspandict,
+        bytespandict={
+            i: (offsets.get_byte_offset(start), offsets.get_byte_offset(end))
+            for i, (start, end) in m.groupspandict.items()
+        } if offsets is not None else dict(m.groupspandict),
+    )
@@ -0,0 +1,136 @@
+from ..automata.nfa import NFA, Transition, TransitionPredicate
+from ..parser.ast import AstNode, AstCharacterSet, AstConcatenation, AstUnion, AstEmpty, AstIteration, \
+    AstBoundaryAssertion, AstGroup
+from .nfa_builder import make_boundary_assertion_transition
+
+Positions = tuple[bool, list[int], list[int]]  # nullable, first positions, last positions
+
+
+class GlushkovBuilder:
+    """
+    Builds position (Glushkov) automaton from AST
+
+    There is one state for each position of the pattern, plus the initial state; transitions
+    into a position are labelled with the character set at that position. Groups and boundary
+    assertions are zero-width positions, entered by non-consuming transitions that carry
+    the group tag or the assertion predicate. The NFA has no trivial epsilon transitions,
+    so it needs no epsilon elimination.
+
+    Counted repetitions are not supported, AST should be processed without counters.
+
+    """
+    def __init__(self, root: AstNode) -> None:
+        self.root = root
+        self.position_transitions: list[Transition] = []
+        self.follow: list[set[int]] = []
+
+    def build(self) -> NFA:
+        initial_state = 0
+        self.position_transitions = [Transition.make_trivial_epsilon()]  # placeholder for the initial state
+        self.follow = [set()]
+
+        nullable, first, last = self.convert(self.root)
+        self.follow[initial_state].update(first)
+
+        transitions: dict[int, dict[Transition, set[int]]] = {}
+        for x, follow_x in enumerate(self.follow):
+            transitions_x = transitions[x] = {}
+            for y in sorted(follow_x):
+                transitions_x.setdefault(self.position_transitions[y], set()).add(y)
+
+        final_states = set(last)
+        if nullable:
+            final_states.add(initial_state)
+
+        return NFA(
+            states=list(range(len(self.position_transitions))),
+            initial_state=initial_state,
+            final_states=final_states,
+            transitions=transitions,
+        )
+
+    def convert(self, root: AstNode) -> Positions:
+        # post-order over the tree using explicit stack; positions are numbered from left to right
+        results: list[Positions] = []
+        stack: list[tuple[AstNode, int | None]] = [(root, None)]
+        while stack:
+            node, entry_position = stack.pop()
+            children = tuple(node.iter_children())
+            if children and entry_position is None:
+                stack.append((node, self.add_entry_position(node)))
+                stack.extend((u, None) for u in reversed(children))
+                continue
+            args = results[len(results)-len(children):]
+            del results[len(results)-len(children):]
+            results.append(self.convert_node(node, entry_position, args))
+        return results.pop()
+
+    def add_entry_position(self, node: AstNode) -> int:
+        if isinstance(node, AstGroup):
+            return self.add_position(Transition.make_begin_group(node.number))
+        return -1
+
+    def convert_node(self, node: AstNode, entry_position: int | None, args: list[Positions]) -> Positions:
+        match node:
+            case AstEmpty():
+                return True, [], []
+            case AstCharacterSet():
+                x = self.add_position(Transition(predicates=(TransitionPredicate(next=node.rs),), label=node.label))
+                return False, [x], [x]
+            case AstBoundaryAssertion():
+                x = self.add_position(make_boundary_assertion_transition(node.semantic))
+                return False, [x], [x]
+            case AstIteration():
+                return self.convert_AstIteration(node, *args)
+            case AstUnion():
+                return self.convert_AstUnion(node, *args)
+            case AstConcatenation():
+                return self.convert_AstConcatenation(node, *args)
+            case AstGroup():
+                assert entry_position is not None
+                return self.convert_AstGroup(node, entry_position, *args)
+            case _:
+                raise NotImplementedError(f"Cannot convert node {node!r}")
+
+    def add_position(self, transition: Transition) -> int:
+        self.position_transitions.append(transition)
+        self.follow.append(set())
+        return len(self.position_transitions) - 1
+
+    def convert_AstIteration(self, _: AstIteration, u: Positions) -> Positions:
+        first_u, last_u = u[1], u[2]
+        for x in last_u:
+            self.follow[x].update(first_u)
+        return True, first_u, last_u
+
+    def convert_AstUnion(self, _: AstUnion, u: Positions, v: Positions) -> Positions:
+        (nullable_u, first_u, last_u), (nullable_v, first_v, last_v) = u, v
+        return nullable_u or nullable_v, merge(first_u, first_v), merge(last_u, last_v)
+
+    def convert_AstConcatenation(self, _: AstConcatenation, u: Positions, v: Positions) -> Positions:
+        (nullable_u, first_u, last_u), (nullable_v, first_v, last_v) = u, v
+        for x in last_u:
+            self.follow[x].update(first_v)
+        first = merge(first_u, first_v) if nullable_u else first_u
+        last = merge(last_v, last_u) if nullable_v else last_v
+        return nullable_u and nullable_v, first, last
+
+    def convert_AstGroup(self, node: AstGroup, begin: int, u: Positions) -> Positions:
+        nullable_u, first_u, last_u = u
+        end = self.add_position(Transition.make_end_group(node.number))
+        self.follow[begin].update(first_u)
+        for x in last_u:
+            self.follow[x].add(end)
+        if nullable_u:
+            self.follow[begin].add(end)
+        return False, [begin], [end]
+
+
+def merge(a: list[int], b: list[int]) -> list[int]:
+    # position lists are used only once after they are merged, extend the longer one to keep long unions linear
+    if len(a) >= len(b):
+        a.extend(b)
+        return a
+    else:
+        b.extend(a)
+        return b
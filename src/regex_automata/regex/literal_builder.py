@@ -0,0 +1,111 @@
+from ..automata.nfa import NFA, Transition, TransitionPredicate
+from ..automata.rangeset import RangeSet, fold_case
+
+SignatureKey = tuple[bool, tuple[tuple[int, int], ...]]
+
+
+class LiteralNFABuilder:
+    """
+    Builds NFA matching any of many literal words, as a minimal acyclic automaton (DAWG)
+
+    Words must be added in lexicographic order. States are minimized incrementally
+    (Daciuk et al.): once a word is added, states on the path of the previous word that are
+    not shared with it are replaced by an equivalent registered state, or registered themselves.
+    Only the minimized automaton and the path of the last word are kept in memory.
+
+    With `ignorecase`, words must already be case-folded to the smallest character of each
+    case class (see `rangeset.get_case_fold_table()`); transitions match all case variants.
+
+    """
+    ROOT = 0
+
+    def __init__(self, is_bytes: bool = False, ignorecase: bool = False) -> None:
+        self.is_bytes = is_bytes
+        self.ignorecase = ignorecase
+        self.edges: dict[int, dict[int, int]] = {self.ROOT: {}}
+        self.final_states: set[int] = set()
+        self.register: dict[SignatureKey, int] = {}
+        self.unchecked: list[tuple[int, int, int]] = []  # parent, character, child on the path of the last word
+        self.previous_word: str | bytes | None = None
+        self.next_state = self.ROOT + 1
+
+    def add(self, word: str | bytes) -> None:
+        if self.is_bytes == isinstance(word, str):
+            raise TypeError("cannot mix str and bytes words")
+        if self.previous_word is not None:
+            if word == self.previous_word:
+                return
+            if word < self.previous_word:  # type: ignore[operator]
+                raise ValueError(f"words are not sorted ({word!r} after {self.previous_word!r})")
+
+        codes = list(word) if isinstance(word, bytes) else [ord(c) for c in word]
+        common = 0
+        if self.previous_word is not None:
+            for a, b in zip(codes, self.previous_word if isinstance(self.previous_word, bytes) else map(ord, self.previous_word)):
+                if a != b:
+                    break
+                common += 1
+        self.minimize(common)
+
+        u = self.unchecked[-1][2] if self.unchecked else self.ROOT
+        for c in codes[common:]:
+            v = self.next_state
+            self.next_state += 1
+            self.edges[v] = {}
+            self.edges[u][c] = v
+            self.unchecked.append((u, c, v))
+            u = v
+        self.final_states.add(u)
+        self.previous_word = word
+
+    def minimize(self, down_to: int) -> None:
+        """Replace or register unchecked states deeper than `down_to` characters, deepest first"""
+        while len(self.unchecked) > down_to:
+            u, c, v = self.unchecked.pop()
+            key = (v in self.final_states, tuple(self.edges[v].items()))
+            w = self.register.get(key)
+            if w is None:
+                self.register[key] = v
+            else:
+                self.edges[u][c] = w
+                del self.edges[v]
+                self.final_states.discard(v)
+
+    def build(self) -> NFA:
+        """
+        NFA with initial state, DAWG states and final state
+
+        The initial state enters the DAWG with the begin tag of group 0, and final DAWG states
+        lead to the final state with the end tag of group 0, like in automata built from patterns.
+
+        """
+        self.minimize(0)
+        character_transitions: dict[int, Transition] = {}
+
+        def get_character_transition(c: int) -> Transition:
+            t = character_transitions.get(c)
+            if t is None:
+                rs = RangeSet([c])
+                if self.ignorecase:
+                    rs = fold_case(rs, ascii_only=self.is_bytes)
+                t = character_transitions[c] = Transition(predicates=(TransitionPredicate(next=rs),), label=chr(c))
+            return t
+
+        initial_state, final_state = -1, self.next_state
+        end_group = Transition.make_end_group(0)
+        transitions: dict[int, dict[Transition, set[int]]] = {
+            initial_state: {Transition.make_begin_group(0): {self.ROOT}},
+        }
+        for u, edges_u in self.edges.items():
+            transitions_u = transitions[u] = {}
+            for c, v in edges_u.items():
+                transitions_u.setdefault(get_character_transition(c), set()).add(v)
+            if u in self.final_states:
+                transitions_u[end_group] = {final_state}
+
+        return NFA(
+            states=[initial_state, *sorted(self.edges), final_state],
+            initial_state=initial_state,
+            final_states={final_state},
+            transitions=transitions,
+        ).renumber_states()
@@ -1,5 +1,6 @@
+import threading
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, Optional
+from typing import TYPE_CHECKING, Any, AnyStr, Optional
 
 if TYPE_CHECKING:
     from .pattern import Pattern
@@ -10,7 +11,7 @@ class Match:
     re: "Pattern"
     pos: int | None
     endpos: int | None
-    match: str
+    match: str | bytes
     groupspandict: dict[int, tuple[int, int]]
 
     def group(self, *indices: int | str) -> Any | tuple[Any, ...]:
@@ -54,10 +55,16 @@ class Match:
         return self._group(i)
 
     @property
-    def string(self) -> str:
+    def string(self) -> str | bytes:
         return self.re.pattern
 
-    def expand(self, template: str) -> str:
+    def expand(self, template: AnyStr) -> AnyStr:
+        if isinstance(template, bytes):
+            return self._expand(template.decode("latin-1")).encode("latin-1")
+        else:
+            return self._expand(template)
+
+    def _expand(self, template: str) -> str:
         output: list[str] = []
         last_match_end = 0
 
@@ -86,6 +93,8 @@ class Match:
 
             if value is None:
                 value = ""
+            elif isinstance(value, bytes):
+                value = value.decode("latin-1")
             output.append(value)
 
             last_match_end = m.end()
@@ -101,13 +110,42 @@ class Match:
     def _get_expand_pattern(cls) -> "Pattern":
         from regex_automata import compile
         global _EXPAND_PATTERN
-        if _EXPAND_PATTERN is None:
-            _EXPAND_PATTERN = compile(
-                r"\\g<(?P<g_name_or_number>[^>]+)>|"
-                r"\\(?P<number>[0-9]+)|"
-                r"\\(?P<escape_sequence>[abfnrtv]|\\|x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8})"
-            )
-        return _EXPAND_PATTERN
+        pattern = _EXPAND_PATTERN
+        if pattern is None:
+            with _EXPAND_PATTERN_LOCK:
+                pattern = _EXPAND_PATTERN
+                if pattern is None:
+                    pattern = compile(
+                        r"\\g<(?P<g_name_or_number>[^>]+)>|"
+                        r"\\(?P<number>[0-9]+)|"
+                        r"\\(?P<escape_sequence>[abfnrtv]|\\|x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8})"
+                    )
+                    _EXPAND_PATTERN = pattern  # published only after it has been fully constructed
+        return pattern
+
+
+@dataclass(repr=False)
+class FileMatch(Match):
+    """Match in a file, with byte offsets in addition to character offsets"""
+    bytespandict: dict[int, tuple[int, int]]
+
+    def byte_span(self, i: int | str = 0) -> tuple[int, int]:
+        if isinstance(i, str):
+            i = self.re.group_name_to_group_number[i]
+
+        if i < 0 or i > self.re.max_group_number:
+            raise IndexError(f"No group with index {i}")
+        return self.bytespandict.get(i, (-1, -1))
+
+    def byte_start(self, i: int | str = 0) -> int:
+        return self.byte_span(i)[0]
+
+    def byte_end(self, i: int | str = 0) -> int:
+        return self.byte_span(i)[1]
+
+    def __repr__(self) -> str:
+        return f"<FileMatch span={self.span()!r}, byte_span={self.byte_span()!r}, match={self.match!r}>"
 
 
 _EXPAND_PATTERN: Optional["Pattern"] = None
+_EXPAND_PATTERN_LOCK = threading.Lock()
@@ -0,0 +1,25 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class MatchStats:
+    """
+    Counters of work done by the evaluator, filled in when passed as `stats=` to `Pattern` methods
+
+    Counters are added to, so one object can collect statistics of many calls. Each object should
+    be used by one thread at a time.
+
+    """
+    characters_scanned: int = 0  # input positions read by the evaluator
+    buckets_created: int = 0  # start positions that were tried
+    heads_processed: int = 0  # heads that went through character transitions
+    peak_active_heads: int = 0  # most heads alive at one position, over all start positions
+    epsilon_closure_iterations: int = 0  # heads expanded while computing epsilon closures
+    matches_emitted: int = 0
+    elapsed: float = 0.0  # seconds spent in the evaluator
+
+    def __str__(self) -> str:
+        return (f"{self.characters_scanned} characters, {self.buckets_created} buckets, "
+                f"{self.heads_processed} heads (peak {self.peak_active_heads}), "
+                f"{self.epsilon_closure_iterations} epsilon closure iterations, "
+                f"{self.matches_emitted} matches in {1000 * self.elapsed:.3f} ms")
@@ -1,166 +1,223 @@
 from ..automata.rangeset import RangeSet, WORD_RANGESET, NONWORD_RANGESET
 from ..parser.ast import AstNode, AstCharacterSet, AstConcatenation, AstUnion, AstEmpty, AstIteration, \
-    AstBoundaryAssertion, AstGroup
-from ..automata.nfa import NFA, Transition, TransitionPredicate
+    AstBoundaryAssertion, AstGroup, AstCountedRepetition
+from ..automata.nfa import NFA, Transition, TransitionPredicate, CounterOp, CounterOpKind
 from ..parser.tokens import BoundaryAssertionSemantic
 
+Fragment = tuple[int, list[int]]  # initial state, final states
+
 
 class NFABuilder:
+    """
+    Builds NFA from AST in a single iterative pass
+
+    States of all subexpressions are appended to one growing transition table. Each subexpression
+    is represented by a fragment (its initial and final states), which is wired up by the parent node.
+
+    """
     def __init__(self, root: AstNode) -> None:
         self.root = root
+        self.num_counters = 0
+        self.transitions: list[dict[Transition, set[int]]] = []
+        self.epsilon = Transition.make_trivial_epsilon()
+        self.character_transitions: dict[AstCharacterSet, Transition] = {}
 
     def build(self, epsilon_free: bool) -> NFA:
-        nfa = self.convert(self.root)
+        self.num_counters = 0
+        self.transitions = []
+        initial_state, final_states = self.convert(self.root)
+        nfa = NFA(
+            states=list(range(len(self.transitions))),
+            initial_state=initial_state,
+            final_states=set(final_states),
+            transitions=dict(enumerate(self.transitions)),
+            num_counters=self.num_counters,
+        )
         if epsilon_free:
             return nfa.get_trivial_epsilon_free_nfa()
         else:
             return nfa
 
-    def convert(self, node: AstNode) -> NFA:
+    def convert(self, root: AstNode) -> Fragment:
+        # post-order over the tree using explicit stack; shared subtrees get their own states for each occurrence
+        fragments: list[Fragment] = []
+        stack: list[tuple[AstNode, list[int] | None]] = [(root, None)]
+        while stack:
+            node, entry_states = stack.pop()
+            children = tuple(node.iter_children())
+            if children and entry_states is None:
+                stack.append((node, self.add_entry_states(node)))
+                stack.extend((u, None) for u in reversed(children))
+                continue
+            args = fragments[len(fragments)-len(children):]
+            del fragments[len(fragments)-len(children):]
+            fragments.append(self.convert_node(node, entry_states or [], args))
+        return fragments.pop()
+
+    def add_entry_states(self, node: AstNode) -> list[int]:
+        # states that precede the subexpression are numbered before its states (state order breaks ties between heads)
+        match node:
+            case AstCountedRepetition():
+                return [self.add_state(), self.add_state()]
+            case AstGroup():
+                return [self.add_state()]
+            case _:
+                return []
+
+    def convert_node(self, node: AstNode, entry_states: list[int], args: list[Fragment]) -> Fragment:
         match node:
             case AstEmpty():
                 return self.convert_AstEmpty(node)
             case AstCharacterSet():
                 return self.convert_AstCharacter(node)
             case AstIteration():
-                return self.convert_AstIteration(node)
+                return self.convert_AstIteration(node, *args)
+            case AstCountedRepetition():
+                return self.convert_AstCountedRepetition(node, entry_states, *args)
             case AstUnion():
-                return self.convert_AstUnion(node)
+                return self.convert_AstUnion(node, *args)
             case AstConcatenation():
-                return self.convert_AstConcatenation(node)
+                return self.convert_AstConcatenation(node, *args)
             case AstBoundaryAssertion():
                 return self.covert_AstBoundaryAssertion(node)
             case AstGroup():
-                return self.convert_AstGroup(node)
+                return self.convert_AstGroup(node, entry_states, *args)
             case _:
                 raise NotImplementedError(f"Cannot convert node {node!r}")
 
-    def convert_AstEmpty(self, _: AstEmpty) -> NFA:
-        return NFA(
-            states=[0],
-            initial_state=0,
-            final_states={0},
-            transitions={}
-        )
-
-    def convert_AstCharacter(self, node: AstCharacterSet) -> NFA:
-        return NFA(
-            states=[0, 1],
-            initial_state=0,
-            final_states={1},
-            transitions={0: {Transition(predicates=(TransitionPredicate(next=node.rs),), label=node.label): {1}}}
-        )
-
-    def convert_AstIteration(self, node: AstIteration) -> NFA:
-        u = node.u
-        nfa = self.convert(u)
-
-        for x in nfa.final_states:
-            nfa.transitions.setdefault(x, {}).setdefault(Transition.make_trivial_epsilon(), set()).add(nfa.initial_state)
-        nfa.final_states = nfa.trivial_epsilon_closure(set(nfa.final_states))
-        return nfa
-
-    def convert_AstUnion(self, node: AstUnion) -> NFA:
-        u = node.u
-        v = node.v
-        nfa_u = self.convert(u)
-        nfa_v = self.convert(v).renumber_states(max(nfa_u.states) + 1)
-
-        nfa = nfa_u.copy()
-        nfa.states += nfa_v.states
-        nfa.final_states |= nfa_v.final_states
-        nfa.transitions.update(nfa_v.transitions)
-        new_initial_state = max(nfa.states) + 1
-        nfa.states.append(new_initial_state)
-        nfa.transitions[new_initial_state] = {Transition.make_trivial_epsilon(): {nfa_u.initial_state, nfa_v.initial_state}}
-        nfa.initial_state = new_initial_state
-        return nfa
-
-    def convert_AstConcatenation(self, node: AstConcatenation) -> NFA:
-        u = node.u
-        v = node.v
-        nfa_u = self.convert(u)
-        nfa_v = self.convert(v).renumber_states(max(nfa_u.states) + 1)
-
-        nfa = nfa_u.copy()
-        nfa.states += nfa_v.states
-        nfa.final_states = nfa_v.final_states
-        nfa.transitions.update(nfa_v.transitions)
-        for s in nfa_u.final_states:
-            nfa.transitions.setdefault(s, {}).setdefault(Transition.make_trivial_epsilon(), set()).add(nfa_v.initial_state)
-        return nfa
-
-    def covert_AstBoundaryAssertion(self, node: AstBoundaryAssertion) -> NFA:
-        eof_rs = RangeSet((-1,))
-        eof_or_newline_rs = RangeSet((-1, ord("\n")))
-
-        match node.semantic:
-            case BoundaryAssertionSemantic.INPUT_START:
-                transition = Transition(
-                    predicates=(TransitionPredicate(previous=eof_rs),),
-                    consume_char=False,
-                    label="input start"
-                )
-            case BoundaryAssertionSemantic.INPUT_END:
-                transition = Transition(
-                    predicates=(TransitionPredicate(next=eof_rs),),
-                    consume_char=False,
-                    label="input end"
-                )
-            case BoundaryAssertionSemantic.LINE_START:
-                transition = Transition(
-                    predicates=(TransitionPredicate(previous=eof_or_newline_rs),),
-                    consume_char=False,
-                    label="line start"
-                )
-            case BoundaryAssertionSemantic.LINE_END:
-                transition = Transition(
-                    predicates=(TransitionPredicate(next=eof_or_newline_rs),),
-                    consume_char=False,
-                    label="line end"
-                )
-            case BoundaryAssertionSemantic.WORD_BOUNDARY:
-                transition = Transition(
-                    predicates=(
-                        TransitionPredicate(WORD_RANGESET, NONWORD_RANGESET),
-                        TransitionPredicate(WORD_RANGESET, eof_rs),
-                        TransitionPredicate(NONWORD_RANGESET, WORD_RANGESET),
-                        TransitionPredicate(eof_rs, WORD_RANGESET),
-                    ),
-                    consume_char=False,
-                    label="\\b"
-                )
-            case BoundaryAssertionSemantic.NONWORD_BOUNDARY:
-                transition = Transition(
-                    predicates=(
-                        TransitionPredicate(WORD_RANGESET, WORD_RANGESET),
-                        TransitionPredicate(NONWORD_RANGESET, NONWORD_RANGESET),
-                        TransitionPredicate(NONWORD_RANGESET, eof_rs),
-                        TransitionPredicate(eof_rs, NONWORD_RANGESET),
-                    ),consume_char=False,
-                    label="\\B"
-                )
-            case _:
-                raise NotImplementedError
-
-        return NFA(
-            states=[0, 1],
-            initial_state=0,
-            final_states={1},
-            transitions={0: {transition: {1}}}
-        )
-
-    def convert_AstGroup(self, node: AstGroup) -> NFA:
-        nfa_u = self.convert(node.u).renumber_states(1)
-
-        start_state = 0
-        final_state = max(nfa_u.states) + 1
-
-        nfa = nfa_u.copy()
-        nfa.initial_state = start_state
-        nfa.states += [start_state, final_state]
-        nfa.final_states = {final_state}
-        nfa.transitions[start_state] = {Transition.make_begin_group(node.number): {nfa_u.initial_state}}
-        for s in nfa_u.final_states:
-            nfa.transitions.setdefault(s, {}).setdefault(Transition.make_end_group(node.number), set()).add(final_state)
-        return nfa
+    def add_state(self) -> int:
+        self.transitions.append({})
+        return len(self.transitions) - 1
+
+    def add_transition(self, u: int, transition: Transition, v: int) -> None:
+        self.transitions[u].setdefault(transition, set()).add(v)
+
+    def convert_AstEmpty(self, _: AstEmpty) -> Fragment:
+        x = self.add_state()
+        return x, [x]
+
+    def convert_AstCharacter(self, node: AstCharacterSet) -> Fragment:
+        transition = self.character_transitions.get(node)
+        if transition is None:
+            transition = Transition(predicates=(TransitionPredicate(next=node.rs),), label=node.label)
+            self.character_transitions[node] = transition
+        x, y = self.add_state(), self.add_state()
+        self.add_transition(x, transition, y)
+        return x, [y]
+
+    def convert_AstIteration(self, _: AstIteration, u: Fragment) -> Fragment:
+        # separate loop state, so that states inside u do not become final when u loops internally
+        x = self.add_state()
+        initial_u, final_u = u
+        self.add_transition(x, self.epsilon, initial_u)
+        for y in final_u:
+            self.add_transition(y, self.epsilon, x)
+        return x, [x]
+
+    def convert_AstCountedRepetition(self, node: AstCountedRepetition, entry_states: list[int], u: Fragment) -> Fragment:
+        # x -(reset)-> loop -(c < max)-> u -(increment)-> loop -(c >= min)-> final
+        counter = self.num_counters
+        self.num_counters += 1
+        x, loop = entry_states
+        final_state = self.add_state()
+        initial_u, final_u = u
+
+        self.add_transition(x, Transition.make_counter_op(CounterOp(counter, CounterOpKind.RESET)), loop)
+        if node.max is not None:
+            enter = Transition.make_counter_op(CounterOp(counter, CounterOpKind.LESS_THAN, node.max))
+        else:
+            enter = self.epsilon
+        self.add_transition(loop, enter, initial_u)
+        self.add_transition(loop, Transition.make_counter_op(CounterOp(counter, CounterOpKind.AT_LEAST, node.min)), final_state)
+        increment = Transition.make_counter_op(CounterOp(counter, CounterOpKind.INCREMENT, node.max if node.max is not None else node.min))
+        for y in final_u:
+            self.add_transition(y, increment, loop)
+        return x, [final_state]
+
+    def convert_AstUnion(self, _: AstUnion, u: Fragment, v: Fragment) -> Fragment:
+        x = self.add_state()
+        (initial_u, final_u), (initial_v, final_v) = u, v
+        self.add_transition(x, self.epsilon, initial_u)
+        self.add_transition(x, self.epsilon, initial_v)
+        # fragments are used only once, extend the longer list to keep long unions linear
+        if len(final_u) >= len(final_v):
+            final_u.extend(final_v)
+            return x, final_u
+        else:
+            final_v.extend(final_u)
+            return x, final_v
+
+    def convert_AstConcatenation(self, _: AstConcatenation, u: Fragment, v: Fragment) -> Fragment:
+        (initial_u, final_u), (initial_v, final_v) = u, v
+        for y in final_u:
+            self.add_transition(y, self.epsilon, initial_v)
+        return initial_u, final_v
+
+    def covert_AstBoundaryAssertion(self, node: AstBoundaryAssertion) -> Fragment:
+        x, y = self.add_state(), self.add_state()
+        self.add_transition(x, make_boundary_assertion_transition(node.semantic), y)
+        return x, [y]
+
+    def convert_AstGroup(self, node: AstGroup, entry_states: list[int], u: Fragment) -> Fragment:
+        x, = entry_states
+        y = self.add_state()
+        initial_u, final_u = u
+        self.add_transition(x, Transition.make_begin_group(node.number), initial_u)
+        for z in final_u:
+            self.add_transition(z, Transition.make_end_group(node.number), y)
+        return x, [y]
+
+
+def make_boundary_assertion_transition(semantic: BoundaryAssertionSemantic) -> Transition:
+    eof_rs = RangeSet((-1,))
+    eof_or_newline_rs = RangeSet((-1, ord("\n")))
+
+    match semantic:
+        case BoundaryAssertionSemantic.INPUT_START:
+            transition = Transition(
+                predicates=(TransitionPredicate(previous=eof_rs),),
+                consume_char=False,
+                label="input start"
+            )
+        case BoundaryAssertionSemantic.INPUT_END:
+            transition = Transition(
+                predicates=(TransitionPredicate(next=eof_rs),),
+                consume_char=False,
+                label="input end"
+            )
+        case BoundaryAssertionSemantic.LINE_START:
+            transition = Transition(
+                predicates=(TransitionPredicate(previous=eof_or_newline_rs),),
+                consume_char=False,
+                label="line start"
+            )
+        case BoundaryAssertionSemantic.LINE_END:
+            transition = Transition(
+                predicates=(TransitionPredicate(next=eof_or_newline_rs),),
+                consume_char=False,
+                label="line end"
+            )
+        case BoundaryAssertionSemantic.WORD_BOUNDARY:
+            transition = Transition(
+                predicates=(
+                    TransitionPredicate(WORD_RANGESET, NONWORD_RANGESET),
+                    TransitionPredicate(WORD_RANGESET, eof_rs),
+                    TransitionPredicate(NONWORD_RANGESET, WORD_RANGESET),
+                    TransitionPredicate(eof_rs, WORD_RANGESET),
+                ),
+                consume_char=False,
+                label="\\b"
+            )
+        case BoundaryAssertionSemantic.NONWORD_BOUNDARY:
+            transition = Transition(
+                predicates=(
+                    TransitionPredicate(WORD_RANGESET, WORD_RANGESET),
+                    TransitionPredicate(NONWORD_RANGESET, NONWORD_RANGESET),
+                    TransitionPredicate(NONWORD_RANGESET, eof_rs),
+                    TransitionPredicate(eof_rs, NONWORD_RANGESET),
+                ),consume_char=False,
+                label="\\B"
+            )
+        case _:
+            raise NotImplementedError
+    return transition
@@ -1,15 +1,20 @@
+import logging
+import time
 from dataclasses import dataclass
-from typing import Iterator, Set
+from typing import Iterable, Iterator
 
+from regex_automata.automata.compact_nfa import CompactNFA
 from regex_automata.automata.nfa import Transition
 from regex_automata.regex.flags import PatternFlag
 from regex_automata.regex.match import Match
+from regex_automata.regex.match_stats import MatchStats
 from typing import TYPE_CHECKING
 
-from ..common import root_logger
+from ..common import root_logger, Text
 
 if TYPE_CHECKING:
     from .pattern import Pattern
+    from .profiler import NFAProfile
 
 logger = root_logger.getChild("evaluator")
 
@@ -31,6 +36,7 @@ class Head:
     start: int
     position: int
     groups: tuple[GroupMatch | None, ...] = ()
+    counters: tuple[int, ...] = ()
 
     def apply_transition(self, transition: Transition, next_state: int) -> "Head":
         head = self
@@ -42,7 +48,8 @@ class Head:
             next_state,
             head.start,
             head.position + (1 if transition.consume_char else 0),
-            head.groups
+            head.groups,
+            transition.counter_op.apply(head.counters) if transition.counter_op is not None else head.counters,
         )
 
     def _begin_group(self, number: int) -> "Head":
@@ -57,7 +64,8 @@ class Head:
             self.state,
             self.start,
             self.position,
-            tuple(groups)
+            tuple(groups),
+            self.counters,
         )
 
     def _end_group(self, number: int) -> "Head":
@@ -74,12 +82,13 @@ class Head:
             self.state,
             self.start,
             self.position,
-            tuple(groups)
+            tuple(groups),
+            self.counters,
         )
 
     @property
-    def _ordering_tuple(self) -> tuple[int, int, int]:
-        return self.start, self.state, self.position
+    def _ordering_tuple(self) -> tuple[int, int, int, tuple[int, ...]]:
+        return self.start, self.state, self.position, self.counters
 
     def __lt__(self, other: object) -> bool:
         if isinstance(other, Head):
@@ -96,6 +105,27 @@ class Head:
     def __ne__(self, other: object) -> bool:
         return not (self == other)
 
+    def __hash__(self) -> int:
+        return hash(self._ordering_tuple)
+
+    def is_preferred_to(self, other: "Head") -> bool:
+        """
+        Prefer groups of this head to those of an equal head (reached by another path)
+
+        Like the POSIX submatch rule, earlier groups take precedence and should start first
+        and be as long as possible.
+
+        """
+        for m, n in zip(self.groups, other.groups):
+            if m == n:
+                continue
+            if m is None or n is None:
+                return n is None
+            if m.start != n.start:
+                return m.start < n.start
+            return m.end == -1 or (n.end != -1 and m.end > n.end)
+        return len(self.groups) > len(other.groups)
+
     def __le__(self, other: object) -> bool:
         return self == other or self < other
 
@@ -113,66 +143,224 @@ class Head:
         return d
 
 
+class TextBuffer:
+    """
+    Window of input text for `NFAEvaluator`
+
+    Positions are absolute (relative to the beginning of the whole input), text before `offset`
+    has been discarded. While `end` is None, more text may be appended.
+
+    Bytes-like text (`bytes`, `bytearray`, `memoryview`, `mmap`) is indexed directly, without
+    decoding or copying. Case-insensitive patterns have case folded into their character sets,
+    so the text is never normalized.
+
+    """
+    def __init__(self, text: Text = "", start: int = 0, end: int | None = None) -> None:
+        self.is_bytes = not isinstance(text, str)
+        self.text = text
+        self.offset = 0
+        self.start = start
+        self.end = end
+        self.retain_from = start
+
+    @property
+    def limit(self) -> int:
+        return self.offset + len(self.text)
+
+    def is_available(self, position: int) -> bool:
+        return self.end is not None or position < self.limit
+
+    def append(self, chunk: Text) -> None:
+        if self.end is not None:
+            raise ValueError("cannot append to closed buffer")
+        if self.is_bytes == isinstance(chunk, str):
+            raise TypeError(f"cannot append {type(chunk).__name__} to {type(self.text).__name__} buffer")
+        if not isinstance(chunk, str):
+            chunk = bytes(chunk)
+        self.text += chunk  # type: ignore[operator]
+
+    def close(self) -> None:
+        self.end = self.limit
+
+    def discard(self) -> None:
+        n = self.retain_from - self.offset
+        if n > 0 and 2*n >= len(self.text):
+            self.text = self.text[n:]
+            self.offset += n
+
+    def slice(self, start: int, end: int) -> str | bytes:
+        s = self.text[start - self.offset:end - self.offset]
+        return s if isinstance(s, (str, bytes)) else bytes(s)
+
+    def get_characters(self, position: int) -> tuple[int, int]:
+        end = self.end if self.end is not None else self.limit
+        prev_position = position - 1
+        if self.start <= prev_position < end:
+            c_previous = self._get_code(prev_position)
+        else:
+            c_previous = -1
+
+        if self.start <= position < end:
+            c_next = self._get_code(position)
+        else:
+            c_next = -1
+
+        return c_previous, c_next
+
+    def _get_code(self, position: int) -> int:
+        c = self.text[position - self.offset]
+        return c if isinstance(c, int) else ord(c)
+
+
+def make_text_buffer(text: Text, start: int, end: int | None, is_bytes: bool) -> TextBuffer:
+    """Buffer for searching complete `text` with a str or bytes pattern"""
+    if is_bytes and isinstance(text, str):
+        raise TypeError("cannot use a bytes pattern on a string-like object")
+    elif not is_bytes and not isinstance(text, str):
+        raise TypeError("cannot use a string pattern on a bytes-like object")
+    if isinstance(text, memoryview) and (text.format != "B" or text.ndim != 1):
+        text = text.cast("B")
+    start_ = min(len(text), start)
+    end_ = min(len(text), end if end is not None else len(text))
+    return TextBuffer(text, start_, end_)
+
+
 class NFAEvaluator:
-    def __init__(self, pattern: "Pattern", flags: PatternFlag = PatternFlag.NOFLAG) -> None:
+    def __init__(self, pattern: "Pattern", flags: PatternFlag = PatternFlag.NOFLAG, stats: MatchStats | None = None,
+                 profile: "NFAProfile | None" = None) -> None:
         self.pattern = pattern
-        self.nfa = pattern.nfa
+        self.stats = stats
+        self.profile = profile
+        self.nfa = pattern.compact_nfa
         self.flags = flags
         if len(self.nfa.final_states) != 1:
             raise ValueError("Expected NFA with exactly one final state (end of group 0)")
         self.final_state = next(iter(self.nfa.final_states))
+        self.alphabet = pattern.alphabet
+        self.final_distances = pattern.final_distances
 
-    def finditer(self, text: str, start: int = 0, end: int | None = None, search: bool = True, all_matches: bool = False) -> Iterator[Match]:
-        original_text = text
-        if self.flags & PatternFlag.IGNORECASE:
-            text = text.lower()
+    def make_buffer(self, text: Text, start: int = 0, end: int | None = None) -> TextBuffer:
+        return make_text_buffer(text, start, end, self.pattern.is_bytes)
 
-        start_ = min(len(text), start)
-        end_ = min(len(text), end if end is not None else len(text))
+    def finditer(self, text: Text, start: int = 0, end: int | None = None, search: bool = True, all_matches: bool = False) -> Iterator[Match]:
+        buffer = self.make_buffer(text, start, end)
+        matches: Iterator[Match | None]
+        if all_matches:
+            matches = self.evaluate_all_matches(buffer, search)
+        else:
+            matches = self.evaluate(buffer, search)
+        if self.stats is not None:
+            matches = self.timed(matches, self.stats)
+        for m in matches:
+            assert m is not None, "complete buffer should never need more input"
+            yield m
+
+    @staticmethod
+    def timed(matches: Iterator[Match | None], stats: MatchStats) -> Iterator[Match | None]:
+        """Add time spent producing each match to `stats.elapsed` (time spent by the caller is not counted)"""
+        while True:
+            t0 = time.perf_counter()
+            try:
+                m = next(matches)
+            except StopIteration:
+                return
+            finally:
+                stats.elapsed += time.perf_counter() - t0
+            yield m
+
+    def evaluate(self, buffer: TextBuffer, search: bool = True, all_matches: bool = False,
+                 from_position: int | None = None) -> Iterator[Match | None]:
+        """
+        Find matches in text buffer, yielding None when the buffer needs more input
+
+        Matches are only yielded once they are final, ie. they cannot be changed by input
+        that has not been read yet. Evaluation begins at `from_position` (buffer start
+        by default); text before it is still visible to boundary assertions.
+
+        """
+        start_ = buffer.start
         last_match_position = -1
         buckets: dict[int, list[Head]] = {}
-
-        for char_no, position in enumerate(range(start_, end_+1)):
-            if position < end_:
-                logger.info(f"{position=}, about to read {text[position]!r}")
+        pruned_buckets: set[int] = set()  # buckets that had heads dropped by `drop_seen_heads()`
+        stats = self.stats
+        debug = logger.isEnabledFor(logging.DEBUG)
+        position = start_ if from_position is None else from_position
+        first_position = position
+
+        while buffer.end is None or position <= buffer.end:
+            while not buffer.is_available(position):
+                yield None
+
+            if buffer.end is None or position < buffer.end:
+                if debug:
+                    logger.debug("position=%d, about to read %r", position, buffer.slice(position, position+1))
+                if stats is not None:
+                    stats.characters_scanned += 1
             else:
-                logger.info(f"{position=}, end of input")
+                if debug:
+                    logger.debug("position=%d, end of input", position)
 
-            if position >= last_match_position and (char_no == 0 or (search and position <= end_)):
+            if position >= last_match_position and (position == first_position or search):
                 queue = [self.init_head(position)]
-                logger.info(f"\tadding bucket {queue=}")
+                if debug:
+                    logger.debug("\tadding bucket queue=%s", queue)
                 buckets[position] = queue
+                if stats is not None:
+                    stats.buckets_created += 1
 
+            # configurations of heads in earlier buckets, which take precedence (unless looking for all matches)
+            seen = SeenConfigurations(self.nfa)
             for start, queue in list(buckets.items()):
                 if not queue:
-                    logger.info(f"\tprocessing bucket {start=}... empty, removing")
+                    if debug:
+                        logger.debug("\tprocessing bucket start=%d... empty, removing", start)
                     buckets.pop(start)
+                    pruned_buckets.discard(start)
                     continue
 
                 loop = False
                 candidate_final_head: Head | None = None
                 all_final_heads = set()
                 while queue:
+                    while not buffer.is_available(queue[0].position):
+                        yield None  # heads are ahead of the buffered text, wait for input
+
                     # do epsilon transitions
-                    logger.info(f"\tprocessing bucket {start=}")
-                    logger.info("\t\tepsilon transitions")
-                    self.apply_epsilon_transitions(queue, text, start_, end_)
-                    for head in queue:
-                        logger.info(f"\t\t\t-> {head}")
+                    if debug:
+                        logger.debug("\tprocessing bucket start=%d", start)
+                        logger.debug("\t\tepsilon transitions")
+                    self.apply_epsilon_transitions(queue, buffer)
+                    if not loop and not all_matches and start < position:
+                        if self.drop_seen_heads(queue, seen):
+                            pruned_buckets.add(start)
+                    if start in pruned_buckets and any(head.state == self.final_state for head in queue):
+                        # this bucket matches first, its longest match may go through the dropped heads
+                        queue[:] = self.replay_bucket(start, position, buffer)
+                        pruned_buckets.discard(start)
+                    if debug:
+                        for head in queue:
+                            logger.debug("\t\t\t-> %s", head)
+                    if stats is not None:
+                        stats.heads_processed += len(queue)
 
                     # do character transitions
-                    logger.info("\t\tcharacter transitions")
-                    entered_final, left_final, final_heads = self.apply_character_transitions(queue, text, start_, end_)
-                    for head in queue:
-                        logger.info(f"\t\t\t-> {head}")
+                    if debug:
+                        logger.debug("\t\tcharacter transitions")
+                    entered_final, left_final, final_heads = self.apply_character_transitions(queue, buffer)
+                    if debug:
+                        for head in queue:
+                            logger.debug("\t\t\t-> %s", head)
                     if all_matches:
                         all_final_heads.update(final_heads)
 
                     # do epsilon transitions
-                    logger.info("\t\tepsilon transitions")
-                    self.apply_epsilon_transitions(queue, text, start_, end_)
-                    for head in queue:
-                        logger.info(f"\t\t\t-> {head}")
+                    while queue and not buffer.is_available(queue[0].position):
+                        yield None
+                    self.apply_epsilon_transitions(queue, buffer)
+                    if debug:
+                        logger.debug("\t\tepsilon transitions")
+                        for head in queue:
+                            logger.debug("\t\t\t-> %s", head)
 
                     if entered_final:
                         loop = True  # have a candidate match; find the longest match with the same start
@@ -181,96 +369,503 @@ class NFAEvaluator:
 
                     if left_final:
                         candidate_final_head = max(final_heads)
-                        logger.info(f">>>> found {candidate_final_head=} <<<<")
+                        if debug:
+                            logger.debug(">>>> found candidate_final_head=%s <<<<", candidate_final_head)
 
-                    logger.info("\tlooping due to a candidate match")
+                    if debug:
+                        logger.debug("\tlooping due to a candidate match")
 
                 if not all_matches and candidate_final_head is not None:
                     all_final_heads = {candidate_final_head}
 
                 for final_head in all_final_heads:
+                    if stats is not None:
+                        stats.matches_emitted += 1
                     yield Match(
                         re=self.pattern,
                         pos=start_,
-                        endpos=end_,
-                        match=original_text[final_head.start:final_head.position],
+                        endpos=buffer.end,
+                        match=buffer.slice(final_head.start, final_head.position),
                         groupspandict=final_head.get_groupspandict(),
                     )
-                    logger.info(f">>>> found {final_head=} <<<<")
+                    if debug:
+                        logger.debug(">>>> found final_head=%s <<<<", final_head)
 
                     if not all_matches:
                         for start, queue in buckets.items():
                             if start < final_head.position:
-                                logger.info(f"\tclearing bucket {start=} (less than {final_head.position=})")
+                                if debug:
+                                    logger.debug("\tclearing bucket start=%d (less than final_head.position=%d)",
+                                                 start, final_head.position)
                                 queue.clear()
                                 last_match_position = final_head.position
 
-        logger.info("all done")
+            if stats is not None:
+                stats.peak_active_heads = max(stats.peak_active_heads, sum(map(len, buckets.values())))
 
-    def init_head(self, position: int) -> Head:
-        return Head(self.nfa.initial_state, position, position)
+            # text before the earliest bucket (and the character before it) is no longer needed
+            buffer.retain_from = min(next(iter(buckets), position), position) - 1
+            position += 1
 
-    def apply_epsilon_transitions(self, queue: list[Head], text: str, start_: int, end_: int) -> None:
-        next_heads = set()
-        while queue:
-            head = queue.pop()
-            # logger.info(f"\t\tprocessing {head=}")
-            c_previous, c_next = self.get_characters(text, start_, end_, head.position)
-            next_heads.update(self._apply_epsilon_transitions(head, c_previous, c_next))
-        queue.extend(sorted(next_heads))
+        logger.debug("all done")
 
-    def _apply_epsilon_transitions(self, head: Head, c_previous: int, c_next: int) -> Set[Head]:
-        closure = {head}
-        while True:
-            new_closure = closure
-            for head in closure:
-                for transition, next_states in self.nfa.transitions.get(head.state, {}).items():
-                    if not transition.consume_char and transition.matches(c_previous, c_next):
-                        new_closure = new_closure | {head.apply_transition(transition, next_state) for next_state in next_states}
-            if len(closure) == len(new_closure):
+    def evaluate_all_matches(self, buffer: TextBuffer, search: bool = True) -> Iterator[Match]:
+        """
+        Find all matches in complete text buffer, including overlapping and nested ones
+
+        Matches are yielded by start, then by end position. Their spans are found by
+        `get_match_ends()`, in time linear in the length of the text plus the number of matches.
+        Groups and counter guards are not tracked there; if the pattern has any, heads are run
+        from each start to its last end, limited to states on the path of some match.
+
+        """
+        start_, end_ = buffer.start, buffer.end
+        assert end_ is not None
+        stats = self.stats
+        ends_by_start, useful_states = self.get_match_ends(buffer, search)
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        if not self.pattern.max_group_number and not self.nfa.num_counters:
+            for start, ends in ends_by_start.items():
+                for end in ends:
+                    if stats is not None:
+                        stats.matches_emitted += 1
+                    yield Match(
+                        re=self.pattern,
+                        pos=start_,
+                        endpos=end_,
+                        match=buffer.slice(start, end),
+                        groupspandict={0: (start, end)},
+                    )
+            return
+
+        for start, ends in ends_by_start.items():
+            queue = [self.init_head(start)]
+            if debug:
+                logger.debug("adding bucket start=%d", start)
+            if stats is not None:
+                stats.buckets_created += 1
+
+            for position in range(start, ends[-1]+1):
+                self.apply_epsilon_transitions(queue, buffer)
+                useful = useful_states[position - start_]
+                queue[:] = [head for head in queue if useful >> head.state & 1]
+                if not queue:
+                    break
+                if stats is not None:
+                    stats.heads_processed += len(queue)
+                    stats.peak_active_heads = max(stats.peak_active_heads, len(queue))
+
+                final_heads = [head for head in queue if head.state == self.final_state]
+                if final_heads:
+                    final_head = max(final_heads)
+                    if debug:
+                        logger.debug(">>>> found final_head=%s <<<<", final_head)
+                    if stats is not None:
+                        stats.matches_emitted += 1
+                    yield Match(
+                        re=self.pattern,
+                        pos=start_,
+                        endpos=end_,
+                        match=buffer.slice(final_head.start, final_head.position),
+                        groupspandict=final_head.get_groupspandict(),
+                    )
+
+                if position < ends[-1]:
+                    self.apply_character_transitions(queue, buffer)
+
+    def get_reachable_states(self, buffer: TextBuffer, search: bool = True) -> list[int]:
+        """
+        States that can be reached from a start at each position of complete text buffer
+
+        Computed in one forward pass over the text. Each position gets a bitset, where bit `v`
+        is set if state `v` is reachable; equal consecutive bitsets share one object. Counter
+        guards are ignored, so a head can only be in a reachable state, but not every reachable
+        state has a head.
+
+        """
+        start_, end_ = buffer.start, buffer.end
+        assert end_ is not None
+        epsilon_table, character_table = self.nfa.epsilon_table, self.nfa.character_table
+        transitions = self.nfa.transitions
+        reachable_states = [0] * (end_ - start_ + 1)
+        reachable: set[int] = set()
+        previous_bits = -1
+        for position in range(start_, end_+1):
+            c_previous, c_next = buffer.get_characters(position)
+            if search or position == start_:
+                reachable.add(self.nfa.initial_state)
+            table = epsilon_table
+            stack = list(reachable)
+            while stack:
+                v = stack.pop()
+                for g in range(table.group_offsets[v], table.group_offsets[v+1]):
+                    if transitions[table.group_transitions[g]].matches(c_previous, c_next):
+                        for k in range(table.target_offsets[g], table.target_offsets[g+1]):
+                            u = table.targets[k]
+                            if u not in reachable:
+                                reachable.add(u)
+                                stack.append(u)
+            bits = 0
+            for v in reachable:
+                bits |= 1 << v
+            if bits == previous_bits:
+                bits = previous_bits
+            reachable_states[position - start_] = bits
+            previous_bits = bits
+
+            next_reachable: set[int] = set()
+            if c_next != -1:
+                if self.stats is not None:
+                    self.stats.characters_scanned += 1
+                table = character_table
+                for v in reachable:
+                    for g in range(table.group_offsets[v], table.group_offsets[v+1]):
+                        if transitions[table.group_transitions[g]].matches(c_previous, c_next):
+                            next_reachable.update(table.targets[table.target_offsets[g]:table.target_offsets[g+1]])
+            reachable = next_reachable
+        return reachable_states
+
+    def get_match_ends(self, buffer: TextBuffer, search: bool = True) -> tuple[dict[int, list[int]], list[int]]:
+        """
+        Ends of all matches by start, and states on the path of some match at each position
+
+        Match ends are positions where the final state is reachable (see `get_reachable_states()`).
+        Starts are found in one backward pass from all ends, limited to reachable states. Ends
+        that have the same backward states at a position have the same starts before it, so
+        they are processed together: the work per position is bounded by the number of distinct
+        sets of states, not by the number of ends, and each match costs O(1) when its start
+        is reached. Starts and ends are in ascending order; states are bitsets, like the
+        reachable states. Counter guards are ignored, so with counters, some spans may not match.
+
+        """
+        start_, end_ = buffer.start, buffer.end
+        assert end_ is not None
+        epsilon_table, character_table = self.nfa.reverse_epsilon_table, self.nfa.reverse_character_table
+        transitions = self.nfa.transitions
+        initial_state, final_state = self.nfa.initial_state, self.final_state
+        stats = self.stats
+        reachable_states = self.get_reachable_states(buffer, search)
+        useful_states = [0] * (end_ - start_ + 1)
+        starts: list[int] = []
+        starts_by_end: dict[int, list[int]] = {}
+        # backward states at the next position -> ends of matches through them
+        classes: dict[int, tuple[set[int], list[int]]] = {}
+        next_bits = -1
+        for position in range(end_, start_-1, -1):
+            c_previous, c_next = buffer.get_characters(position)
+            reachable = reachable_states[position - start_]
+            seeds: list[tuple[set[int], list[int]]] = []
+            if c_next != -1:
+                table = character_table
+                for next_live, ends in classes.values():
+                    live = set()
+                    for v in next_live:
+                        for g in range(table.group_offsets[v], table.group_offsets[v+1]):
+                            if transitions[table.group_transitions[g]].matches(c_previous, c_next):
+                                for k in range(table.target_offsets[g], table.target_offsets[g+1]):
+                                    u = table.targets[k]
+                                    if reachable >> u & 1:
+                                        live.add(u)
+                    if live:
+                        seeds.append((live, ends))
+            if reachable >> final_state & 1:
+                seeds.append(({final_state}, [position]))
+
+            classes = {}
+            useful = 0
+            table = epsilon_table
+            for live, ends in seeds:
+                stack = list(live)
+                while stack:
+                    v = stack.pop()
+                    for g in range(table.group_offsets[v], table.group_offsets[v+1]):
+                        if transitions[table.group_transitions[g]].matches(c_previous, c_next):
+                            for k in range(table.target_offsets[g], table.target_offsets[g+1]):
+                                u = table.targets[k]
+                                if u not in live and reachable >> u & 1:
+                                    live.add(u)
+                                    stack.append(u)
+                if stats is not None:
+                    stats.heads_processed += len(live)
+                bits = 0
+                for v in live:
+                    bits |= 1 << v
+                useful |= bits
+                other = classes.get(bits)
+                if other is None:
+                    classes[bits] = live, ends
+                elif len(other[1]) >= len(ends):
+                    other[1].extend(ends)
+                else:
+                    ends.extend(other[1])
+                    classes[bits] = live, ends
+            if stats is not None:
+                stats.peak_active_heads = max(stats.peak_active_heads, sum(len(live) for live, _ in classes.values()))
+            if useful == next_bits:
+                useful = next_bits
+            useful_states[position - start_] = useful
+            next_bits = useful
+
+            if (search or position == start_) and useful >> initial_state & 1:
+                starts.append(position)
+                for bits, (_, ends) in classes.items():
+                    if bits >> initial_state & 1:
+                        for end in ends:
+                            starts_by_end.setdefault(end, []).append(position)
+
+        ends_by_start: dict[int, list[int]] = {start: [] for start in reversed(starts)}
+        for end in range(start_, end_+1):
+            for start in starts_by_end.get(end, ()):
+                ends_by_start[start].append(end)
+        return ends_by_start, useful_states
+
+    def fullmatch(self, text: Text, start: int = 0, end: int | None = None) -> Match | None:
+        if self.stats is None:
+            return self._fullmatch(text, start, end)
+        t0 = time.perf_counter()
+        try:
+            m = self._fullmatch(text, start, end)
+            self.stats.matches_emitted += m is not None
+            return m
+        finally:
+            self.stats.elapsed += time.perf_counter() - t0
+
+    def _fullmatch(self, text: Text, start: int, end: int | None) -> Match | None:
+        buffer = self.make_buffer(text, start, end)
+        start_, end_ = buffer.start, buffer.end
+        assert end_ is not None
+        queue = [self.init_head(start_)]
+        stats = self.stats
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if stats is not None:
+            stats.buckets_created += 1
+
+        for position in range(start_, end_+1):
+            if debug:
+                logger.debug("position=%d, fullmatch with %d heads", position, len(queue))
+            self.apply_epsilon_transitions(queue, buffer)
+            if stats is not None:
+                stats.peak_active_heads = max(stats.peak_active_heads, len(queue))
+
+            # drop heads that cannot reach the final state by the end of input
+            remaining = end_ - position
+            queue[:] = [head for head in queue if self.final_distances.get(head.state, remaining+1) <= remaining]
+            if not queue:
+                logger.debug("\tno head can reach the final state, rejecting")
+                return None
+
+            if position == end_:
                 break
-            closure = new_closure
-        return closure
 
-    def apply_character_transitions(self, queue: list[Head], text: str, start_: int, end_: int) -> tuple[bool, bool, set[Head]]:
+            _, c_next = buffer.get_characters(position)
+            if stats is not None:
+                stats.characters_scanned += 1
+            if c_next not in self.alphabet:
+                logger.debug("\t%r is not in pattern alphabet, rejecting", chr(c_next))
+                return None
+
+            if stats is not None:
+                stats.heads_processed += len(queue)
+            self.apply_character_transitions(queue, buffer)
+
+        final_heads = [head for head in queue if head.state == self.final_state]
+        if not final_heads:
+            return None
+
+        final_head = max(final_heads)
+        logger.debug(">>>> found final_head=%s <<<<", final_head)
+        return Match(
+            re=self.pattern,
+            pos=start_,
+            endpos=end_,
+            match=buffer.slice(final_head.start, final_head.position),
+            groupspandict=final_head.get_groupspandict(),
+        )
+
+    def init_head(self, position: int) -> Head:
+        return Head(self.nfa.initial_state, position, position, counters=(0,) * self.nfa.num_counters)
+
+    @staticmethod
+    def drop_seen_heads(queue: list[Head], seen: "SeenConfigurations") -> bool:
+        """
+        Remove heads dominated by a head in `seen`, add the remaining ones -> whether any were removed
+
+        A head dominated by a head that started earlier (see `NFAEvaluator.dominates()`) reaches
+        the final state only where the earlier head does, and then the earlier bucket matches
+        first and clears this bucket. If this bucket reaches the final state through another
+        head first, its longest match may still need the dropped heads, see `replay_bucket()`.
+        Keeping one head per configuration bounds the work per position by the size of the NFA.
+
+        """
+        num_heads = len(queue)
+        queue[:] = [head for head in queue if seen.add(head)]
+        return len(queue) < num_heads
+
+    def replay_bucket(self, start: int, position: int, buffer: TextBuffer) -> list[Head]:
+        """
+        Heads of bucket `start` at `position` (after epsilon transitions), without dropping seen heads
+
+        This is done at most once for each match, over the text of the match.
+
+        """
+        queue = [self.init_head(start)]
+        for _ in range(start, position):
+            self.apply_epsilon_transitions(queue, buffer)
+            if self.stats is not None:
+                self.stats.heads_processed += len(queue)
+            self.apply_character_transitions(queue, buffer)
+        self.apply_epsilon_transitions(queue, buffer)
+        return queue
+
+    def dominates(self, head: Head, other: Head) -> bool:
+        """Whether `head` can reach every match end that `other` (in the same state and position) can reach"""
+        nfa = self.nfa
+        for k in nfa.live_counters[head.state]:
+            if not nfa.dominates_counter(k, head.counters[k], other.counters[k]):
+                return False
+        return True
+
+    def drop_dominated_heads(self, heads: Iterable[Head]) -> list[Head]:
+        """
+        Keep heads that are not dominated by another head with the same start, state and position
+
+        Of heads with equal live counters, the one with preferred groups is kept. Without counters,
+        heads are already unique.
+
+        """
+        kept: dict[tuple[int, int, int], list[Head]] = {}
+        for head in heads:
+            others = kept.setdefault((head.start, head.state, head.position), [])
+            for i, other in enumerate(others):
+                if self.dominates(other, head):
+                    if self.dominates(head, other) and head.is_preferred_to(other):
+                        others[i] = head
+                    break
+            else:
+                others[:] = [other for other in others if not self.dominates(head, other)]
+                others.append(head)
+        return [head for others in kept.values() for head in others]
+
+    def apply_epsilon_transitions(self, queue: list[Head], buffer: TextBuffer) -> None:
+        """
+        Replace heads with their epsilon closures
+
+        Heads in states that only have epsilon transitions are dropped, their closure is already included.
+
+        """
+        waiting_states = self.nfa.waiting_states
+        next_heads: dict[Head, Head] = {}
+        while queue:
+            head = queue.pop()
+            c_previous, c_next = buffer.get_characters(head.position)
+            for new_head in self._apply_epsilon_transitions(head, c_previous, c_next):
+                if new_head.state in waiting_states:
+                    add_head(next_heads, new_head)
+        if self.nfa.num_counters:
+            queue.extend(sorted(self.drop_dominated_heads(next_heads.values())))
+        else:
+            queue.extend(sorted(next_heads.values()))
+
+    def _apply_epsilon_transitions(self, head: Head, c_previous: int, c_next: int) -> Iterable[Head]:
+        table = self.nfa.epsilon_table
+        group_offsets, group_transitions, target_offsets, targets = \
+            table.group_offsets, table.group_transitions, table.target_offsets, table.targets
+        transitions = self.nfa.transitions
+        profile = self.profile
+        closure = {head: head}
+        stack = [head]
+        iterations = 0
+        while stack:
+            head = stack.pop()
+            iterations += 1
+            for g in range(group_offsets[head.state], group_offsets[head.state+1]):
+                i = group_transitions[g]
+                transition = transitions[i]
+                if transition.matches(c_previous, c_next) and transition.allows(head.counters):
+                    for k in range(target_offsets[g], target_offsets[g+1]):
+                        if profile is not None:
+                            profile.transition_hits[head.state, i, targets[k]] += 1
+                        new_head = head.apply_transition(transition, targets[k])
+                        if add_head(closure, new_head):
+                            stack.append(new_head)
+        if self.stats is not None:
+            self.stats.epsilon_closure_iterations += iterations
+        return closure.values()
+
+    def apply_character_transitions(self, queue: list[Head], buffer: TextBuffer) -> tuple[bool, bool, set[Head]]:
         """-> entered_final, left_final, heads that were final before transition"""
-        next_heads = set()
+        next_heads: dict[Head, Head] = {}
         final_heads = set()
         entered_final = False
         while queue:
             head = queue.pop()
-            # logger.info(f"\t\tprocessing {head=}")
             if head.state == self.final_state:
                 entered_final = True
                 final_heads.add(head)
-            c_previous, c_next = self.get_characters(text, start_, end_, head.position)
-            if c_previous != -1 or c_next != -1:
-                next_heads.update(self._apply_character_transitions(head, c_previous, c_next))
-        queue.extend(sorted(next_heads))
+            c_previous, c_next = buffer.get_characters(head.position)
+            if c_next != -1:
+                for new_head in self._apply_character_transitions(head, c_previous, c_next):
+                    add_head(next_heads, new_head)
+        queue.extend(sorted(next_heads.values()))
         left_final = entered_final and all(h.state != self.final_state for h in queue)
-        logger.info(f"\t\t\t-> {entered_final=}, {left_final=}, {final_heads=}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("\t\t\t-> entered_final=%s, left_final=%s, final_heads=%s", entered_final, left_final, final_heads)
         return entered_final, left_final, final_heads
 
-    def _apply_character_transitions(self, head: Head, c_previous: int, c_next: int) -> Set[Head]:
-        new_heads = set()
-        for transition, next_states in self.nfa.transitions.get(head.state, {}).items():
-            if transition.consume_char and transition.matches(c_previous, c_next):
-                for next_state in next_states:
-                    new_head = head.apply_transition(transition, next_state)
-                    new_heads.add(new_head)
-
-        return new_heads
-
-    def get_characters(self, text: str, start_: int, end_: int, position: int) -> tuple[int, int]:
-        prev_position = position - 1
-        if start_ <= prev_position < end_:
-            c_previous = ord(text[prev_position])
-        else:
-            c_previous = -1
-
-        if start_ <= position < end_:
-            c_next = ord(text[position])
-        else:
-            c_next = -1
-
-        return c_previous, c_next
+    def _apply_character_transitions(self, head: Head, c_previous: int, c_next: int) -> Iterable[Head]:
+        table = self.nfa.character_table
+        targets = table.targets
+        profile = self.profile
+        if profile is not None:
+            profile.state_visits[head.state] += 1
+        for g in range(table.group_offsets[head.state], table.group_offsets[head.state+1]):
+            i = table.group_transitions[g]
+            transition = self.nfa.transitions[i]
+            if transition.matches(c_previous, c_next):
+                for k in range(table.target_offsets[g], table.target_offsets[g+1]):
+                    if profile is not None:
+                        profile.transition_hits[head.state, i, targets[k]] += 1
+                    yield head.apply_transition(transition, targets[k])
+
+
+class SeenConfigurations:
+    """
+    Configurations of heads from earlier buckets, see `NFAEvaluator.drop_seen_heads()`
+
+    Counters that are not live are ignored. For states with one live counter, the dominating
+    value is tracked as well; with more live counters, only equal configurations are dropped.
+
+    """
+    def __init__(self, nfa: CompactNFA) -> None:
+        self.nfa = nfa
+        self.configurations: set[tuple[int, int, tuple[int, ...]]] = set()
+        self.best_values: dict[tuple[int, int], int] = {}
+
+    def add(self, head: Head) -> bool:
+        """Add configuration of head -> whether it was not dominated by a seen one"""
+        nfa = self.nfa
+        live_counters = nfa.live_counters[head.state]
+        counters = tuple(head.counters[k] for k in live_counters) if live_counters else ()
+        key = head.state, head.position, counters
+        if key in self.configurations:
+            return False
+        if len(live_counters) == 1:
+            k, x = live_counters[0], counters[0]
+            best = self.best_values.get(key[:2])
+            if best is not None and nfa.dominates_counter(k, best, x):
+                return False
+            at_least, bounded = nfa.counter_orders[k]
+            if (not bounded or x >= at_least) and (best is None or nfa.dominates_counter(k, x, best)):
+                self.best_values[key[:2]] = x
+        self.configurations.add(key)
+        return True
+
+
+def add_head(heads: dict[Head, Head], head: Head) -> bool:
+    """Add head, or replace equal head if its groups are not preferred -> whether `head` was added"""
+    other = heads.get(head)
+    if other is None or head.is_preferred_to(other):
+        heads[head] = head
+        return True
+    return False
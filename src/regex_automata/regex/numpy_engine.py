@@ -0,0 +1,168 @@
+from collections import deque
+from typing import TYPE_CHECKING, Iterable, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from .batch import MatchMode
+from ..automata.nfa import Configuration
+from ..automata.rangeset import RangeSet
+from ..common import root_logger
+
+if TYPE_CHECKING:
+    from .pattern import Pattern
+
+logger = root_logger.getChild("numpy_engine")
+
+
+class NumpyDFA:
+    """
+    Deterministic automaton that advances many strings at once using NumPy
+
+    Characters are mapped to classes (characters that no transition predicate can tell apart),
+    the DFA is built by subset construction over these classes. Since transition predicates
+    may look at the previous character, DFA state is a set of NFA configurations (states
+    with counter values) together with the class of the previous character.
+
+    Only reports whether each string matches, spans and groups are not tracked.
+
+    """
+    MAX_STATES = 10_000
+
+    DEAD_STATE = 0
+    ACCEPT_STATE = 1
+
+    def __init__(self, pattern: "Pattern", mode: MatchMode = "fullmatch") -> None:
+        if mode not in ("fullmatch", "match", "search"):
+            raise ValueError(f"unknown match mode {mode!r}")
+        self.pattern = pattern
+        self.mode = mode
+        self.nfa = pattern.nfa
+        self.boundaries, self.interval_classes, self.class_representatives = self.make_character_classes()
+        self.eof_class = len(self.class_representatives)
+        self.transition_table, self.accept_at_end, self.initial_state = self.make_transition_table()
+
+    def make_character_classes(self) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int32], list[int]]:
+        """-> sorted range boundaries, class of each interval between boundaries, representative character of each class"""
+        rangesets: set[RangeSet] = set()
+        for d in self.nfa.transitions.values():
+            for transition in d:
+                for predicate in transition.predicates:
+                    for rs in (predicate.previous, predicate.next):
+                        if rs is not None:
+                            rangesets.add(rs)
+        rangesets_ = list(rangesets)
+
+        boundaries = sorted({x for rs in rangesets_ for r in rs.ranges for x in r if x >= 0} - {0})
+        signature_to_class: dict[tuple[bool, ...], int] = {}
+        class_representatives: list[int] = []
+        interval_classes = []
+        for c in [0] + boundaries:  # first character of each interval
+            signature = tuple(c in rs for rs in rangesets_)
+            if signature not in signature_to_class:
+                signature_to_class[signature] = len(class_representatives)
+                class_representatives.append(c)
+            interval_classes.append(signature_to_class[signature])
+
+        logger.info(f"{len(class_representatives)} character classes from {len(rangesets_)} sets")
+        return np.array(boundaries, dtype=np.int64), np.array(interval_classes, dtype=np.int32), class_representatives
+
+    def make_transition_table(self) -> tuple[npt.NDArray[np.int32], npt.NDArray[np.bool_], int]:
+        """-> table of next state indexed by (state, class), whether input may end in state, initial state"""
+        search = self.mode == "search"
+        stop_at_final = self.mode != "fullmatch"
+        num_classes = len(self.class_representatives)
+
+        StateKey = tuple[frozenset[Configuration], int]
+        initial_configuration = self.nfa.initial_configuration
+        initial_key: StateKey = (frozenset({initial_configuration}), self.eof_class)
+        state_ids: dict[StateKey, int] = {initial_key: 2}
+        queue = deque([initial_key])
+        rows: list[list[int]] = [[self.DEAD_STATE] * num_classes, [self.ACCEPT_STATE] * num_classes]
+        accept_at_end = [False, True]
+
+        def get_state(key: StateKey) -> int:
+            if not key[0] and not search:
+                return self.DEAD_STATE
+            if key not in state_ids:
+                if len(state_ids) >= self.MAX_STATES:
+                    raise ValueError(f"pattern needs more than {self.MAX_STATES} DFA states")
+                state_ids[key] = len(state_ids) + 2
+                queue.append(key)
+            return state_ids[key]
+
+        while queue:
+            states, prev_class = key = queue.popleft()
+            assert state_ids[key] == len(rows)
+            if search:
+                states = states | {initial_configuration}
+            c_previous = self.get_representative(prev_class)
+
+            row = []
+            for next_class, c_next in enumerate(self.class_representatives):
+                closure = self.nfa.configuration_epsilon_closure(set(states), c_previous, c_next)
+                if stop_at_final and self.is_accepting(closure):
+                    row.append(self.ACCEPT_STATE)
+                    continue
+                next_states = self.nfa.configuration_step(closure, c_previous, c_next)
+                row.append(get_state((frozenset(next_states), next_class)))
+            rows.append(row)
+
+            closure = self.nfa.configuration_epsilon_closure(set(states), c_previous, -1)
+            accept_at_end.append(self.is_accepting(closure))
+
+        logger.info(f"built DFA with {len(rows)} states")
+        return np.array(rows, dtype=np.int32), np.array(accept_at_end, dtype=np.bool_), state_ids[initial_key]
+
+    def is_accepting(self, configurations: set[Configuration]) -> bool:
+        return any(u in self.nfa.final_states for u, _ in configurations)
+
+    def get_representative(self, character_class: int) -> int:
+        return -1 if character_class == self.eof_class else self.class_representatives[character_class]
+
+    def match(self, texts: Iterable[str | bytes]) -> npt.NDArray[np.bool_]:
+        """Whether each of the texts matches (according to `mode`)"""
+        codes, offsets, lengths = self.pack(texts if isinstance(texts, Sequence) else list(texts))
+        classes = self.interval_classes[np.searchsorted(self.boundaries, codes, side="right")]
+
+        # longest strings first, so that strings that are still being read form a prefix
+        order = np.argsort(-lengths, kind="stable")
+        starts = offsets[order]
+        sorted_lengths = lengths[order]
+        state = np.full(len(lengths), self.initial_state, dtype=np.int32)
+        max_length = int(sorted_lengths[0]) if len(sorted_lengths) else 0
+        num_active_at = len(sorted_lengths) - np.searchsorted(sorted_lengths[::-1], np.arange(max_length), side="right")
+
+        for k in range(max_length):
+            n = num_active_at[k]
+            state[:n] = self.transition_table[state[:n], classes[starts[:n] + k]]
+
+        output = np.empty(len(lengths), dtype=np.bool_)
+        output[order] = self.accept_at_end[state]
+        return output
+
+    def pack(self, texts: Sequence[str | bytes]) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """-> character codes of all texts, offset of each text, length of each text"""
+        lengths_: list[int] = []
+        if self.pattern.is_bytes:
+            byte_texts: list[bytes] = []
+            for t in texts:
+                if isinstance(t, str):
+                    raise TypeError("cannot use a bytes pattern on a string-like object")
+                byte_texts.append(t)
+                lengths_.append(len(t))
+            codes = np.frombuffer(b"".join(byte_texts), dtype=np.uint8).astype(np.int64)
+        else:
+            str_texts: list[str] = []
+            for t in texts:
+                if not isinstance(t, str):
+                    raise TypeError("cannot use a string pattern on a bytes-like object")
+                str_texts.append(t)
+                lengths_.append(len(t))
+            data = "".join(str_texts).encode("utf-32-le", errors="surrogatepass")
+            codes = np.frombuffer(data, dtype="<u4").astype(np.int64)
+
+        lengths = np.array(lengths_, dtype=np.int64)
+        offsets = np.zeros(len(lengths), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        return codes, offsets, lengths
@@ -0,0 +1,118 @@
+import codecs
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterator
+
+from .file_search import finditer_file, DEFAULT_CHUNK_SIZE, _BOM_FREE_CODECS
+from .match import FileMatch
+from ..common import root_logger
+
+if TYPE_CHECKING:
+    from .pattern import Pattern
+
+logger = root_logger.getChild("parallel_search")
+
+DEFAULT_SHARD_SIZE = 16 << 20
+
+ShardMatch = tuple[str | bytes, dict[int, tuple[int, int]], dict[int, tuple[int, int]]]
+ShardTask = tuple[str | os.PathLike[str], str, str, int, bool, int, int]
+
+_worker_pattern: "Pattern | None" = None
+
+
+def finditer_file_parallel(pattern: "Pattern", path: str | os.PathLike[str], workers: int | None = None,
+                           encoding: str = "utf-8", errors: str = "strict", chunk_size: int = DEFAULT_CHUNK_SIZE,
+                           all_matches: bool = False, shard_size: int = DEFAULT_SHARD_SIZE) -> Iterator[FileMatch]:
+    """
+    Find matches in newline-delimited file, searching its shards in a process pool
+
+    The file is split at newlines, which is only correct when matches cannot span lines
+    (see `NFA.is_line_local()`) and newline is encoded as a single b"\\n" byte. Otherwise,
+    the file is searched sequentially.
+
+    """
+    workers = workers if workers is not None else os.cpu_count() or 1
+    if workers <= 1:
+        return finditer_file(pattern, path, encoding, errors, chunk_size, all_matches)
+    if not pattern.nfa.is_line_local():
+        logger.info("pattern can match across lines, searching file sequentially")
+        return finditer_file(pattern, path, encoding, errors, chunk_size, all_matches)
+
+    shard_encoding = encoding
+    if not pattern.is_bytes:
+        name = codecs.lookup(encoding).name
+        shard_encoding = _BOM_FREE_CODECS.get(name, name)
+        if shard_encoding == "utf-7" or "\n".encode(shard_encoding) != b"\n":
+            logger.info(f"cannot split {encoding} text at newline bytes, searching file sequentially")
+            return finditer_file(pattern, path, encoding, errors, chunk_size, all_matches)
+
+    shards = get_shards(path, max(1, min(4 * workers, os.path.getsize(path) // shard_size)))
+    if len(shards) == 1:
+        return finditer_file(pattern, path, encoding, errors, chunk_size, all_matches)
+
+    tasks: list[ShardTask] = [
+        (path, encoding if i == 0 else shard_encoding, errors, chunk_size, all_matches, byte_start, byte_end)
+        for i, (byte_start, byte_end) in enumerate(shards)
+    ]
+    return _merge_shard_results(pattern, shards, tasks, workers)
+
+
+def _merge_shard_results(pattern: "Pattern", shards: list[tuple[int, int]], tasks: list[ShardTask],
+                         workers: int) -> Iterator[FileMatch]:
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pattern,))
+    try:
+        char_offset = 0
+        for k, ((byte_start, _), (matches, num_chars)) in enumerate(zip(shards, executor.map(_search_shard, tasks))):
+            is_last_shard = k == len(shards) - 1
+            for match, groupspandict, bytespandict in matches:
+                if not is_last_shard and groupspandict[0][0] == num_chars:
+                    continue  # empty match at the end of shard, it is found again at the start of the next one
+                yield FileMatch(
+                    re=pattern,
+                    pos=0,
+                    endpos=None,
+                    match=match,
+                    groupspandict={i: (start + char_offset, end + char_offset) for i, (start, end) in groupspandict.items()},
+                    bytespandict={i: (start + byte_start, end + byte_start) for i, (start, end) in bytespandict.items()},
+                )
+            char_offset += num_chars
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def get_shards(path: str | os.PathLike[str], num_shards: int) -> list[tuple[int, int]]:
+    """Split file into byte ranges of about the same size, each ending with newline (except the last one)"""
+    size = os.path.getsize(path)
+    if size == 0 or num_shards <= 1:
+        return [(0, size)]
+
+    boundaries = [0]
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for k in range(1, num_shards):
+            i = mm.find(b"\n", max(k * size // num_shards, boundaries[-1]))
+            if i == -1:
+                break
+            if boundaries[-1] < i + 1 < size:
+                boundaries.append(i + 1)
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def _init_worker(pattern: "Pattern") -> None:
+    global _worker_pattern
+    _worker_pattern = pattern
+
+
+def _search_shard(task: ShardTask) -> tuple[list[ShardMatch], int]:
+    """-> matches with offsets relative to the shard, number of characters in the shard"""
+    assert _worker_pattern is not None, "worker was not initialized"
+    path, encoding, errors, chunk_size, all_matches, byte_start, byte_end = task
+    matches = finditer_file(_worker_pattern, path, encoding, errors, chunk_size, all_matches, byte_start, byte_end)
+    output: list[ShardMatch] = []
+    while True:
+        try:
+            m = next(matches)
+        except StopIteration as e:
+            return output, e.value
+        output.append((m.match, m.groupspandict, m.bytespandict))
@@ -1,89 +1,249 @@
-from typing import Iterator, Callable
+import asyncio
+import os
+from array import array
+from itertools import chain
+from typing import TYPE_CHECKING, Any, AnyStr, AsyncGenerator, AsyncIterable, Iterable, Iterator, Callable, Generator, Literal
 
 from .flags import PatternFlag
-from .match import Match
+from .match import Match, FileMatch
+from .match_stats import MatchStats
+from .profiler import NFAProfile, profile_pattern
 from regex_automata.regex.nfa_evaluator import NFAEvaluator
 from ..errors import ParserError, PatternError, TokenizerError
-from ..parser.ast_processor import ASTProcessor
+from ..parser.ast import AstNode
+from ..parser.ast_processor import ASTProcessor, COUNTER_THRESHOLD
 from ..parser.ast_visualizer import ASTVisualizer
 from ..parser.tokenizer import Tokenizer
+from ..parser.tokens import Token
 from ..parser.parser import Parser
 from .nfa_builder import NFABuilder
+from .glushkov_builder import GlushkovBuilder
+from .literal_builder import LiteralNFABuilder
+from .stream import PatternStream
+from .file_search import finditer_file, DEFAULT_CHUNK_SIZE
+from .async_search import afinditer, DEFAULT_YIELD_EVERY
+from .parallel_search import finditer_file_parallel, DEFAULT_SHARD_SIZE
+from .batch import match_many, span_many, MatchMode, DEFAULT_BATCH_SIZE
+from ..automata.compact_nfa import CompactNFA
+from ..automata.nfa import NFA
+from ..automata.nfa_reduction import reduce_nfa, merge_parallel_transitions, ReductionReport
+from ..automata.rangeset import get_case_fold_table
 from ..automata.nfa_visualizer import NFAVisualizer
+from ..common import Text, gc_paused
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    from .numpy_engine import NumpyDFA
+
+Construction = Literal["thompson", "glushkov"]
 
 
 class Pattern:
-    def __init__(self, pattern: str, flags: PatternFlag = PatternFlag.NOFLAG, epsilon_free: bool = True) -> None:
-        try:
-            tokenizer = Tokenizer(pattern, flags)
-            self.tokens = list(tokenizer.get_tokens())
-            flags = tokenizer.flags
-        except TokenizerError as e:
-            msg = "\n".join([
-                str(e),
-                "",
-                pattern,
-                format("^", f">{e.string_pos+1}")
-            ])
-            raise PatternError(msg) from e
+    """
+    Compiled regular expression
 
+    Pattern is not modified after construction, so one instance can be used from many threads
+    at once; all state of a search lives in per-call objects (`NFAEvaluator`, `TextBuffer`).
+    Any cache added to Pattern must be safe to read without a lock (build the value first,
+    then publish it with a single assignment).
+
+    """
+    @gc_paused()
+    def __init__(self, pattern: str | bytes, flags: PatternFlag = PatternFlag.NOFLAG, epsilon_free: bool = True,
+                 construction: Construction = "thompson", reduce: bool = True) -> None:
+        if construction not in ("thompson", "glushkov"):
+            raise ValueError(f"unknown NFA construction {construction!r}")
+        self.is_bytes = isinstance(pattern, bytes)
+        pattern_text = pattern.decode("latin-1") if isinstance(pattern, bytes) else pattern
         try:
-            parser = Parser(self.tokens)
-            self.raw_ast = parser.parse()
+            # parser consumes tokens as they are produced, they are not kept
+            tokenizer = Tokenizer(pattern_text, flags, is_bytes=self.is_bytes)
+            tokens = tokenizer.get_tokens()
+            parser = Parser(tokens)
+            try:
+                raw_ast = parser.parse()
+            except ParserError:
+                # unsupported syntax takes precedence over parse errors, read the rest of the pattern
+                for _ in tokens:
+                    pass
+                raise
+            flags = tokenizer.flags
             self.group_name_to_group_number = parser.group_name_to_group_number
-        except ParserError as e:
+        except (TokenizerError, ParserError) as e:
             msg = "\n".join([
                 str(e),
                 "",
-                pattern,
+                pattern_text,
                 format("^", f">{e.string_pos+1}")
             ])
             raise PatternError(msg) from e
 
         try:
-            self.ast = ASTProcessor(self.raw_ast).get_processed_ast()
-            max_group_number = ASTProcessor.get_max_group_number(self.ast)
+            # position automaton has no counters, bounded repetitions are always expanded for it
+            counter_threshold = COUNTER_THRESHOLD if construction == "thompson" else None
+            ast = ASTProcessor(raw_ast, counter_threshold).get_processed_ast()
+            max_group_number = ASTProcessor.get_max_group_number(ast)
             assert max_group_number is not None
             self.max_group_number = max_group_number
         except Exception as e:
             raise PatternError("AST processing failed") from e
 
-        self.nfa = NFABuilder(self.ast).build(epsilon_free=epsilon_free)
+        self.raw_ast: AstNode | None = raw_ast
+        self.ast: AstNode | None = ast
+
+        if construction == "glushkov":
+            nfa = GlushkovBuilder(ast).build()
+        else:
+            nfa = NFABuilder(ast).build(epsilon_free=epsilon_free)
+        self.reduction_report: ReductionReport | None = None
+        if reduce:
+            nfa, self.reduction_report = reduce_nfa(nfa)
         self.pattern = pattern
         self.flags = flags
+        self._set_nfa(nfa)
+
+    @classmethod
+    @gc_paused()
+    def from_literals(cls, words: Iterable[str] | Iterable[bytes], flags: PatternFlag = PatternFlag.NOFLAG,
+                      presorted: bool = False) -> "Pattern":
+        """
+        Pattern matching any of the literal words, like the escaped words joined with `|`
+
+        Words are not parsed; they are compiled into a minimal acyclic automaton directly,
+        which is much smaller than the union of the words for large word lists. The words are
+        sorted first, unless `presorted` is set, in which case they are consumed one by one and
+        must be in lexicographic order (after case folding, with IGNORECASE).
+
+        The pattern has no AST and its `pattern` attribute is empty. At least one word is required,
+        otherwise it is not known whether the pattern is for str or bytes.
+
+        """
+        words_: Iterator[str | bytes] = iter(words)
+        first_word = next(words_, None)
+        if first_word is None:
+            raise ValueError("cannot compile pattern from empty word list")
+        is_bytes = isinstance(first_word, bytes)
+        ignorecase = bool(flags & PatternFlag.IGNORECASE)
+        fold_table = get_case_fold_table(ascii_only=is_bytes) if ignorecase else {}
+        byte_fold_table = bytes(fold_table.get(x, x) for x in range(256))
+
+        def fold(word: str | bytes) -> str | bytes:
+            if not fold_table:
+                return word
+            elif isinstance(word, bytes):
+                return word.translate(byte_fold_table)
+            else:
+                return word.translate(fold_table)
+
+        builder = LiteralNFABuilder(is_bytes, ignorecase)
+        folded_words = map(fold, chain([first_word], words_))
+        for word in folded_words if presorted else sorted(set(folded_words)):
+            builder.add(word)
+
+        self = cls.__new__(cls)
+        self.is_bytes = is_bytes
+        self.raw_ast = self.ast = None
+        self.group_name_to_group_number = {}
+        self.max_group_number = 0
+        self.reduction_report = None
+        self.pattern = b"" if is_bytes else ""
+        self.flags = flags
+        self._set_nfa(merge_parallel_transitions(builder.build()))
+        return self
+
+    def _set_nfa(self, nfa: NFA) -> None:
+        self.nfa = nfa
+        self.compact_nfa = CompactNFA.from_nfa(nfa)
+        self.alphabet = nfa.get_alphabet()
+        self.final_distances = nfa.get_final_distances()
+        self._numpy_dfas: dict[MatchMode, "NumpyDFA"] = {}
+
+    @property
+    def tokens(self) -> list[Token]:
+        """Tokens of the pattern (tokenized again on each access)"""
+        pattern_text = self.pattern.decode("latin-1") if isinstance(self.pattern, bytes) else self.pattern
+        return list(Tokenizer(pattern_text, self.flags, is_bytes=self.is_bytes).get_tokens())
 
     def render_nfa(self, output_path: str = "nfa.png") -> None:
         NFAVisualizer(self.nfa).render(output_path)
 
+    def profile(self, texts: Text | Iterable[Text], all_matches: bool = False) -> NFAProfile:
+        """Run `finditer()` over the texts and count how often each NFA state and transition is used"""
+        return profile_pattern(self, texts, all_matches)
+
     def render_ast(self, output_path: str = "ast.png", raw: bool = False) -> None:
         ast = self.ast if not raw else self.raw_ast
+        if ast is None:
+            raise ValueError("pattern has no AST (it was built from literals)")
         ASTVisualizer(ast).render(output_path)
 
-    def fullmatch(self, text: str, start: int = 0, end: int | None = None) -> Match | None:
-        end_ = end if end is not None else len(text)
-        m = self.match(text, start, end)
-        if m is not None and m.end() != end_:
-            m = None
-        return m
+    def fullmatch(self, text: Text, start: int = 0, end: int | None = None, stats: MatchStats | None = None) -> Match | None:
+        evaluator = NFAEvaluator(self, self.flags, stats)
+        return evaluator.fullmatch(text, start, end)
 
-    def match(self, text: str, start: int = 0, end: int | None = None) -> Match | None:
-        evaluator = NFAEvaluator(self, self.flags)
+    def match(self, text: Text, start: int = 0, end: int | None = None, stats: MatchStats | None = None) -> Match | None:
+        evaluator = NFAEvaluator(self, self.flags, stats)
         try:
             return next(evaluator.finditer(text, start, end, search=False))
         except StopIteration:
             return None
 
-    def search(self, text: str, start: int = 0, end: int | None = None) -> Match | None:
+    def search(self, text: Text, start: int = 0, end: int | None = None, stats: MatchStats | None = None) -> Match | None:
         try:
-            return next(self.finditer(text, start, end))
+            return next(self.finditer(text, start, end, stats=stats))
         except StopIteration:
             return None
 
-    def finditer(self, text: str, start: int = 0, end: int | None = None, all_matches: bool = False) -> Iterator[Match]:
-        evaluator = NFAEvaluator(self, self.flags)
+    def finditer(self, text: Text, start: int = 0, end: int | None = None, all_matches: bool = False,
+                 stats: MatchStats | None = None) -> Iterator[Match]:
+        evaluator = NFAEvaluator(self, self.flags, stats)
         yield from evaluator.finditer(text, start, end, all_matches=all_matches)
 
-    def findall(self, s: str, flags: PatternFlag = PatternFlag.NOFLAG, all_matches: bool = False) -> list[str | None] | list[tuple[str | None, ...]]:
+    def stream(self, all_matches: bool = False) -> PatternStream:
+        return PatternStream(self, all_matches=all_matches)
+
+    def search_file(self, path: str | os.PathLike[str], encoding: str = "utf-8", errors: str = "strict",
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> FileMatch | None:
+        matches = self.finditer_file(path, encoding, errors, chunk_size)
+        try:
+            return next(matches)
+        except StopIteration:
+            return None
+        finally:
+            matches.close()
+
+    def finditer_file(self, path: str | os.PathLike[str], encoding: str = "utf-8", errors: str = "strict",
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, all_matches: bool = False) -> Generator[FileMatch, None, int]:
+        return finditer_file(self, path, encoding, errors, chunk_size, all_matches)
+
+    def finditer_file_parallel(self, path: str | os.PathLike[str], workers: int | None = None, encoding: str = "utf-8",
+                               errors: str = "strict", chunk_size: int = DEFAULT_CHUNK_SIZE, all_matches: bool = False,
+                               shard_size: int = DEFAULT_SHARD_SIZE) -> Iterator[FileMatch]:
+        return finditer_file_parallel(self, path, workers, encoding, errors, chunk_size, all_matches, shard_size)
+
+    def afinditer(self, source: asyncio.StreamReader | AsyncIterable[Text] | Text, yield_every: int = DEFAULT_YIELD_EVERY,
+                  encoding: str = "utf-8", errors: str = "strict", all_matches: bool = False) -> AsyncGenerator[Match, None]:
+        return afinditer(self, source, yield_every, encoding, errors, all_matches)
+
+    def match_many(self, texts: Iterable[Text], mode: MatchMode = "fullmatch", workers: int = 1,
+                   batch_size: int = DEFAULT_BATCH_SIZE) -> list[bool]:
+        return match_many(self, texts, mode, workers, batch_size)
+
+    def span_many(self, texts: Iterable[Text], mode: MatchMode = "search", workers: int = 1,
+                  batch_size: int = DEFAULT_BATCH_SIZE) -> "array[int]":
+        return span_many(self, texts, mode, workers, batch_size)
+
+    def match_array(self, texts: Iterable[str | bytes], mode: MatchMode = "fullmatch") -> "npt.NDArray[np.bool_]":
+        """Vectorized matching of many texts using NumPy (which must be installed), returns boolean array"""
+        dfa = self._numpy_dfas.get(mode)
+        if dfa is None:
+            from .numpy_engine import NumpyDFA
+            dfa = NumpyDFA(self, mode)
+            self._numpy_dfas[mode] = dfa
+        return dfa.match(texts)
+
+    def findall(self, s: Text, flags: PatternFlag = PatternFlag.NOFLAG, all_matches: bool = False) -> list[Any] | list[tuple[Any, ...]]:
         output = []
         for m in self.finditer(s, flags, all_matches=all_matches):
             match m.groups():
@@ -95,21 +255,23 @@ class Pattern:
                     output.append(groups)
         return output
 
-    def sub(self, repl: str | Callable[[Match], str], s: str, count: int = 0) -> str:
-        return self.subn(repl, s, count)[0]
+    def sub(self, repl: AnyStr | Callable[[Match], AnyStr], s: AnyStr, count: int = 0,
+            stats: MatchStats | None = None) -> AnyStr:
+        return self.subn(repl, s, count, stats)[0]
 
-    def subn(self, repl: str | Callable[[Match], str], s: str, count: int = 0) -> tuple[str, int]:
-        if isinstance(repl, str):
-            def repl_fn(m: Match) -> str:
+    def subn(self, repl: AnyStr | Callable[[Match], AnyStr], s: AnyStr, count: int = 0,
+             stats: MatchStats | None = None) -> tuple[AnyStr, int]:
+        if isinstance(repl, (str, bytes)):
+            def repl_fn(m: Match) -> AnyStr:
                 return m.expand(repl)
         else:
             repl_fn = repl  # type: ignore[assignment]
 
         num_replacements = 0
-        output: list[str] = []
+        output: list[AnyStr] = []
         last_match_end = 0
 
-        for m in self.finditer(s):
+        for m in self.finditer(s, stats=stats):
             output.append(s[last_match_end:m.start()])
             output.append(repl_fn(m))
             num_replacements += 1
@@ -119,14 +281,15 @@ class Pattern:
 
         output.append(s[last_match_end:])
 
-        return "".join(output), num_replacements
+        return s[:0].join(output), num_replacements
 
-    def split(self, s: str, maxsplit: int = 0, flags: PatternFlag = PatternFlag.NOFLAG) -> list[str | None]:
+    def split(self, s: AnyStr, maxsplit: int = 0, flags: PatternFlag = PatternFlag.NOFLAG,
+              stats: MatchStats | None = None) -> list[AnyStr | None]:
         numsplit = 0
-        output: list[str | None] = []
+        output: list[AnyStr | None] = []
         last_match_end = 0
 
-        for m in self.finditer(s, flags):
+        for m in self.finditer(s, flags, stats=stats):
             output.append(s[last_match_end:m.start()])
             output.extend(m.groups())
             numsplit += 1
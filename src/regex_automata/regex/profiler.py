@@ -0,0 +1,76 @@
+import json
+import os
+from collections import Counter
+from mmap import mmap
+from typing import TYPE_CHECKING, Any, Iterable
+
+from .match_stats import MatchStats
+from .nfa_evaluator import NFAEvaluator
+from ..automata.nfa import Transition
+from ..automata.nfa_visualizer import NFAVisualizer
+from ..common import Text
+
+if TYPE_CHECKING:
+    from .pattern import Pattern
+
+
+class NFAProfile:
+    """
+    Visits of NFA states and hits of transitions while matching a corpus, made by `Pattern.profile()`
+
+    A state is visited by each head that is in it when a character is read; a transition is hit
+    whenever the evaluator takes it, so the counts reflect where the evaluator spends its work.
+    States and transition indices refer to `pattern.nfa` and `pattern.compact_nfa.transitions`.
+    Counts are added by `NFAEvaluator` when the profile is passed to it as `profile=`.
+
+    """
+    def __init__(self, pattern: "Pattern") -> None:
+        self.pattern = pattern
+        self.state_visits: Counter[int] = Counter()
+        self.transition_hits: Counter[tuple[int, int, int]] = Counter()  # state, transition index, target state
+        self.stats = MatchStats()
+
+    def get_transition_hits(self) -> dict[tuple[int, Transition, int], int]:
+        transitions = self.pattern.compact_nfa.transitions
+        return {(u, transitions[i], v): n for (u, i, v), n in self.transition_hits.items()}
+
+    def get_hot_states(self, n: int | None = None) -> list[tuple[int, int]]:
+        """-> (state, visits) of the most visited states"""
+        return self.state_visits.most_common(n)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Raw counts for JSON export, with transitions labelled like in `render()`"""
+        transitions = self.pattern.compact_nfa.transitions
+        pattern = self.pattern.pattern
+        return {
+            "pattern": pattern.decode("latin-1") if isinstance(pattern, bytes) else pattern,
+            "stats": vars(self.stats),
+            "states": [
+                {"state": u, "visits": self.state_visits.get(u, 0)}
+                for u in range(self.pattern.compact_nfa.num_states)
+            ],
+            "transitions": [
+                {"state": u, "target": v, "label": transitions[i].label, "hits": n}
+                for (u, i, v), n in sorted(self.transition_hits.items())
+            ],
+        }
+
+    def save_json(self, path: str | os.PathLike[str]) -> None:
+        with open(path, "w") as fp:
+            json.dump(self.to_dict(), fp, indent=2)
+
+    def render(self, output_path: str = "nfa_profile.png") -> None:
+        """Render NFA with states and transitions colored by their counts"""
+        NFAVisualizer(self.pattern.nfa, dict(self.state_visits), self.get_transition_hits()).render(output_path)
+
+
+def profile_pattern(pattern: "Pattern", texts: Text | Iterable[Text], all_matches: bool = False) -> NFAProfile:
+    """Run `finditer()` over each text and count visits of states and hits of transitions"""
+    profile = NFAProfile(pattern)
+    evaluator = NFAEvaluator(pattern, pattern.flags, profile.stats, profile)
+    if isinstance(texts, (str, bytes, bytearray, memoryview, mmap)):
+        texts = [texts]
+    for text in texts:
+        for _ in evaluator.finditer(text, all_matches=all_matches):
+            pass
+    return profile
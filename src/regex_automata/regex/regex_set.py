@@ -0,0 +1,165 @@
+from typing import Iterable
+
+from .flags import PatternFlag
+from .match import Match
+from .nfa_evaluator import NFAEvaluator, TextBuffer, make_text_buffer
+from .pattern import Pattern
+from ..automata.compact_nfa import CompactNFA
+from ..automata.nfa import NFA, Transition, Configuration
+from ..common import root_logger, Text
+
+logger = root_logger.getChild("regex_set")
+
+
+class RegexSet:
+    """
+    Set of patterns that are searched for in a single pass over the text
+
+    NFAs of the patterns are merged under a shared initial state, final state of each
+    pattern is tagged with the pattern index. Patterns are identified by their index
+    in `patterns`.
+
+    """
+    def __init__(self, patterns: Iterable[Pattern | str | bytes], flags: PatternFlag = PatternFlag.NOFLAG) -> None:
+        self.patterns = [p if isinstance(p, Pattern) else Pattern(p, flags) for p in patterns]
+
+        if len({p.is_bytes for p in self.patterns}) > 1:
+            raise TypeError("cannot mix str and bytes patterns")
+        self.is_bytes = any(p.is_bytes for p in self.patterns)
+
+        self.nfa, self.state_to_pattern, self.final_state_to_pattern = self.merge_nfas([p.nfa for p in self.patterns])
+        self.compact_nfa = CompactNFA.from_nfa(self.nfa)
+
+    @staticmethod
+    def merge_nfas(nfas: list[NFA]) -> tuple[NFA, list[int], dict[int, int]]:
+        """-> merged NFA, pattern index of each state (-1 for the initial state), pattern index of final states"""
+        initial_state = 0
+        states = [initial_state]
+        transitions: dict[int, dict[Transition, set[int]]] = {}
+        final_states: set[int] = set()
+        state_to_pattern = [-1]
+        final_state_to_pattern: dict[int, int] = {}
+        initial_states: set[int] = set()
+
+        for i, nfa in enumerate(nfas):
+            nfa = nfa.renumber_states(len(states))
+            states += nfa.states
+            transitions.update(nfa.transitions)
+            final_states |= nfa.final_states
+            state_to_pattern += [i] * len(nfa.states)
+            final_state_to_pattern.update((x, i) for x in nfa.final_states)
+            initial_states.add(nfa.initial_state)
+
+        transitions[initial_state] = {Transition.make_trivial_epsilon(): initial_states}
+
+        nfa = NFA(
+            states=states,
+            initial_state=initial_state,
+            final_states=final_states,
+            transitions=transitions,
+            num_counters=max((nfa.num_counters for nfa in nfas), default=0),
+        )
+        return nfa, state_to_pattern, final_state_to_pattern
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def is_match(self, text: Text, start: int = 0, end: int | None = None) -> bool:
+        return bool(self.scan(self.make_buffer(text, start, end), stop_at_first=True))
+
+    def matches(self, text: Text, start: int = 0, end: int | None = None) -> list[int]:
+        """Indices of patterns that match somewhere in text"""
+        return sorted(self.scan(self.make_buffer(text, start, end)))
+
+    def search(self, text: Text, start: int = 0, end: int | None = None) -> dict[int, Match]:
+        """
+        First match of each pattern that matches somewhere in text
+
+        Matches are the same as those returned by `Pattern.search()`. The shared scan finds
+        where each match starts; the matching pattern is then evaluated only from that start,
+        to extend the match to its longest end and resolve its groups. Text before the match is
+        not read again, and each of these runs stops as soon as its match is final.
+
+        """
+        buffer = self.make_buffer(text, start, end)
+        output = {}
+        for i, (match_start, _) in sorted(self.scan(buffer).items()):
+            pattern = self.patterns[i]
+            evaluator = NFAEvaluator(pattern, pattern.flags)
+            m = next(evaluator.evaluate(buffer, search=False, from_position=match_start))
+            assert m is not None, "complete buffer should never need more input"
+            output[i] = m
+        return output
+
+    def make_buffer(self, text: Text, start: int = 0, end: int | None = None) -> TextBuffer:
+        return make_text_buffer(text, start, end, self.is_bytes)
+
+    def scan(self, buffer: TextBuffer, stop_at_first: bool = False) -> dict[int, tuple[int, int]]:
+        """
+        Simulate the merged NFA over complete buffer
+
+        Each active configuration (state and counter values) keeps only the earliest start position
+        it was reached from, this is enough to find the leftmost match with the earliest end for each pattern.
+        Returns pattern index -> (start, end) of that match.
+
+        """
+        assert buffer.end is not None
+        found: dict[int, tuple[int, int]] = {}
+        heads: dict[Configuration, int] = {}
+        initial_configuration = self.compact_nfa.initial_configuration
+
+        for position in range(buffer.start, buffer.end + 1):
+            heads[initial_configuration] = position
+            c_previous, c_next = buffer.get_characters(position)
+            heads = self.apply_epsilon_transitions(heads, found, c_previous, c_next)
+
+            matched: dict[int, int] = {}
+            for (state, _), start in heads.items():
+                i = self.final_state_to_pattern.get(state)
+                if i is not None and i not in found:
+                    matched[i] = min(start, matched.get(i, start))  # final state may be reached with different counters
+            for i, start in matched.items():
+                logger.info(f"pattern {i} matched at {(start, position)}")
+                found[i] = start, position
+
+            if len(found) == len(self.patterns) or (stop_at_first and found):
+                break
+
+            heads = self.apply_character_transitions(heads, found, c_previous, c_next)
+
+        return found
+
+    def apply_epsilon_transitions(self, heads: dict[Configuration, int], found: dict[int, tuple[int, int]],
+                                  c_previous: int, c_next: int) -> dict[Configuration, int]:
+        closure = dict(heads)
+        stack = list(heads)
+        while stack:
+            u, counters = configuration = stack.pop()
+            start = closure[configuration]
+            for transition_index, next_states in self.compact_nfa.epsilon_table.iter_groups(u):
+                transition = self.compact_nfa.transitions[transition_index]
+                if transition.matches(c_previous, c_next) and transition.allows(counters):
+                    next_counters = transition.counter_op.apply(counters) if transition.counter_op is not None else counters
+                    for v in next_states:
+                        next_configuration = v, next_counters
+                        if self.state_to_pattern[v] not in found and (next_configuration not in closure or start < closure[next_configuration]):
+                            closure[next_configuration] = start
+                            stack.append(next_configuration)
+        return closure
+
+    def apply_character_transitions(self, heads: dict[Configuration, int], found: dict[int, tuple[int, int]],
+                                    c_previous: int, c_next: int) -> dict[Configuration, int]:
+        next_heads: dict[Configuration, int] = {}
+        if c_next == -1:
+            return next_heads
+        for (u, counters), start in heads.items():
+            if self.state_to_pattern[u] in found:
+                continue
+            for transition_index, next_states in self.compact_nfa.character_table.iter_groups(u):
+                transition = self.compact_nfa.transitions[transition_index]
+                if transition.matches(c_previous, c_next):
+                    for v in next_states:
+                        next_configuration = v, counters
+                        if next_configuration not in next_heads or start < next_heads[next_configuration]:
+                            next_heads[next_configuration] = start
+        return next_heads
@@ -0,0 +1,50 @@
+from typing import TYPE_CHECKING, Iterator
+
+from .match import Match
+from .nfa_evaluator import NFAEvaluator, TextBuffer
+from ..common import Text
+
+if TYPE_CHECKING:
+    from .pattern import Pattern
+
+
+class PatternStream:
+    """
+    Incremental search over text that arrives in chunks
+
+    Matches are returned from `feed()` as soon as they are final; match positions are
+    relative to the beginning of the stream. Only text that may still be part of a match
+    is retained between calls.
+
+    """
+    def __init__(self, pattern: "Pattern", all_matches: bool = False) -> None:
+        self.pattern = pattern
+        self.buffer = TextBuffer(b"" if pattern.is_bytes else "")
+        self._matches = NFAEvaluator(pattern, pattern.flags).evaluate(self.buffer, all_matches=all_matches)
+        self.closed = False
+
+    def feed(self, chunk: Text) -> list[Match]:
+        if self.closed:
+            raise ValueError("cannot feed closed stream")
+        self.buffer.append(chunk)
+        output = list(self._read_matches())
+        self.buffer.discard()
+        return output
+
+    def close(self) -> list[Match]:
+        if self.closed:
+            return []
+        self.closed = True
+        self.buffer.close()
+        return list(self._read_matches())
+
+    def _read_matches(self) -> Iterator[Match]:
+        for m in self._matches:
+            if m is None:
+                break
+            yield m
+
+    @property
+    def position(self) -> int:
+        """Number of characters fed so far"""
+        return self.buffer.limit
@@ -0,0 +1,28 @@
+import json
+import re
+
+import regex_automata
+from regex_automata.bench.corpora import CORPORA
+from regex_automata.bench.throughput import CASES, OPERATIONS, ENGINES, main
+
+
+def test_bench_cases_agree_with_re():
+    for case in CASES:
+        lines = CORPORA[case.corpus](1000, 0)
+        for pattern in (case.pattern, case.fullmatch_pattern):
+            p, p_re = regex_automata.compile(pattern), re.compile(pattern)
+            for line in lines:
+                assert [m.span() for m in p.finditer(line)] == [m.span() for m in p_re.finditer(line)]
+        assert any(regex_automata.compile(case.fullmatch_pattern).fullmatch(line) for line in lines)
+
+
+def test_bench_json_output(tmp_path):
+    path = tmp_path / "bench.json"
+    main(["--size", "300", "--repeat", "2", "--corpus", "csv", "--json", str(path)])
+    output = json.loads(path.read_text())
+    assert output["regex_automata"] == regex_automata.__version__
+    results = output["results"]
+    assert {(r["operation"], r["engine"]) for r in results} == {(o, e) for o in OPERATIONS for e in ENGINES}
+    for r in results:
+        assert r["p50_us"] <= r["p90_us"] <= r["p99_us"]
+        assert (r["mb_per_s"] is None) == (r["operation"] == "compile")
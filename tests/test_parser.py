@@ -1,10 +1,14 @@
 import pytest
 
 from regex_automata.automata.rangeset import RangeSet
-from regex_automata.errors import TokenizerError
-from regex_automata.parser.ast import AstUnion, AstCharacterSet, AstConcatenation, AstGroup
+from regex_automata.errors import TokenizerError, ParserError, PatternError, UnsupportedSyntaxError
+from regex_automata.parser.ast import AstUnion, AstCharacterSet, AstConcatenation, AstGroup, AstRepetition, AstNode
+from regex_automata.parser.ast_processor import ASTProcessor
 from regex_automata.parser.parser import Parser
+from regex_automata.parser.tokens import CharacterSet
 from regex_automata.parser.tokenizer import Tokenizer
+from regex_automata.regex.flags import PatternFlag
+from regex_automata.regex.pattern import Pattern
 
 
 @pytest.mark.parametrize("pattern", ["a", "aa", "aaa", "a|b", "a|b|c", "(a)(b)(c)", "a*", "(a)", "(a*)", "(a*)*",
@@ -52,3 +56,74 @@ def test_tokenizer_errors_in_pattern_malformed(pattern):
 @pytest.mark.parametrize("pattern", ["{", "{123", "{123,", "{,123", "{,123,}", "{123,456,}"])
 def test_tokenizer_errors_in_pattern_nonmalformed(pattern):
     list(Tokenizer(pattern).get_tokens())
+
+
+def test_ast_hash_consing():
+    a = _ast_character_set("a")
+    assert a is _ast_character_set("a")
+    assert AstConcatenation(a, a) is AstConcatenation(_ast_character_set("a"), a)
+    assert AstConcatenation(a, a) is not AstConcatenation(a, _ast_character_set("b"))
+    with pytest.raises(AttributeError):
+        a.label = "b"  # type: ignore[misc]
+
+    # repeated subtree is shared, not copied
+    ast = ASTProcessor(AstRepetition(AstGroup(1, a), 200, 300), counter_threshold=None).get_processed_ast()
+    assert len(list(ast.iter_descendants())) < 1000
+    assert ASTProcessor.get_max_group_number(ast) == 1
+
+
+def test_ast_processor_keeps_unchanged_nodes():
+    ast = Parser(Tokenizer("ab|cd|a(b|c)").get_tokens()).parse()
+    assert ASTProcessor(ast).convert(ast) is ast
+
+
+def test_ast_processor_deep_nesting():
+    depth = 20_000
+    node: AstNode = _ast_character_set("a")
+    for i in range(depth):
+        node = AstGroup(i + 1, AstConcatenation(node, _ast_character_set("b")))
+    ast = ASTProcessor(node).get_processed_ast()
+    assert ASTProcessor.get_max_group_number(ast) == depth
+
+
+@pytest.mark.parametrize("pattern", ["*", "a|*", "(*)", "a**", "(a", "a)", "a||b", "^*"])
+def test_parser_errors(pattern):
+    with pytest.raises(ParserError):
+        Parser(Tokenizer(pattern).get_tokens()).parse()
+
+
+def test_parser_unsupported_syntax_precedence():
+    with pytest.raises(UnsupportedSyntaxError):
+        Pattern("a?*a?+")
+    with pytest.raises(PatternError):
+        Pattern("a?*a")
+
+
+def test_parse_from_token_stream():
+    tokens = Tokenizer("ab|(cd|ef)|gh").get_tokens()
+    assert Parser(tokens).parse() == Parser(list(Tokenizer("ab|(cd|ef)|gh").get_tokens())).parse()
+
+
+def test_tokenizer_literal_runs():
+    tokens = list(Tokenizer("xyz]}a{b*", PatternFlag.IGNORECASE).get_tokens())
+    assert [t.text for t in tokens] == ["x", "y", "z", "]", "}", "a", "{", "b", "*"]
+    assert [t.span for t in tokens[:3]] == [(0, 1), (1, 2), (2, 3)]
+    assert isinstance(tokens[5], CharacterSet) and tokens[5].set == RangeSet(map(ord, "aA"))
+
+
+def test_parser_deep_nesting():
+    depth = 50_000
+    ast = Parser(Tokenizer("(" * depth + "a" + ")" * depth).get_tokens()).parse()
+    for i in range(depth):
+        assert isinstance(ast, AstGroup) and ast.number == i + 1
+        ast = ast.u
+    assert ast == _ast_character_set("a")
+
+
+def test_parser_long_pattern():
+    pattern = "|".join(f"w{i}(x|y)*" for i in range(5_000))
+    ast = Parser(Tokenizer(pattern).get_tokens()).parse()
+    for _ in range(5_000 - 1):
+        assert isinstance(ast, AstUnion)
+        ast = ast.v
+    assert isinstance(ast, AstConcatenation)
@@ -1,6 +1,17 @@
-from regex_automata.automata.rangeset import RangeSet
+from regex_automata.automata.rangeset import RangeSet, WHITESPACE_RANGESET
+import pickle
 from itertools import permutations
 
+UNIVERSE = range(-5, 30)
+BASE_SETS = [
+    RangeSet(),
+    RangeSet(ranges=[(0, 10)]),
+    RangeSet(ranges=[(5, 8), (12, 20)]),
+    RangeSet(ranges=[(0, 10)], complement=True),
+    RangeSet(ranges=[(3, 4), (9, 15)], complement=True),
+    RangeSet(complement=True),
+]
+
 
 def test_simple():
     a = RangeSet(ranges=[(0, 10)])
@@ -57,3 +68,49 @@ def test_intersection():
                 reference_set &= set(range(*ranges[j]))
                 range_set_intersection &= RangeSet(ranges=[ranges[j]])
                 assert reference_set == set(range_set_intersection)
+
+
+def test_complement_union_intersection():
+    for a in BASE_SETS:
+        for b in BASE_SETS:
+            reference_a = {x for x in UNIVERSE if x in a}
+            reference_b = {x for x in UNIVERSE if x in b}
+            assert {x for x in UNIVERSE if x in a | b} == reference_a | reference_b
+            assert {x for x in UNIVERSE if x in a & b} == reference_a & reference_b
+
+
+def test_complement_difference_symmetric_difference():
+    for a in BASE_SETS:
+        reference_a = {x for x in UNIVERSE if x in a}
+        assert {x for x in UNIVERSE if x in ~a} == set(UNIVERSE) - reference_a
+        assert ~~a is a
+        for b in BASE_SETS:
+            reference_b = {x for x in UNIVERSE if x in b}
+            assert {x for x in UNIVERSE if x in a - b} == reference_a - reference_b
+            assert {x for x in UNIVERSE if x in a ^ b} == reference_a ^ reference_b
+            assert (a <= b) == (a - b).empty
+            assert a.isdisjoint(b) == (a & b).empty
+
+
+def test_interning():
+    a = RangeSet(ranges=[(0, 10), (20, 30)])
+    assert RangeSet(values=range(20, 30), ranges=[(0, 10)]) is a
+    assert (RangeSet(ranges=[(0, 10)]) | RangeSet(ranges=[(20, 30)])) is a
+    assert pickle.loads(pickle.dumps(a)) is a
+    assert hash(a) == hash(RangeSet(ranges=[(0, 10), (20, 30)]))
+    assert a | {30, 31} == RangeSet(ranges=[(0, 10), (20, 32)])
+    assert {5} - a == RangeSet()
+
+
+def test_large_ranges():
+    # operations never iterate over elements
+    a = RangeSet(ranges=[(0, 10**12)])
+    b = RangeSet(ranges=[(10, 20)], complement=True)
+    assert (a - b) == RangeSet(ranges=[(10, 20)])
+    assert len(a ^ ~b) == 10**12 - 10
+
+
+def test_whitespace():
+    assert ord("-") not in WHITESPACE_RANGESET
+    assert all(x in WHITESPACE_RANGESET for x in range(0x2000, 0x200b))
+    assert all(chr(x).isspace() for x in range(0x10000) if x in WHITESPACE_RANGESET and x != 0xfeff)
@@ -0,0 +1,34 @@
+import math
+
+import pytest
+
+from regex_automata import compile
+from regex_automata.bench.redos import CASES, APIS, PathologicalCase, measure_growth, fit_exponent
+
+# steps are counted by the evaluator, so the exponent does not depend on timing noise;
+# quadratic growth gives exponent close to 2
+SIZES = (50, 100, 200, 400)
+MAX_EXPONENT = 1.5
+
+
+def test_fit_exponent():
+    assert fit_exponent([10, 20, 40], [1.0, 2.0, 4.0]) == pytest.approx(1.0)
+    assert fit_exponent([10, 20, 40], [1.0, 4.0, 16.0]) == pytest.approx(2.0)
+
+
+def test_cases_use_counters():
+    assert any(compile(case.pattern).nfa.num_counters > 0 for case in CASES)
+
+
+def test_cases_have_overlapping_matches():
+    # all matches are output, so their number must grow linearly as well
+    assert any(len(list(compile(case.pattern).finditer(case.make_text(100), all_matches=True))) == 100
+               for case in CASES)
+
+
+@pytest.mark.parametrize("api", APIS)
+@pytest.mark.parametrize("case", CASES, ids=[case.pattern for case in CASES])
+def test_linear_steps(case: PathologicalCase, api: str):
+    result = measure_growth(compile(case.pattern), api, case, SIZES, repeat=1, max_seconds=math.inf)
+    assert result.sizes == list(SIZES)
+    assert result.steps_exponent < MAX_EXPONENT, result
@@ -1,8 +1,25 @@
+import gc
+import json
+import pickle
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+
 import pytest
 
 import regex_automata
 from regex_automata import PatternFlag, Match
+from regex_automata.automata.compact_nfa import CompactNFA
+from regex_automata.automata.nfa import NFA, Transition, TransitionPredicate
+from regex_automata.automata.nfa_reduction import reduce_nfa
+from regex_automata.automata.nfa_visualizer import NFAVisualizer
+from regex_automata.automata.rangeset import RangeSet
+from regex_automata.common import gc_paused
 from regex_automata.errors import PatternError
+from regex_automata.parser.ast import AstNode, AstEmpty, AstConcatenation, AstCharacterSet, AstUnion, AstGroup
+from regex_automata.parser.ast_processor import ASTProcessor
+from regex_automata.regex.nfa_builder import NFABuilder
+from regex_automata.regex.nfa_evaluator import NFAEvaluator, make_text_buffer
 
 
 @pytest.mark.parametrize("pattern,s,result",
@@ -261,3 +278,692 @@ def test_sub():
         return str(int(m._group(0)) + 1)
     assert regex_automata.subn(r"[0-9]", numrepl, "1234") == ("2345", 4)
     assert regex_automata.subn(r"[0-9]", numrepl, "1234", count=2) == ("2334", 2)
+
+
+def test_fullmatch_anchored():
+    p = regex_automata.compile(r"a.*")
+    m = p.fullmatch("abc")
+    assert m is not None and m.span() == (0, 3)
+    m = p.fullmatch("xabcx", start=1, end=4)
+    assert m is not None and m.span() == (1, 4)
+
+    p = regex_automata.compile(r"(\d+)-(\d+)")
+    m = p.fullmatch("123-45")
+    assert m is not None and m.groups() == ("123", "45")
+    assert p.fullmatch("123-45x") is None
+    assert p.fullmatch("123-") is None
+    assert p.fullmatch("12x-45") is None
+
+
+def test_pattern_alphabet():
+    p = regex_automata.compile(r"[a-c]x|\d")
+    assert all(ord(c) in p.alphabet for c in "abcx0123456789")
+    assert all(ord(c) not in p.alphabet for c in "dy_ ")
+    assert regex_automata.compile(r"a.").alphabet == regex_automata.compile(r".").alphabet
+
+    p = regex_automata.compile(r"a{3}b")
+    assert p.final_distances[p.nfa.initial_state] == 4
+
+
+@pytest.mark.parametrize("pattern,text", [
+    (r"[a-z]+@[a-z]+\.com", "mail abc@def.com, xyz@abc.com and more"),
+    (r"\bfoo\b|bar$", "foo foobar food bar"),
+    (r"(?m)^(\w+)=(\d*)$", "a=1\nbb=\nccc=123\n=4"),
+    (r"x*", "axxbxxx"),
+])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 100])
+def test_stream(pattern: str, text: str, chunk_size: int):
+    p = regex_automata.compile(pattern)
+    expected = [(m.span(), m.group(), m.groups()) for m in p.finditer(text)]
+
+    stream = p.stream()
+    matches = []
+    for i in range(0, len(text), chunk_size):
+        matches.extend(stream.feed(text[i:i+chunk_size]))
+    matches.extend(stream.close())
+
+    assert [(m.span(), m.group(), m.groups()) for m in matches] == expected
+
+
+def test_stream_retains_only_tail():
+    stream = regex_automata.compile(r"\d+").stream()
+    matches = []
+    for _ in range(1000):
+        matches.extend(stream.feed("abc 123 de"))
+        assert len(stream.buffer.text) < 20
+    matches.extend(stream.close())
+    assert len(matches) == 1000
+    assert matches[-1].span() == (9994, 9997)
+
+    with pytest.raises(ValueError):
+        stream.feed("more")
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-16", "latin-1"])
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 20])
+def test_finditer_file(tmp_path, encoding: str, chunk_size: int):
+    text = "žluťoučký kůň 123\nüber 45 café\n" * 5
+    path = tmp_path / "input.txt"
+    path.write_bytes(text.encode(encoding, errors="replace"))
+    text = path.read_bytes().decode(encoding)
+
+    p = regex_automata.compile(r"(\w+) (\d+)")
+    expected = [m.span() for m in p.finditer(text)]
+    matches = list(p.finditer_file(path, encoding=encoding, chunk_size=chunk_size))
+    assert [m.span() for m in matches] == expected
+
+    data = path.read_bytes()
+    bom_free_encoding = {"utf-16": "utf-16-le"}.get(encoding, encoding)
+    for m in matches:
+        start, end = m.byte_span()
+        assert data[start:end].decode(bom_free_encoding) == m.group()
+        start, end = m.byte_span(2)
+        assert data[start:end].decode(bom_free_encoding) == m.group(2)
+
+
+@pytest.mark.parametrize(("encoding", "errors", "invalid"), [
+    ("utf-8", "surrogateescape", b"\xff\xfe\xff"),
+    ("utf-8", "surrogatepass", b"\xed\xa0\x80"),
+    ("utf-16", "surrogatepass", b"\x00\xd8"),
+])
+def test_finditer_file_invalid_bytes(tmp_path, encoding: str, errors: str, invalid: bytes):
+    bom_free_encoding = {"utf-16": "utf-16-le"}.get(encoding, encoding)
+    data = "žluť ".encode(encoding) + invalid + " abc 12".encode(bom_free_encoding)
+    path = tmp_path / "input.txt"
+    path.write_bytes(data)
+    p = regex_automata.compile(r"(\w+) (\d+)")
+    for chunk_size in (1, 3, 1 << 20):
+        m = next(p.finditer_file(path, encoding=encoding, errors=errors, chunk_size=chunk_size))
+        assert m.group() == "abc 12"
+        start, end = m.byte_span()
+        assert data[start:end].decode(bom_free_encoding) == m.group()
+
+    # the number of bytes behind a replaced character is lost
+    for lossy_errors in ("replace", "ignore", "backslashreplace"):
+        with pytest.raises(ValueError):
+            next(p.finditer_file(path, encoding=encoding, errors=lossy_errors))
+
+
+def test_search_file(tmp_path):
+    path = tmp_path / "input.log"
+    path.write_text("GET /index.html 200\nGET /missing 404\n", encoding="utf-8")
+
+    m = regex_automata.compile(r" (4\d\d)$", regex_automata.MULTILINE).search_file(path)
+    assert m is not None
+    assert m.span() == (32, 36) and m.byte_span() == (32, 36)
+    assert m.group(1) == "404"
+
+    assert regex_automata.compile(r"500").search_file(path) is None
+
+    empty_path = tmp_path / "empty.log"
+    empty_path.write_bytes(b"")
+    m = regex_automata.compile(r"x*").search_file(empty_path)
+    assert m is not None and m.span() == (0, 0) and m.byte_span() == (0, 0)
+
+
+def test_bytes():
+    p = regex_automata.compile(rb"(\w+)=(\d+)")
+    assert regex_automata.compile(b".").alphabet == RangeSet(ranges=[(0, 10), (11, 256)])
+    for text in (b"x=1 yy=22", bytearray(b"x=1 yy=22"), memoryview(b"x=1 yy=22")):
+        assert [(m.span(), m.group(1), m.group(2)) for m in p.finditer(text)] == [((0, 3), b"x", b"1"), ((4, 9), b"yy", b"22")]
+
+    m = regex_automata.fullmatch(b"\x00.\xff", b"\x00\x80\xff")
+    assert m is not None and m.group() == b"\x00\x80\xff"
+    assert regex_automata.compile(b"[^a]").alphabet == regex_automata.compile(b".", regex_automata.DOTALL).alphabet - {ord("a")}
+    assert regex_automata.search(rb"\s", b"\xa0") is None
+    assert regex_automata.search(rb"\S", b"\xa0") is not None
+    assert regex_automata.fullmatch(b"a\xc0", b"A\xe0", regex_automata.IGNORECASE) is None
+    assert regex_automata.fullmatch(b"a\xc0", b"A\xc0", regex_automata.IGNORECASE) is not None
+
+    assert regex_automata.sub(rb"(\d+)", rb"<\1>", b"a1b22") == b"a<1>b<22>"
+    assert regex_automata.split(rb",", b"a,b") == [b"a", b"b"]
+
+    with pytest.raises(TypeError):
+        regex_automata.search(b"a", "a")
+    with pytest.raises(TypeError):
+        regex_automata.search("a", b"a")
+
+
+def test_bytes_mmap_and_file(tmp_path):
+    import mmap
+
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"\x00\x01HDR\xff\xfe" * 1000)
+    p = regex_automata.compile(b"HDR[\x80-\xff]+")
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        spans = [m.span() for m in p.finditer(mm)]
+    assert spans == [(7*i + 2, 7*i + 7) for i in range(1000)]
+
+    matches = list(p.finditer_file(path, chunk_size=10))
+    assert [m.byte_span() for m in matches] == spans
+    assert all(m.group() == b"HDR\xff\xfe" for m in matches)
+
+    stream = p.stream()
+    assert [m.span() for m in stream.feed(b"HD") + stream.feed(bytearray(b"R\xff")) + stream.close()] == [(0, 4)]
+
+
+@pytest.mark.parametrize("yield_every", [1, 3, 1000])
+def test_afinditer(yield_every: int):
+    import asyncio
+    from typing import Any, AsyncIterator
+
+    p = regex_automata.compile(r"a+b|ä")
+    text = "xaab aäb " * 20
+    expected = [m.span() for m in p.finditer(text)]
+
+    async def chunks() -> AsyncIterator[str]:
+        for i in range(0, len(text), 7):
+            yield text[i:i+7]
+
+    async def collect(source: Any) -> list[tuple[int, int]]:
+        return [m.span() async for m in p.afinditer(source, yield_every=yield_every)]
+
+    async def from_reader() -> list[tuple[int, int]]:
+        reader = asyncio.StreamReader()
+        reader.feed_data(text.encode("utf-8"))
+        reader.feed_eof()
+        return await collect(reader)
+
+    async def with_ticker() -> tuple[list[tuple[int, int]], int]:
+        ticks = 0
+
+        async def ticker() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(ticker())
+        spans = await collect(text)
+        task.cancel()
+        return spans, ticks
+
+    assert asyncio.run(collect(chunks())) == expected
+    assert asyncio.run(from_reader()) == expected
+    spans, ticks = asyncio.run(with_ticker())
+    assert spans == expected
+    assert ticks >= len(text) // yield_every
+
+
+def test_regex_set():
+    patterns = [r"error: (\w+)", r"\d+", r"^warn", r"x(y|z)+"]
+    regex_set = regex_automata.RegexSet(patterns)
+    assert len(regex_set) == 4
+
+    for text in ["", "ok", "error: disk 42", "warn 42", "not warn", "xyyz"]:
+        expected = {i: m for i, p in enumerate(patterns) if (m := regex_automata.search(p, text)) is not None}
+        assert regex_set.matches(text) == sorted(expected)
+        assert regex_set.is_match(text) is bool(expected)
+        result = regex_set.search(text)
+        assert {i: (m.span(), m.groups()) for i, m in result.items()} == {i: (m.span(), m.groups()) for i, m in expected.items()}
+
+    assert regex_automata.RegexSet(["abc"], regex_automata.IGNORECASE).matches("xABC") == [0]
+    assert regex_automata.RegexSet([b"a", b"b+"]).matches(b"bb") == [1]
+    assert regex_automata.RegexSet([]).matches("abc") == []
+    with pytest.raises(TypeError):
+        regex_automata.RegexSet(["a", b"b"])
+    mixed = regex_automata.RegexSet(["a", regex_automata.compile("b", regex_automata.IGNORECASE)])
+    assert mixed.matches("AB") == [1]
+    assert mixed.matches("aB") == [0, 1]
+
+    # the longest match from the start found by the scan, like Pattern.search()
+    longest = [r"b|.*c", r"x|.*y", r"\s*\w*$|a+([a-c]*)*"]
+    for text in ["abc", "axby", " caAabb"]:
+        expected = {i: m for i, p in enumerate(longest) if (m := regex_automata.search(p, text)) is not None}
+        result = regex_automata.RegexSet(longest).search(text)
+        assert {i: m.span() for i, m in result.items()} == {i: m.span() for i, m in expected.items()}
+    assert regex_automata.RegexSet(longest).search("abc")[0].span() == (1, 3)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_match_many(workers: int):
+    p = regex_automata.compile(r"[a-z]+@[a-z]+\.com")
+    texts = ["a@b.com", "x a@b.com", "@b.com", "", "foo@bar.com!"] * 7
+
+    assert p.match_many(texts, workers=workers, batch_size=4) == [p.fullmatch(t) is not None for t in texts]
+    assert p.match_many(texts, mode="match", workers=workers, batch_size=4) == [p.match(t) is not None for t in texts]
+
+    spans = p.span_many(texts, workers=workers, batch_size=4)
+    expected = [(m.span() if (m := p.search(t)) is not None else (-1, -1)) for t in texts]
+    assert list(zip(spans[::2], spans[1::2])) == expected
+
+    with pytest.raises(ValueError):
+        p.match_many(texts, mode="findall")  # type: ignore[arg-type]
+
+
+@pytest.mark.parametrize("pattern,line_local", [
+    (r"foo", True),
+    (r"(?m)^\w+$", True),
+    (r"\bfoo\b", True),
+    (r"a.b", True),
+    (r"x*", True),
+    (r"^foo", False),
+    (r"(?s)a.b", False),
+    (r"a\sb", False),
+    (r"[^x]", False),
+])
+def test_is_line_local(pattern: str, line_local: bool):
+    assert regex_automata.compile(pattern).nfa.is_line_local() is line_local
+
+
+@pytest.mark.parametrize("pattern", [r"(?m)^(\w+) (\d+)$", r"ä\w*", r"x*", r"b\sa"])
+def test_finditer_file_parallel(tmp_path, pattern: str):
+    path = tmp_path / "log.txt"
+    path.write_text("".join(f"{'äbc'[i % 3]}x{i} {i*7}\nb\na\n" for i in range(300)), encoding="utf-8")
+    p = regex_automata.compile(pattern)
+
+    expected = [(m.span(), m.byte_span(), m.group(), m.groups()) for m in p.finditer_file(path)]
+    result = [(m.span(), m.byte_span(), m.group(), m.groups())
+              for m in p.finditer_file_parallel(path, workers=2, shard_size=512)]
+    assert result == expected
+
+
+@pytest.mark.parametrize("pattern,flags", [
+    (r"[a-z]+@[a-z]+\.(com|org)", PatternFlag.NOFLAG),
+    (r"\bfoo\b|^x*$", PatternFlag.NOFLAG),
+    (r"ab(c|d)*", PatternFlag.IGNORECASE),
+    (r"(?m)^a.b$", PatternFlag.DOTALL),
+    (r"x{2,20}|[abd]{17}", PatternFlag.NOFLAG),
+])
+def test_match_array(pattern: str, flags: PatternFlag):
+    pytest.importorskip("numpy")
+    p = regex_automata.compile(pattern, flags)
+    texts = ["", "a@b.com", "xa@b.org", "foo bar", "xxx", "ABCDC", "abd x", "a\nb", "a b\nfoo", "ab", "x" * 50]
+
+    for mode in ("fullmatch", "match", "search"):
+        expected = [getattr(p, mode)(t) is not None for t in texts]
+        assert p.match_array(texts, mode=mode).tolist() == expected
+
+    assert regex_automata.compile(rb"\d+").match_array([b"123", b"12a", b""]).tolist() == [True, False, False]
+    with pytest.raises(TypeError):
+        p.match_array([b"abc"])
+
+
+@pytest.mark.parametrize("pattern,text", [
+    (r"a{17,20}", "baaaaaaaaaaaaaaaaaaaaaaaab"),
+    (r"x(a{2,17})y", "xay xaaay xaaaaaaaaaaaaaaaaaay"),
+    (r"[ab]{3,18}b", "caabbaabaabbbaabaabbc"),
+    (r"(ab){17,}", "ab" * 20),
+    (r"(a{17,18}){2}", "a" * 37),
+])
+def test_counted_repetition(pattern: str, text: str, monkeypatch):
+    monkeypatch.setattr("regex_automata.regex.pattern.COUNTER_THRESHOLD", 16)
+    p = regex_automata.compile(pattern)
+    assert p.nfa.num_counters > 0
+    expected = re.search(pattern, text)
+    m = p.search(text)
+    assert m is not None and expected is not None
+    assert (m.span(), m.groups()) == (expected.span(), expected.groups())
+    assert bool(p.fullmatch(text)) == bool(re.fullmatch(pattern, text))
+    assert regex_automata.RegexSet([p, "c"]).search(text)[0].span() == m.span()
+
+
+def test_counted_repetition_size():
+    for pattern in (r".{0,4000}", r"a{1000,}", r"(\w+,){1,500}"):
+        assert len(regex_automata.compile(pattern).nfa.states) < 20
+    # small repetitions are expanded, which is faster to match
+    for pattern in (r"[a-z]{1,255}", r"(a{1,20}){1,20}", r"\d{0,100}x"):
+        assert regex_automata.compile(pattern).nfa.num_counters == 0
+    # inner repetition is expanded, outer one uses a counter
+    assert regex_automata.compile(r"(a{1,100}){1,100}").nfa.num_counters == 1
+
+    p = regex_automata.compile(r"[a-z]{1,255}")
+    m = p.search("x" * 300)
+    assert m is not None and m.span() == (0, 255)
+    assert p.fullmatch("x" * 255) is not None
+    assert p.fullmatch("x" * 256) is None
+    assert regex_automata.compile(r"a{1000,}").fullmatch("a" * 999) is None
+    assert regex_automata.compile(r"a{1000,}").fullmatch("a" * 1001) is not None
+
+
+def test_iteration_of_concatenation():
+    p = regex_automata.compile(r"(?:c*d)*")
+    assert p.fullmatch("c") is None
+    assert p.fullmatch("cdccd") is not None
+    assert p.fullmatch("") is not None
+    assert regex_automata.compile(r"(?:c*d)*", epsilon_free=False).fullmatch("c") is None
+
+
+def test_nfa_builder_linear():
+    def literal(word: str) -> AstNode:
+        node: AstNode = AstEmpty()
+        for c in word:
+            node = AstConcatenation(node, AstCharacterSet(RangeSet([ord(c)]), c))
+        return node
+
+    n = 5000
+    node = literal("w0")
+    for i in range(1, n):
+        node = AstUnion(literal(f"w{i}"), node)
+    ast = ASTProcessor(AstGroup(1, node)).get_processed_ast()
+    nfa = NFABuilder(ast).build(epsilon_free=True)
+    assert len(nfa.states) < 10 * n
+    assert all(not t.is_trivial_epsilon for d in nfa.transitions.values() for t in d)
+
+
+def test_transition_hash_pickle():
+    transition = Transition(predicates=(TransitionPredicate(next=RangeSet([ord("a")])),), label="a")
+    copy = pickle.loads(pickle.dumps(transition))
+    assert copy == transition and {transition: 1}[copy] == 1
+    assert "_hash_value" in transition.__dict__ and "_hash_value" not in pickle.loads(pickle.dumps(copy)).__dict__
+
+
+def test_compile_restores_gc():
+    regex_automata.compile("a|b")
+    assert gc.isenabled()
+    gc.disable()
+    try:
+        regex_automata.compile("a|c")
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
+
+
+def test_gc_paused_overlapping():
+    # blocks that do not nest, as with compiles in two threads
+    first, second = gc_paused(), gc_paused()
+    first.__enter__()
+    second.__enter__()
+    first.__exit__(None, None, None)
+    assert not gc.isenabled()
+    second.__exit__(None, None, None)
+    assert gc.isenabled()
+
+    with ThreadPoolExecutor(4) as executor:
+        patterns = list(executor.map(regex_automata.compile, [f"a{i}|b" for i in range(20)]))
+    assert patterns[3].search("xa3") is not None
+    assert gc.isenabled()
+
+
+def test_trivial_epsilon_free_nfa():
+    def accepts(nfa: NFA, text: str) -> bool:
+        codes = [-1, *map(ord, text), -1]
+        configurations = {nfa.initial_configuration}
+        for i in range(len(text) + 1):
+            configurations = nfa.configuration_epsilon_closure(configurations, codes[i], codes[i+1])
+            if i < len(text):
+                configurations = nfa.configuration_step(configurations, codes[i], codes[i+1])
+        return any(u in nfa.final_states for u, _ in configurations)
+
+    epsilon = Transition.make_trivial_epsilon()
+    a = Transition(predicates=(TransitionPredicate(next=RangeSet([ord("a")])),), label="a")
+    b = Transition(predicates=(TransitionPredicate(next=RangeSet([ord("b")])),), label="b")
+    # epsilon SCC {1, 3, 4} is shared by the closures of 0 and 2
+    nfa = NFA(states=list(range(6)), initial_state=0, final_states={5},
+              transitions={0: {epsilon: {1, 2}}, 1: {epsilon: {3}, a: {0}}, 2: {epsilon: {3}, b: {5}},
+                           3: {epsilon: {4}}, 4: {epsilon: {1, 5}}, 5: {a: {5}, epsilon: {2}}})
+    epsilon_free = nfa.get_trivial_epsilon_free_nfa()
+    assert all(not t.is_trivial_epsilon for d in epsilon_free.transitions.values() for t in d)
+    for n in range(5):
+        for text in map("".join, product("ab", repeat=n)):
+            assert accepts(epsilon_free, text) == accepts(nfa, text), text
+
+
+@pytest.mark.parametrize("pattern", [r"(a|b)*c", r"\bfoo\b|^x*$", r"(?m)^(\w+) (\d+)$", r"(ab|a)(c|bcd)(d*)", r"a{2,20}", r"(?:c*d)*", r"()*"])
+def test_glushkov_construction(pattern: str):
+    p = regex_automata.compile(pattern)
+    g = regex_automata.compile(pattern, construction="glushkov")
+    assert g.nfa.num_counters == 0
+    assert all(not t.is_trivial_epsilon for d in g.nfa.transitions.values() for t in d)
+    for text in ["", "abc", "foo bar", "xx", "abcd ab\nabc 12\nx 7", "aaaaaaaaaaaaaaaaaaaaaaaaa", "ccdd", "abcdd"]:
+        assert [m.span() for m in g.finditer(text)] == [m.span() for m in p.finditer(text)]
+        assert bool(g.fullmatch(text)) == bool(p.fullmatch(text))
+
+    with pytest.raises(ValueError):
+        regex_automata.compile(pattern, construction="brzozowski")  # type: ignore[arg-type]
+
+
+def test_glushkov_state_count():
+    # one state per position (characters, assertions and group tags) plus the initial state
+    assert len(regex_automata.compile(r"ab[cd]*", construction="glushkov", reduce=False).nfa.states) == 1 + 3 + 2
+    assert len(regex_automata.compile(r"(a)\b", construction="glushkov", reduce=False).nfa.states) == 1 + 2 + 4
+
+
+@pytest.mark.parametrize("pattern", [r"(a|b)*c", r"\bx{3,20}\b", r"(?i)[a-z]+\d?$"])
+def test_compact_nfa(pattern: str):
+    p = regex_automata.compile(pattern)
+    compact = p.compact_nfa
+    assert compact.num_states == len(p.nfa.states)
+    assert compact.initial_configuration == p.nfa.initial_configuration
+    for u in p.nfa.states:
+        expected = {(t, v) for t, vs in p.nfa.transitions.get(u, {}).items() for v in vs}
+        actual = {(compact.transitions[i], v)
+                  for table in (compact.epsilon_table, compact.character_table)
+                  for i, vs in table.iter_groups(u) for v in vs}
+        assert actual == expected
+    assert len(set(compact.transitions)) == len(compact.transitions)
+
+    with pytest.raises(ValueError):
+        CompactNFA.from_nfa(p.nfa.renumber_states(1))
+
+
+@pytest.mark.parametrize("pattern", [r"a([bc]*)c*", r"(foo|bar)+baz", r"\b(\w+)\s(\w+)?x{2,20}", r"(?i)GET|PUT|POST", r"a*b?$"])
+def test_nfa_reduction(pattern: str):
+    p, reduced = regex_automata.compile(pattern, reduce=False), regex_automata.compile(pattern)
+    assert reduced.reduction_report is not None
+    assert len(reduced.nfa.states) == reduced.reduction_report.states_after <= len(p.nfa.states)
+    for text in ["abcbcc", "foobarbaz barbaz", "ab ab xxx", "get Post", "aab", ""]:
+        assert [m.span() for m in reduced.finditer(text)] == [m.span() for m in p.finditer(text)]
+        assert sorted(m.span() for m in reduced.finditer(text, all_matches=True)) == \
+               sorted(m.span() for m in p.finditer(text, all_matches=True))
+
+
+@pytest.mark.parametrize(("pattern", "text"), [
+    (r"((b?b|[ab])|([ab])*ab)*", "babbbb"),
+    (r"(a*|((a)*|(ab|b?)?)*)*", "abb"),
+    (r"((([ab]|a*)|ab)|(ab|([ab]|ab)))*", "aaabb"),
+    (r"(a(b)?)?(b)?", "abab"),
+])
+@pytest.mark.parametrize("epsilon_free", [True, False])
+def test_nfa_reduction_groups(pattern: str, text: str, epsilon_free: bool):
+    # nested optional groups are ambiguous, reduction must not change which groups are kept
+    p = regex_automata.Pattern(pattern, epsilon_free=epsilon_free, reduce=False)
+    reduced = regex_automata.Pattern(pattern, epsilon_free=epsilon_free)
+    groups = range(p.max_group_number + 1)
+    assert [[m.span(i) for i in groups] for m in reduced.finditer(text)] == \
+           [[m.span(i) for i in groups] for m in p.finditer(text)]
+
+
+def test_nfa_reduction_steps():
+    report = regex_automata.compile(r"(?:a|b|c)d|ed").reduction_report
+    assert report is not None
+    assert report.merged_transitions > 0 and report.forward_merged_states > 0
+
+    p = regex_automata.compile("|".join(f"word{i}" for i in range(100)))
+    assert len(p.nfa.states) < 20
+    assert p.fullmatch("word42") and not p.fullmatch("word100")
+
+    epsilon = Transition.make_trivial_epsilon()
+    a = Transition(predicates=(TransitionPredicate(next=RangeSet([ord("a")])),), label="a")
+    nfa = NFA(states=[0, 1, 2, 3], initial_state=0, final_states={2},
+              transitions={0: {a: {1, 3}}, 1: {epsilon: {2}}, 3: {a: {3}}})
+    reduced, report = reduce_nfa(nfa)
+    assert report.trimmed_states == 1
+    assert len(reduced.states) == 3 and reduced.num_transitions == 2
+
+
+@pytest.mark.parametrize(("pattern", "text"), [
+    (r"x+", "İxX"),  # lowercase of U+0130 has two characters, text offsets must not shift
+    (r"[^a]", "Ab"),
+    (r"s+", "sSſ"),
+    (r"k", "K"),
+    (r"[Z-a]+", "zZ_`aA["),
+    (r"[^A-Z]+", "abc123"),
+])
+def test_ignorecase_folding(pattern: str, text: str):
+    expected = [m.span() for m in re.finditer(pattern, text, re.IGNORECASE)]
+    assert [m.span() for m in regex_automata.finditer(pattern, text, regex_automata.IGNORECASE)] == expected
+
+
+def test_from_literals():
+    words = ["walk", "walked", "walking", "talk", "talked", "talking", "ta", "", "walk"]
+    p = regex_automata.Pattern.from_literals(words)
+    q = regex_automata.compile("|".join(sorted(set(words), key=len, reverse=True)))
+    for text in ["walking talked", "xtalkingx", "ta walke", "", "tal"]:
+        assert [m.span() for m in p.finditer(text)] == [m.span() for m in q.finditer(text)]
+    assert all(p.fullmatch(w) for w in words)
+    assert not p.fullmatch("walkin")
+    # common prefixes and suffixes are shared: walk|talk, then (|ed|ing)
+    assert len(p.nfa.states) < 15
+
+    p_i = regex_automata.Pattern.from_literals(["Spam", "eggs"], regex_automata.IGNORECASE)
+    assert [m.group() for m in p_i.finditer("SPAM and Eggs, spam")] == ["SPAM", "Eggs", "spam"]
+    assert regex_automata.Pattern.from_literals([b"ab", b"cd"]).findall(b"abcd") == [b"ab", b"cd"]
+
+    with pytest.raises(ValueError):
+        regex_automata.Pattern.from_literals(["b", "a"], presorted=True)
+    with pytest.raises(TypeError):
+        regex_automata.Pattern.from_literals(["a", b"b"])  # type: ignore[arg-type]
+    with pytest.raises(ValueError):
+        regex_automata.Pattern.from_literals([])  # an empty word list must not match the empty string
+    with pytest.raises(ValueError):
+        regex_automata.Pattern.from_literals(iter([]), presorted=True)
+
+
+
+@pytest.mark.parametrize("pattern,text,groups", [
+    (r"a([bc]*)(c*d)", "abcd", ("bc", "d")),
+    (r"(ab|a)b*c", "abc", ("ab",)),
+    (r"((a)|b)+", "ab", ("b", "a")),
+    # unlike in re, earlier groups are longest
+    (r"(a*)*b", "aab", ("aa",)),
+    (r"(a|ab)(c|bcd)(d*)", "abcd", ("ab", "c", "d")),
+])
+def test_group_ties(pattern: str, text: str, groups: tuple[str, ...]):
+    m = regex_automata.search(pattern, text)
+    assert m is not None
+    assert m.span() == re.search(pattern, text).span()  # type: ignore[union-attr]
+    assert m.groups() == groups
+
+
+def test_match_stats():
+    p = regex_automata.compile(r"(\w+)=(\d+)")
+    text = "a=1 bb=22 c=x"
+
+    stats = regex_automata.MatchStats()
+    assert [m.span() for m in p.finditer(text, stats=stats)] == [(0, 3), (4, 9)]
+    assert stats.characters_scanned == len(text)
+    assert stats.matches_emitted == 2
+    assert stats.buckets_created >= 2
+    assert stats.heads_processed >= stats.peak_active_heads > 0
+    assert stats.epsilon_closure_iterations > 0
+    assert stats.elapsed > 0
+
+    # counters are added to
+    heads_processed = stats.heads_processed
+    assert p.search(text, stats=stats) is not None
+    assert stats.matches_emitted == 3
+    assert stats.heads_processed > heads_processed
+
+    stats = regex_automata.MatchStats()
+    assert p.fullmatch("abc=123", stats=stats) is not None
+    assert stats.characters_scanned == 7 and stats.buckets_created == 1 and stats.matches_emitted == 1
+    stats = regex_automata.MatchStats()
+    assert p.match("=1", stats=stats) is None
+    assert stats.matches_emitted == 0 and stats.buckets_created == 1
+
+
+def test_profile():
+    p = regex_automata.compile(r"(foo|bar)+baz")
+    texts = ["foobarbaz", "xx foofoobaz", "nothing here"]
+    profile = p.profile(texts)
+
+    hot_states = profile.get_hot_states(3)
+    assert len(hot_states) == 3 and all(visits > 0 for _, visits in hot_states)
+    assert hot_states[0][1] == max(profile.state_visits.values())
+    assert set(profile.state_visits) <= set(p.nfa.states)
+    assert profile.stats.matches_emitted == 2
+    assert profile.stats.characters_scanned == sum(map(len, texts))
+    assert 0 < sum(profile.state_visits.values()) <= profile.stats.heads_processed
+    for (u, t, v), hits in profile.get_transition_hits().items():
+        assert v in p.nfa.transitions[u][t] and hits > 0
+
+    # profiling the same corpus gives the same counts
+    assert p.profile(texts).state_visits == profile.state_visits
+
+    d = json.loads(json.dumps(profile.to_dict()))
+    assert d["pattern"] == p.pattern
+    assert sum(s["visits"] for s in d["states"]) == sum(profile.state_visits.values())
+    assert sum(t["hits"] for t in d["transitions"]) == sum(profile.transition_hits.values())
+
+    source = NFAVisualizer(p.nfa, dict(profile.state_visits), profile.get_transition_hits()).get_digraph_dot().source
+    assert "fillcolor" in source and "penwidth" in source
+
+
+def test_profile_save_json(tmp_path):
+    p = regex_automata.compile(rb"a+b")
+    profile = p.profile(b"aab ab")
+    path = tmp_path / "profile.json"
+    profile.save_json(path)
+    assert json.loads(path.read_text()) == profile.to_dict()
+
+
+@pytest.mark.parametrize(("pattern", "text", "flags", "epsilon_free", "spans"), [
+    ("b|.*c", "abc", PatternFlag.NOFLAG, True, [(1, 3)]),
+    ("x|.*y", "axby", PatternFlag.NOFLAG, True, [(1, 4)]),
+    (r"\s*\w*$|a+([a-c]*)*", " caAabb", PatternFlag.NOFLAG, True, [(2, 7), (7, 7)]),
+    # the last match used to be (9, 11), past the end of the text
+    (r"(\wa{0,3}[^a]|a)", "ba \n\n Aaca", PatternFlag.DOTALL, False, [(1, 3), (7, 9), (9, 10)]),
+])
+def test_later_bucket_longest_match(pattern: str, text: str, flags: PatternFlag, epsilon_free: bool,
+                                    spans: list[tuple[int, int]]):
+    # the bucket that matches first must not lose heads that an earlier bucket shares
+    p = regex_automata.Pattern(pattern, flags, epsilon_free=epsilon_free)
+    m = p.search(text)
+    assert m is not None and m.span() == spans[0]
+    assert [m.span() for m in p.finditer(text)] == spans
+
+
+@pytest.mark.parametrize("pattern", [r"[0-9]{2,}", r"(a|b)*", r"a*b?", r"(ab|a)(c|bcd)?", r"x{2,3}"])
+def test_all_matches(pattern: str):
+    p = regex_automata.compile(pattern)
+    for text in ["1234", "abab", "aab", "abcd", "xxxx x", ""]:
+        expected = [(i, j) for i in range(len(text)+1) for j in range(i, len(text)+1) if p.fullmatch(text, i, j)]
+        assert [m.span() for m in p.finditer(text, all_matches=True)] == expected
+
+
+@pytest.mark.parametrize("pattern", [r"\b\w+\b", r"^a*|b$", r"(?m)^\w+$", r"(a{2,3}){2}", r"(\w+)\s(\w+)?"])
+def test_all_matches_stream(pattern: str):
+    p = regex_automata.compile(pattern)
+    text = "aaaaaab ab\nbaa a aaa\n"
+    stream = p.stream(all_matches=True)
+    stream_matches = stream.feed(text) + stream.close()
+    matches = list(p.finditer(text, all_matches=True))
+    assert [m.span() for m in matches] == sorted({m.span() for m in stream_matches})
+    for m in matches:
+        assert m.group() == text[slice(*m.span())]
+
+
+def test_all_matches_output_sensitive():
+    p = regex_automata.compile(r"(\w+)@(\w+)")
+    text = "x" * 10000 + " a@b "
+    stats = regex_automata.MatchStats()
+    matches = p.finditer(text, all_matches=True, stats=stats)
+    assert next(matches).groups() == ("a", "b")
+    assert list(matches) == []
+    assert stats.buckets_created == 1
+    assert stats.heads_processed < 20
+
+
+def test_all_matches_overlapping():
+    p = regex_automata.compile(r"a.*b")
+    text = "a" * 10000 + "b"
+    stats = regex_automata.MatchStats()
+    assert [m.span() for m in p.finditer(text, all_matches=True, stats=stats)] == [(i, 10001) for i in range(10000)]
+    assert stats.heads_processed < 4 * len(text)
+
+
+def test_all_matches_useful_states():
+    p = regex_automata.compile(r"(\w+)@(\w+)")
+    text = "x" * 1000 + " a@b "
+    evaluator = NFAEvaluator(p, p.flags)
+    buffer = make_text_buffer(text, 0, None, False)
+    reachable_states = evaluator.get_reachable_states(buffer)
+    assert len(reachable_states) == len(text) + 1
+    assert len({id(bits) for bits in reachable_states}) < 10
+    ends_by_start, useful_states = evaluator.get_match_ends(buffer)
+    assert ends_by_start == {1001: [1004]}
+    assert len({id(bits) for bits in useful_states}) < 10
+    assert useful_states[1001] >> p.nfa.initial_state & 1
+    assert not useful_states[1000]
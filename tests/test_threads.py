@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import regex_automata
+from regex_automata.regex import match as match_module
+
+
+NUM_THREADS = 8
+
+
+def run_in_threads(fn, n: int = NUM_THREADS) -> list[Any]:
+    barrier = threading.Barrier(n)
+
+    def worker(i: int):
+        barrier.wait()
+        return fn(i)
+
+    with ThreadPoolExecutor(max_workers=n) as executor:
+        return list(executor.map(worker, range(n)))
+
+
+def test_shared_pattern():
+    p = regex_automata.compile(r"(?P<key>\w+)=(?P<value>\d+)")
+    texts = [f"a={i} bb={i*2} c=x d{i}={i}" for i in range(20)]
+    expected = [[(m.span(), m.groupdict()) for m in p.finditer(t)] for t in texts]
+
+    def search_all(i: int):
+        return [[(m.span(), m.groupdict()) for m in p.finditer(t)] for t in texts[i:] + texts[:i]]
+
+    for i, result in enumerate(run_in_threads(search_all)):
+        assert result == expected[i:] + expected[:i]
+
+
+def test_shared_pattern_sub_and_fullmatch():
+    p = regex_automata.compile(r"(\d+)-(\d+)")
+
+    def work(i: int):
+        return p.sub(r"\2-\1", f"{i}-{i+1} x 1-2"), p.fullmatch(f"{i}-{i}") is not None
+
+    assert run_in_threads(work) == [(f"{i+1}-{i} x 2-1", True) for i in range(NUM_THREADS)]
+
+
+def test_expand_pattern_initialized_once(monkeypatch):
+    monkeypatch.setattr(match_module, "_EXPAND_PATTERN", None)
+    m = regex_automata.match(r"(a)", "a")
+    assert m is not None
+
+    patterns = run_in_threads(lambda i: m._get_expand_pattern())
+    assert all(p is patterns[0] for p in patterns)
+    assert m.expand(r"<\1>") == "<a>"
+
+
+def test_threads_benchmark():
+    from regex_automata.bench.threads import make_texts, measure_throughput
+
+    p = regex_automata.compile(r"status=(\d+)")
+    assert measure_throughput(p, make_texts(2, 30), threads=2) > 0